@@ -0,0 +1,96 @@
+import asyncio
+import time
+from metrics import Histogram
+
+class MicroBatcher:
+    # Coalesces concurrent prediction requests into one model call.
+    # Items are queued until window_ms has passed since the first one arrived or max_size items
+    # are waiting; the batch is then scored in a worker thread and each caller's future resolved.
+    # Each item carries the context it was resolved against (e.g. the serving data), and items
+    # with different contexts in one batch are scored in separate calls.
+
+    def __init__(self, predict_fn, window_ms: float = 2.0, max_size: int = 64):
+        self.predict_fn = predict_fn # (list of items, context) -> sequence of predictions
+        self.window = window_ms / 1000
+        self.max_size = max_size
+
+        self.pending = [] # (item, context, future, enqueued_at)
+        self.timer = None
+        self.in_flight = 0
+        self.batches = 0
+        self.items = 0
+
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100])
+        self.predict_ms = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100, 250])
+
+    async def submit(self, item, context=None):
+        # Queueing one item and waiting for its prediction
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, context, future, time.perf_counter()))
+
+        if len(self.pending) >= self.max_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        # Sending everything queued so far as one batch
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        start = time.perf_counter()
+        for _, _, _, enqueued_at in batch:
+            self.wait_ms.observe((start - enqueued_at) * 1000)
+        self.batch_sizes.observe(len(batch))
+        self.batches += 1
+        self.items += len(batch)
+
+        groups = {} # one model call per context, normally a single one
+        for entry in batch:
+            groups.setdefault(id(entry[1]), []).append(entry)
+
+        self.in_flight += 1
+        try:
+            for group in groups.values():
+                await self._predict(group)
+        finally:
+            self.in_flight -= 1
+            self.predict_ms.observe((time.perf_counter() - start) * 1000)
+
+    async def _predict(self, group):
+        # Running the model off the event loop
+        try:
+            predictions = await asyncio.to_thread(self.predict_fn, [item for item, _, _, _ in group], group[0][1])
+        except Exception as e:
+            for _, _, future, _ in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future, _), prediction in zip(group, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "queue_depth": len(self.pending),
+            "in_flight_batches": self.in_flight,
+            "batches": self.batches,
+            "items": self.items,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+            "predict_ms": self.predict_ms.snapshot(),
+        }
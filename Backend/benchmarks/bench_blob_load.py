@@ -0,0 +1,59 @@
+import os, sys, json, gzip, time, argparse, subprocess, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from blobs import load_from_blob, iter_blob_records
+from metrics import peak_rss_mb
+from departure_index import DepartureIndex
+from bench_serving import generate_dataset
+
+PATHS = {
+    "readall":       "departures.json.gz",   # previous loader: readall + gzip.decompress + json.loads
+    "stream":        "departures.json.gz",
+    "stream-ndjson": "departures.ndjson.gz",
+}
+
+def measure(path: str) -> dict:
+    # Building the departure index from the local blob with one loader, in this process
+    start = time.perf_counter()
+    blob = PATHS[path]
+    if path == "readall":
+        index = DepartureIndex(load_from_blob("busdata", blob))
+    else:
+        index = DepartureIndex(iter_blob_records("busdata", blob))
+    return {"path": path, "events": len(index), "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare blob loading paths for the departures index (time and peak RSS)")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--path", choices=list(PATHS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.path:
+        print(json.dumps(measure(args.path)))
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        # Writing the synthetic departures as gzipped JSON and gzipped NDJSON blobs
+        container = os.path.join(root, "busdata")
+        os.makedirs(container)
+        generate_dataset(container, args.events)
+        source = os.path.join(container, "departures.json")
+        with open(source, "rb") as f, gzip.open(os.path.join(container, "departures.json.gz"), "wb") as out:
+            out.write(f.read())
+        with open(source) as f, gzip.open(os.path.join(container, "departures.ndjson.gz"), "wt") as out:
+            for record in json.load(f):
+                out.write(json.dumps(record) + "\n")
+        sizes = {blob: os.path.getsize(os.path.join(container, blob)) / 1e6 for blob in set(PATHS.values())}
+
+        # Each path runs in a fresh process so peak RSS is not shared between them
+        print(f"{'path':<14} {'blob MB':>8} {'events':>10} {'seconds':>9} {'peak RSS MB':>12}")
+        env = {**os.environ, "BLOB_LOCAL_DIR": root}
+        for path, blob in PATHS.items():
+            out = subprocess.run([sys.executable, __file__, "--path", path], env=env,
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{path:<14} {sizes[blob]:>8.1f} {result['events']:>10} {result['seconds']:>9.2f} "
+                  f"{result['peak_rss_mb']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
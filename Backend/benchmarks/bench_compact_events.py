@@ -0,0 +1,76 @@
+import os, sys, gzip, json, time, argparse, tempfile
+import numpy as np
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from blobs import iter_json_array
+from compact_events import NameDictionary, compact_journeys, iter_stop_events
+from departure_index import DepartureIndex
+from bench_serving import generate_dataset
+
+def journey_batches(docs, batch_size: int = 1000):
+    # Batching stop events without splitting a journey across batches (journeys are contiguous)
+    batch, current = [], None
+    for doc in docs:
+        key = (doc["service_id"], doc["journey_id"])
+        if key != current and len(batch) >= batch_size:
+            yield batch
+            batch = []
+        current = key
+        batch.append(doc)
+    if batch:
+        yield batch
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bytes per stop event: one document per event vs compact journeys")
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        generate_dataset(root, args.events)
+        path = os.path.join(root, "departures.json")
+        with open(path) as f:
+            originals = list(iter_json_array(iter(lambda: f.read(1 << 20), "")))
+
+    # Current layout: one BSON document per stop event, exported as a JSON array
+    json_bytes = sum(len(json.dumps(doc)) + 1 for doc in originals)
+    bson_docs = [bson.encode(doc) for doc in originals]
+    document_bson = sum(len(b) for b in bson_docs)
+    document_gzip = len(gzip.compress(b"".join(bson_docs)))
+    del bson_docs
+
+    # Compact layout: one document per journey plus the shared name dictionary
+    names = NameDictionary()
+    start = time.perf_counter()
+    journeys = [doc for batch in journey_batches(originals) for doc in compact_journeys(batch, names)]
+    compact_seconds = time.perf_counter() - start
+    journey_bson = [bson.encode(doc) for doc in journeys]
+    dictionary_bson = sum(len(bson.encode({"_id": code, "name": name})) for code, name in enumerate(names.names))
+    compact_bson = sum(len(b) for b in journey_bson) + dictionary_bson
+    compact_gzip = len(gzip.compress(b"".join(journey_bson)))
+    del journey_bson
+
+    # Round trip: expanding the compact journeys must give back the original documents
+    start = time.perf_counter()
+    expanded = list(iter_stop_events(journeys, names.names))
+    expand_seconds = time.perf_counter() - start
+    mismatches = sum(a != b for a, b in zip(originals, expanded)) + abs(len(originals) - len(expanded))
+
+    # The exporter's departure index must match the one built from the current documents
+    a, b = DepartureIndex(originals).to_arrays(), DepartureIndex(expanded).to_arrays()
+    index_equal = a.keys() == b.keys() and all(np.array_equal(a[k], b[k]) for k in a)
+
+    n = len(originals)
+    print(f"{n} stop events in {len(journeys)} journeys, {len(names.names)} distinct names")
+    print(f"{'layout':<28} {'bytes/event':>12} {'total MB':>10}")
+    for label, size in [("documents (departures.json)", json_bytes), ("documents (BSON)", document_bson),
+                        ("documents (BSON, gzip)", document_gzip), ("compact journeys (BSON)", compact_bson),
+                        ("compact journeys (BSON, gzip)", compact_gzip)]:
+        print(f"{label:<28} {size / n:>12.1f} {size / 1e6:>10.1f}")
+    print(f"compact / documents (BSON): {compact_bson / document_bson:.3f}")
+    print(f"compacting {compact_seconds:.2f}s, expanding {expand_seconds:.2f}s")
+    print(f"round trip mismatches: {mismatches}, departure index identical: {index_equal}")
+    sys.exit(0 if mismatches == 0 and index_equal else 1)
+
+if __name__ == "__main__":
+    main()
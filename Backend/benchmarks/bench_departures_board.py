@@ -0,0 +1,89 @@
+import os, sys, json, time, random, asyncio, argparse, tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+from bench_serving import generate_dataset, percentile, HUB_STOP
+
+def summary(label: str, latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {"case": label, "requests": len(latencies), "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95), "p99_ms": percentile(latencies, 0.99)}
+
+async def timed(client, method: str, url: str, **kwargs) -> float:
+    start = time.perf_counter()
+    resp = await client.request(method, url, **kwargs)
+    resp.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of /departures_board at a stop served by many routes, "
+                                                 "against one /predict_delay round trip per route")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--hub-routes", type=int, default=60, help="services calling at the interchange")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--window", type=int, nargs="+", default=[60, 180])
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="p99 latency budget for the board")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "busdata"))
+        samples = generate_dataset(os.path.join(root, "busdata"), args.events, hub_routes=args.hub_routes)["predict"]
+        os.environ["BLOB_LOCAL_DIR"] = root
+        os.environ["SNAPSHOT_PATH"] = os.path.join(root, "serving.snap")
+        os.environ["SNAPSHOT_POLL_SECONDS"] = "0"
+        os.chdir(BACKEND)
+        import httpx
+        import main as app_main
+
+        data = app_main.serving
+        hub_keys = [data.departures.key_parts(pos) for pos in data.departures.keys_at_stop(HUB_STOP)]
+        other = random.Random(0).choice(samples)["stop_name"]
+        rng = random.Random(1)
+        dates = ["2025-04-07", "2025-04-09", "2025-04-12", "2025-04-13"]
+        times = [f"{h:02d}:{m:02d}" for h in range(5, 23) for m in (0, 20, 40)]
+
+        async def run():
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results, sizes = [], {}
+                for stop, label in [(HUB_STOP, f"hub ({len(hub_keys)} routes)"), (other, "ordinary stop")]:
+                    for window in args.window:
+                        params = lambda: {"stop_name": stop, "date": rng.choice(dates), "time": rng.choice(times),
+                                          "window_mins": window, "limit": 100}
+                        for _ in range(20): # warm-up
+                            await timed(client, "GET", "/departures_board", params=params())
+                        latencies, rows = [], []
+                        for _ in range(args.requests):
+                            p = params()
+                            latencies.append(await timed(client, "GET", "/departures_board", params=p))
+                            rows.append(len((await client.get("/departures_board", params=p)).json()["departures"]))
+                        results.append(summary(f"board {label}, {window} min", latencies))
+                        sizes[results[-1]["case"]] = sum(rows) / len(rows)
+
+                # Previous approach: one /predict_delay round trip per route at the stop
+                latencies = []
+                for _ in range(args.requests // 5):
+                    date, at = rng.choice(dates), rng.choice(times)
+                    start = time.perf_counter()
+                    for service_id, _, destination in hub_keys:
+                        await client.post("/predict_delay", json={"service_id": service_id, "stop_name": HUB_STOP,
+                                                                  "destination": destination, "date": date, "time": at})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                results.append(summary(f"{len(hub_keys)} x /predict_delay (hub)", latencies))
+                return results, sizes
+
+        results, sizes = asyncio.run(run())
+
+    print(f"{args.events} stop events, {HUB_STOP} served by {len(hub_keys)} routes")
+    print(f"{'case':<36} {'rows':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        rows = f"{sizes[r['case']]:.0f}" if r["case"] in sizes else "-"
+        print(f"{r['case']:<36} {rows:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+    worst = max(r["p99_ms"] for r in results if r["case"].startswith("board"))
+    print(f"board p99 {worst:.2f} ms vs budget {args.budget_ms:.0f} ms: {'OK' if worst <= args.budget_ms else 'OVER'}")
+    print(json.dumps(results))
+    sys.exit(0 if worst <= args.budget_ms else 1)
+
+if __name__ == "__main__":
+    main()
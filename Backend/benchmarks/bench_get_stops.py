@@ -0,0 +1,77 @@
+import os, sys, time, asyncio, argparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from upstream import StopsClient
+from fake_upstream import FakeBustimes, ServerProcess
+
+def blocking_get_stops(base_url: str, service_id: int) -> list:
+    # The previous /get_stops implementation: sequential blocking calls, a new connection each time
+    resp = requests.get(f"{base_url}/api/vehiclejourneys/", params={"service": service_id, "page_size": 6}, timeout=10)
+    resp.raise_for_status()
+    journeys = resp.json().get("results") or []
+
+    resp = requests.get(f"{base_url}/api/services/{service_id}", timeout=10)
+    resp.raise_for_status()
+    origin, destination = [p.strip() for p in resp.json()["description"].split(" - ")]
+
+    for journey in journeys[:6]:
+        stops_resp = requests.get(f"{base_url}/services/{service_id}/journeys/{journey['id']}.json", timeout=10)
+        stops_resp.raise_for_status()
+        stops = [stop["name"] for stop in stops_resp.json().get("stops", []) if stop.get("name")]
+        if (destination in stops[-1] or origin in stops[0]) or stops[0] == stops[-1]:
+            return stops
+    return []
+
+def run_blocking(base_url: str, service_ids: list, concurrency: int) -> float:
+    # Simulating sync handlers on a worker thread pool
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda sid: blocking_get_stops(base_url, sid), service_ids))
+    return time.perf_counter() - start
+
+async def run_async(client: StopsClient, service_ids: list, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(sid):
+        async with semaphore:
+            return await client.get_stops(sid)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(sid) for sid in service_ids])
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /get_stops upstream access against a fake bustimes.org")
+    parser.add_argument("--services", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Same seed as the server process, so the service IDs match
+    fake = FakeBustimes(services=args.services, latency_ms=args.latency_ms)
+    service_ids = [list(fake.services)[i % args.services] for i in range(args.requests)]
+
+    with ServerProcess(args.port, services=args.services, latency_ms=args.latency_ms) as server:
+        blocking = run_blocking(server.url, service_ids, args.concurrency)
+
+        # Pooled client with caching disabled, then with the stop list cache
+        uncached = StopsClient(server.url, fresh_ttl=0, stale_ttl=0, empty_ttl=0)
+        pooled = asyncio.run(run_async(uncached, service_ids, args.concurrency))
+
+        cached_client = StopsClient(server.url)
+        cached = asyncio.run(run_async(cached_client, service_ids, args.concurrency))
+
+    print(f"{args.requests} requests over {args.services} services, concurrency {args.concurrency}, "
+          f"upstream latency {args.latency_ms:.0f} ms")
+    for label, seconds in (("blocking requests", blocking), ("async pooled", pooled), ("async pooled + cache", cached)):
+        print(f"{label:<22} {seconds:7.2f} s  {args.requests / seconds:8.1f} req/s  "
+              f"{seconds * 1000 * args.concurrency / args.requests:8.1f} ms/request")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os, sys, json, time, argparse
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from target_encoding import TargetEncoder
+from incremental_training import prior_encodings, model_inputs, time_features, warm_start, rmse, BOOST_ROUNDS
+from features import FEATURES
+
+# Hyperparameters of train_model.py
+PARAMS = dict(random_state=42, learning_rate=0.15, max_depth=30, min_child_samples=15, n_estimators=200,
+              num_leaves=75, verbose=-1)
+
+def generate_day(day: int, events: int, seed: int = 0) -> pd.DataFrame:
+    # One service date of synthetic stop events: delays depend on the stop, the route, the time
+    # of day and the weekday, and drift slowly from day to day
+    rng = np.random.default_rng(seed * 1000 + day)
+    base = np.random.default_rng(seed)
+    stop_mean = base.normal(2.0, 2.5, 2000)
+    route_mean = base.normal(0.0, 1.5, 200)
+    termini = [f"Terminus {i}" for i in range(200)]
+    stop = rng.integers(0, 2000, events)
+    route = rng.integers(0, 200, events)
+    sched = rng.integers(300, 1440, events)
+    weekday = np.full(events, day % 7, dtype=np.int8)
+    peak = (weekday < 5) & (((420 <= sched) & (sched < 540)) | ((900 <= sched) & (sched < 1080)))
+    delay = stop_mean[stop] + route_mean[route] + 3 * peak + 0.02 * day + rng.normal(0, 2, events)
+    return pd.DataFrame({
+        "scheduled_mins": sched.astype(np.int16), "delay_mins": np.round(delay).astype(np.int16),
+        "day_of_week": weekday, "is_holiday": np.zeros(events, dtype=bool),
+        "service_id": (20_000 + route).astype(np.int32), "stop_index": (stop % 40).astype(np.int16),
+        "origin": [termini[r] for r in route], "destination": [termini[(r * 7 + 3) % 200] for r in route],
+        "stop_name": [f"Stop {s}" for s in stop],
+    })
+
+def full_retrain(history: pd.DataFrame) -> lgb.LGBMRegressor:
+    # What train_model.py does: out-of-fold encodings over the whole history, then 200 trees
+    encoder = TargetEncoder()
+    X = time_features(history)
+    for col, encoded in encoder.transform_oof(history).items():
+        X[f"{col}_te"] = encoded
+    return lgb.LGBMRegressor(**PARAMS).fit(X[FEATURES], history["delay_mins"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to a new model: warm-start on one new day vs full retraining")
+    parser.add_argument("--events-per-day", type=int, default=20_000)
+    parser.add_argument("--history-days", type=int, nargs="+", default=[7, 14, 28, 56])
+    parser.add_argument("--rounds", type=int, default=BOOST_ROUNDS)
+    args = parser.parse_args()
+
+    results = []
+    for days in args.history_days:
+        frames = [generate_day(d, args.events_per_day) for d in range(days + 2)]
+        history, new_day, holdout = pd.concat(frames[:days], ignore_index=True), frames[days], frames[days + 1]
+
+        # Running statistics as load_journeys keeps them: every stored day, holdout included
+        running = TargetEncoder().update(pd.concat(frames, ignore_index=True))
+        deployed = full_retrain(history)
+
+        start = time.perf_counter()
+        incoming = pd.concat([new_day, holdout], ignore_index=True)
+        encoded, _ = prior_encodings(incoming, running)
+        X = model_inputs(incoming, encoded)
+        updated = warm_start(deployed, X.iloc[:len(new_day)], new_day["delay_mins"], args.rounds)
+        incremental_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        retrained = full_retrain(pd.concat([history, new_day], ignore_index=True))
+        full_s = time.perf_counter() - start
+
+        X_valid, y_valid = X.iloc[len(new_day):], holdout["delay_mins"]
+        results.append({"history_days": days, "history_events": len(history) + len(new_day),
+                        "incremental_s": incremental_s, "full_s": full_s,
+                        "rmse_deployed": rmse(deployed, X_valid, y_valid),
+                        "rmse_incremental": rmse(updated, X_valid, y_valid),
+                        "rmse_full": rmse(retrained, X_valid, y_valid)})
+
+    print(f"{'days':>5} {'events':>9} {'warm s':>8} {'full s':>8} {'speedup':>8} "
+          f"{'rmse deployed':>14} {'rmse warm':>10} {'rmse full':>10}")
+    for r in results:
+        print(f"{r['history_days']:>5} {r['history_events']:>9} {r['incremental_s']:>8.2f} {r['full_s']:>8.2f} "
+              f"{r['full_s'] / r['incremental_s']:>7.1f}x {r['rmse_deployed']:>14.3f} "
+              f"{r['rmse_incremental']:>10.3f} {r['rmse_full']:>10.3f}")
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os, sys, time, asyncio, argparse
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ingest import JourneyIngester
+from checkpoints import CheckpointStore
+from stop_events import transform_journeys
+from fake_upstream import FakeBustimes, ServerProcess
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the journey ingester against a local fake bustimes.org")
+    parser.add_argument("--services", type=int, default=10)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--journeys-per-day", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--server-rate-limit", type=float, default=40.0, help="fake upstream requests/s before 429")
+    parser.add_argument("--rate", type=float, default=50.0, help="client token bucket requests/s")
+    parser.add_argument("--in-flight", type=int, default=16)
+    parser.add_argument("--write-ms", type=float, default=20.0, help="simulated bulk write time")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file; runs resume from it")
+    parser.add_argument("--stop-after", type=float, default=None, help="interrupt the run after N seconds")
+    args = parser.parse_args()
+
+    # Same seed as the server process, so the expected events can be computed locally
+    fake = FakeBustimes(services=args.services, days=args.days, journeys_per_day=args.journeys_per_day)
+    expected = sum(len(fake.details[j["id"]]["stops"]) for js in fake.journeys.values() for j in js)
+    journeys = sum(len(js) for js in fake.journeys.values())
+
+    stored = set()
+
+    def write(events):
+        # In-memory stand-in for the Mongo collection
+        time.sleep(args.write_ms / 1000)
+        stored.update(doc["_id"] for doc in events.documents())
+        return len(events)
+
+    options = dict(services=args.services, days=args.days, journeys_per_day=args.journeys_per_day,
+                   latency_ms=args.latency_ms, rate_limit=args.server_rate_limit)
+
+    def run(server):
+        # Running the ingester once, optionally resuming from (and updating) a checkpoint file
+        checkpoints = CheckpointStore(args.checkpoint) if args.checkpoint else None
+        ingester = JourneyIngester(transform_journeys, write, base_url=server.url, rate=args.rate,
+                                   burst=args.in_flight, max_in_flight=args.in_flight, batch_size=500,
+                                   checkpoints=checkpoints)
+        end = date(2025, 4, 20)
+        work = ingester.run(list(fake.services), date.fromordinal(end.toordinal() - args.days + 1), end)
+        try:
+            asyncio.run(asyncio.wait_for(work, args.stop_after))
+        except asyncio.TimeoutError:
+            print(f"Interrupted after {args.stop_after}s")
+        return ingester.stats
+
+    with ServerProcess(args.port, **options) as server:
+        stats = run(server)
+
+    elapsed = time.monotonic() - stats.started
+    if args.stop_after is not None or args.checkpoint:
+        # Partial or resumed runs only report what this run did
+        print(f"{stats.journeys} journeys fetched this run, {len(stored)} stop events written")
+        return
+    assert len(stored) == expected, f"stored {len(stored)} stop events, expected {expected}"
+    print(f"All {expected} stop events from {journeys} journeys stored")
+
+    # The previous loader slept 0.4 s per journey and 15 s per 100-journey batch, one service at a time
+    sequential = journeys * (0.4 + args.latency_ms / 1000) + 15 * sum(
+        (len(js) - 1) // 100 for js in fake.journeys.values())
+    print(f"concurrent: {journeys / elapsed:8.1f} journeys/s ({elapsed:.1f}s)")
+    print(f"sequential: {journeys / sequential:8.1f} journeys/s (estimated {sequential:.1f}s from its fixed sleeps)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os, sys, re, time, random, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from service_index import ServiceIndex
+
+PLACES = ["Manchester", "Piccadilly", "Bolton", "Bury", "Rochdale", "Oldham", "Stockport", "Wigan",
+          "Salford", "Trafford", "Altrincham", "Ashton", "Stalybridge", "Middleton", "Eccles",
+          "Leigh", "Hyde", "Denton", "Didsbury", "Chorlton", "Airport", "Interchange", "Shopping Centre"]
+
+def synthetic_services(count: int, seed: int = 42) -> list:
+    # Generating a fake service catalogue with realistic line numbers and descriptions
+    rng = random.Random(seed)
+    services = []
+    for i in range(count):
+        prefix = rng.choice(["", "", "", "X", "V", "N"])
+        origin, destination = rng.sample(PLACES, 2)
+        services.append({
+            "_id": 10000 + i,
+            "number": f"{prefix}{rng.randint(1, 999)}",
+            "description": f"{origin} {rng.choice(PLACES)} - {destination}",
+        })
+    return services
+
+def regex_search(services: list, query: str) -> list:
+    # Reproducing the previous $regex/$options "i" query over number and description
+    pattern = re.compile(query, re.IGNORECASE)
+    return [s for s in services
+            if pattern.search(s.get("number") or "") or pattern.search(s.get("description") or "")]
+
+def timed(fn, queries, repeat: int) -> float:
+    # Returning the mean time per query in milliseconds
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare service search index against the regex scan")
+    parser.add_argument("--services", type=int, default=50_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    services = synthetic_services(args.services)
+
+    start = time.perf_counter()
+    index = ServiceIndex(services)
+    print(f"Built index over {len(services)} services in {time.perf_counter() - start:.2f}s")
+
+    # Typeahead-style queries: every prefix of a few line numbers and place names
+    words = ["X50", "147", "7", "Piccadilly", "Stockport Airport", "rochd"]
+    queries = [w[:i] for w in words for i in range(1, len(w) + 1)]
+
+    # Checking that the index finds the same set of services as the regex scan
+    for q in queries:
+        expected = {s["_id"] for s in regex_search(services, q)}
+        found = {s["_id"] for s in index.search(q)}
+        assert expected == found, f"mismatch for {q!r}"
+
+    regex_ms = timed(lambda q: regex_search(services, q), queries, 1)
+    index_ms = timed(lambda q: index.search(q, args.limit), queries, args.repeat)
+    full_ms = timed(lambda q: index.search(q), queries, 1)
+
+    for label, ms in (("regex scan", regex_ms), (f"index, limit={args.limit}", index_ms), ("index, no limit", full_ms)):
+        print(f"{label:<20} {ms:8.3f} ms/query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os, sys, time, asyncio, argparse, random
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from load_services import fetch_services, service_document, diff_services, PAGE_SIZE
+from fake_upstream import ServerProcess
+
+def sequential_listing(base_url: str) -> list:
+    # The previous loader: one page after another, following the 'next' links
+    url, params, results = f"{base_url}/api/services/", {"page_size": PAGE_SIZE, "region_id": "NW"}, []
+    with httpx.Client(timeout=10) as client:
+        while url:
+            data = client.get(url, params=params).raise_for_status().json()
+            results.extend(data.get("results", []))
+            url, params = data.get("next"), None
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Service catalogue sync: sequential paging vs concurrent delta sync")
+    parser.add_argument("--services", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--rate", type=float, default=10.0, help="client requests/s")
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--changes", type=int, default=12, help="services added, changed and withdrawn between runs")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    with ServerProcess(args.port, services=args.services, latency_ms=args.latency_ms, days=1,
+                       journeys_per_day=1) as server:
+        start = time.perf_counter()
+        sequential = sequential_listing(server.url)
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = asyncio.run(fetch_services(server.url, rate=args.rate, burst=args.in_flight,
+                                                max_in_flight=args.in_flight))
+        concurrent_s = time.perf_counter() - start
+
+    assert sorted(s["id"] for s in sequential) == sorted(s["id"] for s in concurrent), "listings differ"
+    fetched = {doc["_id"]: doc for doc in map(service_document, concurrent) if doc is not None}
+
+    # Stored catalogue as a previous sync left it, then drifted by a few upstream changes
+    rng = random.Random(0)
+    stored = [dict(doc) for doc in fetched.values()]
+    rng.shuffle(stored)
+    k = args.changes // 3
+    for doc in stored[:k]:
+        doc["description"] += " (diverted)"   # changed upstream
+    del stored[k:2 * k]                        # added upstream
+    stored += [{**stored[0], "_id": -i} for i in range(1, k + 1)] # withdrawn upstream
+
+    unchanged = diff_services([dict(doc) for doc in fetched.values()], fetched)
+    added, changed, withdrawn = diff_services(stored, fetched)
+    pages = -(-args.services // PAGE_SIZE)
+    print(f"{args.services} services ({len(fetched)} Bee Network) in {pages} pages, {args.latency_ms:.0f} ms latency")
+    print(f"sequential listing: {sequential_s:6.2f}s")
+    print(f"concurrent listing: {concurrent_s:6.2f}s ({sequential_s / concurrent_s:.1f}x)")
+    print(f"unchanged catalogue: {sum(map(len, unchanged))} writes, services.json not rewritten")
+    print(f"after {len(added)} added, {len(changed)} changed, {len(withdrawn)} withdrawn: "
+          f"{len(added) + len(changed) + len(withdrawn)} writes vs {len(fetched)} upserts per full reload")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import os, sys, json, time, random, asyncio, argparse, subprocess, tempfile
+import holidays
+from datetime import date, timedelta
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+from metrics import peak_rss_mb, current_rss_mb
+from fake_upstream import ServerProcess
+
+ENDPOINTS = ["get_services", "get_closest_journey", "predict_delay", "get_stops"]
+STOPS_PER_ROUTE = 25
+
+HUB_STOP = "Synthetic Interchange"
+
+def generate_dataset(directory: str, events: int, seed: int = 0, hub_routes: int = 0) -> dict:
+    # Writing synthetic services.json and departures.json with `events` stop events, streamed
+    # to disk so the generator never holds the whole dataset. Returns request samples.
+    # With hub_routes, that many services also call at HUB_STOP (a busy interchange).
+    rng = random.Random(seed)
+    services_count = min(2000, max(5, events // 5000))
+    journeys_per_service = max(1, events // (services_count * STOPS_PER_ROUTE))
+    places = [f"Synthetic Stop {i}" for i in range(max(200, services_count * 10))]
+    first_day = date(2025, 4, 1)
+    uk_holidays = holidays.UK(subdiv="ENG")
+
+    services, routes = [], {}
+    for s in range(services_count):
+        service_id = 20_000 + s
+        route = rng.sample(places, STOPS_PER_ROUTE)
+        if s < hub_routes:
+            route[1 + s % (STOPS_PER_ROUTE - 2)] = HUB_STOP
+        routes[service_id] = route
+        services.append({"_id": service_id, "slug": f"service-{service_id}", "number": str(rng.randint(1, 999)),
+                         "description": f"{route[0]} - {route[-1]}", "region_id": "NW", "mode": "bus",
+                         "operator": "BNGN"})
+    with open(os.path.join(directory, "services.json"), "w") as f:
+        json.dump(services, f)
+
+    samples, written = [], 0
+    with open(os.path.join(directory, "departures.json"), "w") as f:
+        f.write("[")
+        for service_id, route in routes.items():
+            for j in range(journeys_per_service):
+                if written >= events:
+                    break
+                day = first_day + timedelta(days=j % 28)
+                start = 300 + rng.randrange(1000)
+                for index, stop in enumerate(route):
+                    if written >= events:
+                        break
+                    sched = (start + 3 * index) % 1440
+                    delay = rng.randint(-2, 12)
+                    actual = (sched + delay) % 1440
+                    weekday = day.weekday()
+                    doc = {
+                        "_id": f"{service_id}_{written}", "service_id": service_id, "journey_id": service_id * 10_000 + j,
+                        "stop_index": index, "stop_name": stop, "stop_id": written, "date": day.isoformat(),
+                        "origin": route[0], "destination": route[-1],
+                        "scheduled_dep": f"{sched // 60:02d}:{sched % 60:02d}", "scheduled_mins": sched,
+                        "actual_dep": f"{actual // 60:02d}:{actual % 60:02d}", "actual_mins": actual,
+                        "delay_mins": delay, "day_of_week": weekday,
+                        "is_peak": weekday < 5 and (420 <= sched < 540 or 900 <= sched < 1080),
+                        "is_holiday": day in uk_holidays,
+                    }
+                    f.write(("," if written else "") + json.dumps(doc))
+                    written += 1
+                    # Reservoir sample of real (service, stop, destination, time) combinations
+                    if len(samples) < 2000:
+                        samples.append(doc)
+                    elif rng.random() < 2000 / written:
+                        samples[rng.randrange(2000)] = doc
+        f.write("]")
+
+    return {"services": [s["_id"] for s in services], "numbers": [s["number"] for s in services],
+            "predict": [{"service_id": d["service_id"], "stop_name": d["stop_name"], "destination": d["destination"],
+                         "date": d["date"], "time": d["scheduled_dep"]} for d in samples]}
+
+def percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else 0.0
+
+async def drive(client, endpoint: str, make_request, requests: int, concurrency: int) -> dict:
+    # Sending `requests` calls from `concurrency` workers and recording each call's latency
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for n in counter:
+            method, url, kwargs = make_request(n)
+            start = time.perf_counter()
+            resp = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if resp.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+def run_app(args) -> dict:
+    # Importing main.py against the synthetic blobs, then driving each endpoint in-process
+    import httpx
+    os.environ["BLOB_LOCAL_DIR"] = args.data
+    os.environ["BUSTIMES_BASE_URL"] = args.upstream
+    os.environ["SNAPSHOT_PATH"] = os.path.join(args.data, "serving.snap")
+    if args.no_cache:
+        os.environ["PREDICTION_CACHE_MAX_ENTRIES"] = "0"
+        os.environ["STOPS_CACHE_TTL_SECONDS"] = "0"
+        os.environ["STOPS_CACHE_STALE_SECONDS"] = "0"
+
+    with open(os.path.join(args.data, "samples.json")) as f:
+        samples = json.load(f)
+
+    os.chdir(BACKEND)
+    start = time.perf_counter()
+    import main
+    startup = time.perf_counter() - start
+    rss_after_startup = current_rss_mb()
+    if args.startup_only:
+        return {"startup_seconds": startup, "rss_after_startup_mb": rss_after_startup}
+
+    rng = random.Random(1)
+    queries = ["", *samples["numbers"][:50], "Synthetic", "Stop 1", "Synthetic Stop 42"]
+    predict = samples["predict"]
+    upstream_services = samples["upstream_services"]
+    makers = {
+        "get_services": lambda n: ("GET", "/get_services", {"params": {"query": rng.choice(queries), "limit": 20}}),
+        "get_closest_journey": lambda n: ("POST", "/get_closest_journey", {"json": rng.choice(predict)}),
+        "predict_delay": lambda n: ("POST", "/predict_delay", {"json": rng.choice(predict)}),
+        "get_stops": lambda n: ("GET", "/get_stops", {"params": {"service_id": rng.choice(upstream_services)}}),
+    }
+
+    async def run_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = []
+            for endpoint in args.endpoints:
+                # Warming up (first-call imports, connection pool) before measuring
+                await drive(client, endpoint, makers[endpoint], min(50, args.requests), args.concurrency)
+                results.append(await drive(client, endpoint, makers[endpoint], args.requests, args.concurrency))
+            await main.stops_client.aclose()
+            return results
+
+    endpoints = asyncio.run(run_all())
+    return {
+        "events": args.events,
+        "startup_seconds": startup,
+        "rss_after_startup_mb": rss_after_startup,
+        "peak_rss_mb": peak_rss_mb(),
+        "endpoints": endpoints,
+    }
+
+def run_child(command: list, events: int) -> dict:
+    out = subprocess.run(command, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Benchmark run for {events} events failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FastAPI serving paths on synthetic data")
+    parser.add_argument("--events", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="dataset sizes (stop events) to benchmark, e.g. 1000 100000 10000000")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--no-cache", action="store_true", help="disable the prediction and stop list caches")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-services", type=int, default=40)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", default=None, help="write the JSON report here as well as stdout")
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--upstream", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.data:
+        # Child process: one dataset size, report printed as the last line
+        args.events = args.events[0]
+        print(json.dumps(run_app(args)))
+        return
+
+    # Recording the commit, so reports from different versions can be compared
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True)
+    report = {"commit": commit.stdout.strip() or None, "requests": args.requests, "concurrency": args.concurrency,
+              "no_cache": args.no_cache, "upstream_latency_ms": args.upstream_latency_ms, "runs": []}
+    with ServerProcess(args.port, services=args.upstream_services, latency_ms=args.upstream_latency_ms) as server:
+        for events in args.events:
+            with tempfile.TemporaryDirectory() as data:
+                start = time.perf_counter()
+                os.makedirs(os.path.join(data, "busdata"))
+                samples = generate_dataset(os.path.join(data, "busdata"), events)
+                samples["upstream_services"] = [20_000 + s for s in range(args.upstream_services)]
+                with open(os.path.join(data, "samples.json"), "w") as f:
+                    json.dump(samples, f)
+                print(f"Generated {events} stop events in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+                # Fresh processes per size, so startup time and RSS are not shared between runs.
+                # The first only starts the app (building the snapshot); the second starts from it.
+                command = [sys.executable, __file__, "--data", data, "--upstream", server.url,
+                           "--events", str(events), "--requests", str(args.requests),
+                           "--concurrency", str(args.concurrency), "--endpoints", *args.endpoints]
+                if args.no_cache:
+                    command.append("--no-cache")
+                cold = run_child(command + ["--startup-only"], events)
+                run = run_child(command, events)
+                run["cold_startup_seconds"] = cold["startup_seconds"]
+                report["runs"].append(run)
+                print(f"{events:>9} startup {run['cold_startup_seconds']:.2f}s cold, {run['startup_seconds']:.2f}s "
+                      f"from snapshot, RSS {run['rss_after_startup_mb']:.0f} MB", file=sys.stderr)
+                for e in run["endpoints"]:
+                    print(f"{events:>9} {e['endpoint']:<20} {e['throughput_rps']:8.1f} req/s  p50 {e['p50_ms']:7.2f}  "
+                          f"p95 {e['p95_ms']:7.2f}  p99 {e['p99_ms']:7.2f} ms  errors {e['errors']}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os, sys, json, time, random, argparse, subprocess, tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from training_data import load_training_frame, peak_rss_mb
+
+class FakeJourneys:
+    # Stand-in for the journeysBN collection: yields full stop-event documents lazily,
+    # honouring the projection like pymongo does
+
+    def __init__(self, events: int, seed: int = 0):
+        self.name = "journeysBN"
+        self.events = events
+        self.seed = seed
+
+    def estimated_document_count(self):
+        return self.events
+
+    def _documents(self):
+        rng = random.Random(self.seed)
+        stops = [f"Stop {i} Road" for i in range(7000)]
+        termini = [f"Terminus {i}" for i in range(550)]
+        for n in range(self.events):
+            sched = rng.randrange(300, 1440)
+            delay = rng.randint(-3, 15)
+            day = rng.randrange(7)
+            yield {
+                "_id": f"{20000 + n % 400}_{n}", "service_id": 20000 + n % 400, "journey_id": n // 30,
+                "stop_index": n % 30, "stop_name": rng.choice(stops), "stop_id": n, "date": "2025-04-17",
+                "origin": rng.choice(termini), "destination": rng.choice(termini),
+                "scheduled_dep": f"{sched // 60:02d}:{sched % 60:02d}", "scheduled_mins": sched,
+                "actual_dep": f"{(sched + delay) // 60 % 24:02d}:{(sched + delay) % 60:02d}",
+                "actual_mins": sched + delay, "delay_mins": delay, "day_of_week": day,
+                "is_peak": day < 5 and 420 <= sched < 540, "is_holiday": False,
+            }
+
+    def find(self, query=None, projection=None, batch_size=None):
+        keep = None if projection is None else {k for k, v in projection.items() if v}
+        for doc in self._documents():
+            yield doc if keep is None else {k: v for k, v in doc.items() if k in keep}
+
+def measure(path: str, events: int, cache: str) -> dict:
+    # Loading with one path in this process and reporting time and peak RSS
+    collection = FakeJourneys(events)
+    start = time.perf_counter()
+    if path == "legacy":
+        df = pd.DataFrame(list(collection.find({})))
+    else:
+        df = load_training_frame(collection, cache_path=cache, refresh=(path == "stream"))
+    return {
+        "path": path,
+        "rows": len(df),
+        "seconds": time.perf_counter() - start,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare training data loading paths (time and peak RSS)")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--path", choices=["legacy", "stream", "cache"], help=argparse.SUPPRESS)
+    parser.add_argument("--cache", default=os.path.join(tempfile.gettempdir(), "bench_journeys.arrow"))
+    args = parser.parse_args()
+
+    if args.path:
+        print(json.dumps(measure(args.path, args.events, args.cache)))
+        return
+
+    # Each path runs in a fresh process so peak RSS is not shared between them
+    print(f"{'path':<8} {'rows':>10} {'seconds':>9} {'frame MB':>9} {'peak RSS MB':>12}")
+    for path in ("legacy", "stream", "cache"):
+        out = subprocess.run([sys.executable, __file__, "--path", path, "--events", str(args.events),
+                              "--cache", args.cache], capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{path:<8} {result['rows']:>10} {result['seconds']:>9.2f} {result['frame_mb']:>9.1f} "
+              f"{result['peak_rss_mb']:>12.0f}")
+    os.remove(args.cache)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os, sys, time, json, random, argparse
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import holidays
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stop_events import transform_journeys
+
+LONDON = ZoneInfo("Europe/London")
+uk_holidays = holidays.UK(subdiv="ENG")
+
+def legacy_stop_events(svc_id, jid, detail):
+    # The previous per-stop loop of load_journeys.build_stop_events, kept for comparison.
+    # Actual times were shifted by a fixed +1 hour, which is only right during BST.
+    stops = detail.get("stops", [])
+    if not stops:
+        return []
+    first, last = stops[0], stops[-1]
+    j_date = datetime.fromisoformat(detail["datetime"]).date()
+    day = datetime.fromisoformat(j_date.isoformat()).date().weekday()
+    is_holiday = j_date in uk_holidays
+    events = []
+    for index, stop in enumerate(stops):
+        actual_dep_string = stop.get("actual_departure_time")
+        sched_dep = stop.get("aimed_departure_time")
+        if not actual_dep_string or not sched_dep:
+            continue
+        h, m = map(int, sched_dep.split(":"))
+        sched_mins = h * 60 + m
+        dt = datetime.fromisoformat(actual_dep_string.replace("Z", "+00:00")) + timedelta(hours=1)
+        actual_dep = dt.strftime("%H:%M")
+        h, m = map(int, actual_dep.split(":"))
+        actual_mins = h * 60 + m
+        events.append({
+            "_id": f"{svc_id}_{stop['id']}", "service_id": svc_id, "journey_id": jid, "stop_index": index,
+            "stop_name": stop["name"], "stop_id": stop["id"], "date": j_date.isoformat(),
+            "origin": first.get("name"), "destination": last.get("name"), "scheduled_dep": sched_dep,
+            "scheduled_mins": sched_mins, "actual_dep": actual_dep, "actual_mins": actual_mins,
+            "delay_mins": actual_mins - sched_mins, "day_of_week": day,
+            "is_peak": day < 5 and ((420 <= sched_mins < 540) or (900 <= sched_mins < 1080)),
+            "is_holiday": is_holiday,
+        })
+    return events
+
+def generate_journeys(count: int, days: list, stops_per_journey: int = 25, seed: int = 0):
+    # Journey details as served by bustimes.org: local aimed "HH:MM", actual times in UTC.
+    # Also returns the true local delay of every stop.
+    rng = random.Random(seed)
+    places = [f"Stop {i}" for i in range(200)]
+    journeys, delays = [], []
+    for jid in range(count):
+        svc_id = 20_000 + jid % 50
+        start = datetime.fromisoformat(rng.choice(days)).replace(hour=rng.randint(5, 21), minute=rng.randrange(60),
+                                                                 tzinfo=LONDON)
+        stops, delay = [], rng.randint(-1, 3)
+        for index, name in enumerate(rng.sample(places, stops_per_journey)):
+            aimed = start + timedelta(minutes=3 * index)
+            delay = max(-2, delay + rng.randint(-1, 2))
+            actual = (aimed + timedelta(minutes=delay)).astimezone(timezone.utc)
+            stops.append({"id": jid * 100 + index, "name": name, "aimed_departure_time": aimed.strftime("%H:%M"),
+                          "actual_departure_time": actual.strftime("%Y-%m-%dT%H:%M:%SZ")})
+            delays.append(delay)
+        journeys.append((svc_id, 1_000_000 + jid, {"id": jid, "datetime": start.isoformat(), "stops": stops}))
+    return journeys, delays
+
+def batches(journeys, batch_size: int):
+    # Write batches of about `batch_size` stop events, as the ingester's writer forms them
+    batch, stops = [], 0
+    for journey in journeys:
+        batch.append(journey)
+        stops += len(journey[2]["stops"])
+        if stops >= batch_size:
+            yield batch
+            batch, stops = [], 0
+    if batch:
+        yield batch
+
+def cpu_seconds(fn) -> float:
+    start = time.process_time()
+    fn()
+    return time.process_time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU time of the stop-event transform: per-stop loop vs batch")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="stop events per write batch")
+    args = parser.parse_args()
+
+    results = []
+    for season, days in [("BST", ["2025-04-17", "2025-04-18", "2025-04-19", "2025-04-20"]),
+                         ("GMT", ["2025-01-13", "2025-01-14", "2025-01-18", "2025-01-19"])]:
+        journeys, delays = generate_journeys(args.events // 25, days)
+        n = len(delays)
+        write_batches = list(batches(journeys, args.batch_size))
+
+        legacy, batch_docs = [], []
+        legacy_s = cpu_seconds(lambda: legacy.extend(d for j in journeys for d in legacy_stop_events(*j)))
+        columnar_s = cpu_seconds(lambda: [transform_journeys(b) for b in write_batches])
+        batch_s = cpu_seconds(lambda: batch_docs.extend(d for b in write_batches
+                                                        for d in transform_journeys(b).documents()))
+
+        # Apart from the actual times, both transforms must give the same documents
+        same = sum(a == b for a, b in zip(legacy, batch_docs) if a["actual_mins"] == b["actual_mins"])
+        agree = sum(a["actual_mins"] == b["actual_mins"] for a, b in zip(legacy, batch_docs))
+        results.append({
+            "season": season, "events": n,
+            "legacy_cpu_s_per_100k": legacy_s * 100_000 / n,
+            "columnar_cpu_s_per_100k": columnar_s * 100_000 / n,
+            "documents_cpu_s_per_100k": batch_s * 100_000 / n,
+            "legacy_correct_delays": sum(d["delay_mins"] == t for d, t in zip(legacy, delays)) / n,
+            "batch_correct_delays": sum(d["delay_mins"] == t for d, t in zip(batch_docs, delays)) / n,
+            "identical_where_times_agree": same == agree and len(legacy) == len(batch_docs),
+        })
+
+    print(f"{'season':<7} {'events':>8} {'loop s/100k':>12} {'columns s/100k':>15} {'docs s/100k':>12} "
+          f"{'speedup':>8} {'loop ok':>8} {'batch ok':>9}")
+    for r in results:
+        print(f"{r['season']:<7} {r['events']:>8} {r['legacy_cpu_s_per_100k']:>12.3f} "
+              f"{r['columnar_cpu_s_per_100k']:>15.3f} {r['documents_cpu_s_per_100k']:>12.3f} "
+              f"{r['legacy_cpu_s_per_100k'] / r['documents_cpu_s_per_100k']:>7.1f}x "
+              f"{r['legacy_correct_delays']:>8.1%} {r['batch_correct_delays']:>9.1%}")
+    print(json.dumps(results))
+    ok = all(r["batch_correct_delays"] == 1.0 and r["identical_where_times_agree"] for r in results)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
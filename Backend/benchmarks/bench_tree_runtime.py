@@ -0,0 +1,63 @@
+import os, sys, time, argparse
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tree_runtime import TreeModel
+
+def synthetic_features(rows: int, seed: int = 0) -> np.ndarray:
+    # Generating feature rows spanning the ranges seen in training
+    rng = np.random.default_rng(seed)
+    angle = rng.uniform(0, 2 * np.pi, rows)
+    return np.column_stack([
+        np.sin(angle), np.cos(angle),
+        rng.integers(0, 7, rows), rng.integers(0, 2, rows),
+        rng.integers(12885, 79815, rows), rng.integers(0, 112, rows),
+        rng.normal(2, 10, rows), rng.normal(2, 10, rows), rng.normal(2, 10, rows),
+    ]).astype(np.float64)
+
+def timed(fn, repeat: int) -> float:
+    # Returning the mean call time in milliseconds
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the flat tree runtime against LGBMRegressor")
+    parser.add_argument("--model", default="models/lgbm_model.pkl")
+    parser.add_argument("--trees", default="models/lgbm_model_trees.npz")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lgbm = joblib.load(args.model)
+    lgbm_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    trees = TreeModel.load(args.trees)
+    trees_load = time.perf_counter() - start
+
+    X = synthetic_features(args.rows)
+    frame = lambda rows: pd.DataFrame(rows, columns=lgbm.feature_name_)
+
+    # Parity: the runtime must reproduce LightGBM's output exactly
+    expected = lgbm.predict(frame(X))
+    actual = trees.predict(X)
+    if not np.array_equal(expected, actual):
+        worst = np.abs(expected - actual).max()
+        sys.exit(f"Parity check FAILED: max abs difference {worst}")
+    print(f"Parity check passed on {len(X)} rows")
+
+    print(f"load:       LGBMRegressor {lgbm_load * 1000:8.2f} ms   TreeModel {trees_load * 1000:8.2f} ms")
+    for rows in (1, len(X)):
+        batch = X[:rows]
+        lgbm_ms = timed(lambda: lgbm.predict(frame(batch)), args.repeat)
+        trees_ms = timed(lambda: trees.predict(batch), args.repeat)
+        print(f"{rows:>6} rows: LGBMRegressor {lgbm_ms:8.3f} ms   TreeModel {trees_ms:8.3f} ms")
+
+if __name__ == "__main__":
+    main()
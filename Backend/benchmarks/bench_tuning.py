@@ -0,0 +1,78 @@
+import os, sys, time, argparse, tempfile
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.metrics import mean_squared_error
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tuning import build_datasets, expand_grid, successive_halving, best_result, write_results
+from features import FEATURES
+
+# The grid train_model_with_gridsearchcv.py searches
+PARAM_GRID = {
+    "num_leaves": [50, 63, 75],
+    "max_depth": [10, 15, 20],
+    "learning_rate": [0.2, 0.15, 0.1],
+    "n_estimators": [100, 200],
+    "min_child_samples": [15, 25],
+}
+
+def synthetic_training_data(rows: int, seed: int = 0):
+    # Feature rows with a delay that depends on time of day, stop position and the encodings
+    rng = np.random.default_rng(seed)
+    mins = rng.integers(300, 1440, rows)
+    stop_index = rng.integers(0, 60, rows)
+    te = rng.normal(2, 3, (rows, 3))
+    X = pd.DataFrame({
+        "time_sin": np.sin(2 * np.pi * mins / 1440), "time_cos": np.cos(2 * np.pi * mins / 1440),
+        "day_of_week": rng.integers(0, 7, rows), "is_holiday": rng.random(rows) < 0.03,
+        "service_id": rng.integers(12885, 79815, rows), "stop_index": stop_index,
+        "origin_te": te[:, 0], "destination_te": te[:, 1], "stop_name_te": te[:, 2],
+    })[FEATURES]
+    peak = ((mins >= 420) & (mins < 540)) | ((mins >= 900) & (mins < 1080))
+    y = 3 * peak + 0.05 * stop_index + te @ [0.5, 0.3, 0.8] + rng.normal(0, 3, rows)
+    return X, pd.Series(y)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare GridSearchCV with cached-bin successive halving")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--cpus", type=int, default=os.cpu_count())
+    parser.add_argument("--skip-grid", action="store_true", help="only run successive halving")
+    parser.add_argument("--results", default=os.path.join(tempfile.gettempdir(), "bench_tuning.csv"))
+    args = parser.parse_args()
+
+    X, y = synthetic_training_data(args.rows)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    def test_rmse(model):
+        return np.sqrt(mean_squared_error(y_test, model.predict(X_test)))
+
+    # Successive halving over the same grid, n_estimators as the largest round budget
+    start = time.perf_counter()
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+    paths = build_datasets(X_fit, y_fit, X_valid, y_valid, tempfile.mkdtemp())
+    space = {k: v for k, v in PARAM_GRID.items() if k != "n_estimators"}
+    results = successive_halving(*paths, expand_grid(space), max_rounds=max(PARAM_GRID["n_estimators"]),
+                                 cpus=args.cpus)
+    best = best_result(results)
+    halving = LGBMRegressor(random_state=42, n_estimators=best["best_iteration"], verbose=-1,
+                            **{k: best[k] for k in space})
+    halving.fit(X_train, y_train)
+    halving_seconds = time.perf_counter() - start
+    write_results(results, args.results)
+    print(f"Trial table written to {args.results}")
+
+    print(f"{'search':<10} {'fits':>5} {'seconds':>9} {'test RMSE':>10}")
+    print(f"{'halving':<10} {len(results) + 1:>5} {halving_seconds:>9.1f} {test_rmse(halving):>10.4f}")
+
+    if not args.skip_grid:
+        start = time.perf_counter()
+        grid = GridSearchCV(LGBMRegressor(random_state=42, verbose=-1), PARAM_GRID,
+                            scoring="neg_root_mean_squared_error", cv=2, n_jobs=args.cpus)
+        grid.fit(X_train, y_train)
+        fits = len(expand_grid(PARAM_GRID)) * 2 + 1
+        print(f"{'grid':<10} {fits:>5} {time.perf_counter() - start:>9.1f} {test_rmse(grid.best_estimator_):>10.4f}")
+
+if __name__ == "__main__":
+    main()
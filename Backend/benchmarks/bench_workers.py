@@ -0,0 +1,111 @@
+import os, sys, json, time, random, argparse, subprocess, tempfile
+import urllib.request
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+from bench_serving import generate_dataset
+
+def smaps_rollup_mb(pid: int) -> dict:
+    # Rss, Pss and private (unique) memory of a process from /proc/<pid>/smaps_rollup
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def worker_pids(parent: int, workers: int) -> list:
+    # uvicorn's worker processes (children of the supervisor, minus multiprocessing helpers);
+    # with a single worker uvicorn serves from the supervisor process itself
+    if workers == 1:
+        return [parent]
+    with open(f"/proc/{parent}/task/{parent}/children") as f:
+        children = [int(pid) for pid in f.read().split()]
+    pids = []
+    for pid in children:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            if b"resource_tracker" not in f.read():
+                pids.append(pid)
+    return pids
+
+def post(url: str, body: dict):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return resp.read()
+    except urllib.error.HTTPError:
+        return None
+
+def measure(workers: int, port: int, env: dict, samples: list, requests: int) -> dict:
+    # Starting uvicorn with N workers, sending traffic over fresh connections (spread across
+    # the workers by the kernel) and reading each worker's memory
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--workers", str(workers), "--log-level", "warning"], cwd=BACKEND, env=env)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                urllib.request.urlopen(f"{base}/snapshot", timeout=1)
+                if len(worker_pids(server.pid, workers)) == workers:
+                    break
+            except OSError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.2)
+
+        rng = random.Random(0)
+        seen = set()
+        for _ in range(requests):
+            post(f"{base}/predict_delay", rng.choice(samples))
+            with urllib.request.urlopen(f"{base}/snapshot", timeout=10) as resp:
+                seen.add(json.loads(resp.read())["pid"])
+
+        memory = [smaps_rollup_mb(pid) for pid in worker_pids(server.pid, workers)]
+    finally:
+        server.terminate()
+        server.wait()
+
+    mean = lambda field: sum(m[field] for m in memory) / len(memory)
+    return {"workers": workers, "workers_serving": len(seen), "rss_mb": mean("rss"), "pss_mb": mean("pss"),
+            "uss_mb": mean("uss"), "total_pss_mb": sum(m["pss"] for m in memory)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that per-worker memory stays flat as uvicorn workers are added")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=400, help="requests sent before measuring")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed growth of per-worker private memory")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "busdata"))
+        samples = generate_dataset(os.path.join(root, "busdata"), args.events)["predict"]
+        env = {**os.environ, "BLOB_LOCAL_DIR": root, "SNAPSHOT_PATH": os.path.join(root, "serving.snap"),
+               "SNAPSHOT_POLL_SECONDS": "0"}
+
+        # Publishing the snapshot once, as a deployment would, before any worker starts
+        subprocess.run([sys.executable, "snapshot.py", "--output", env["SNAPSHOT_PATH"]], cwd=BACKEND, env=env,
+                       check=True)
+        snapshot_mb = os.path.getsize(env["SNAPSHOT_PATH"]) / 1e6
+
+        results = [measure(n, args.port, env, samples, args.requests) for n in args.workers]
+
+    print(f"snapshot {snapshot_mb:.1f} MB, {args.events} stop events")
+    print(f"{'workers':>7} {'serving':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15} {'total PSS':>10}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['workers_serving']:>8} {r['rss_mb']:>11.1f} {r['pss_mb']:>11.1f} "
+              f"{r['uss_mb']:>15.1f} {r['total_pss_mb']:>10.1f}")
+
+    # Per-worker private memory must not grow with the worker count (shared pages are not copied)
+    base, worst = results[0]["uss_mb"], max(r["uss_mb"] for r in results)
+    flat = worst <= base * (1 + args.tolerance)
+    print(f"per-worker private memory {base:.1f} -> {worst:.1f} MB: {'flat' if flat else 'GREW'}")
+    sys.exit(0 if flat else 1)
+
+if __name__ == "__main__":
+    main()
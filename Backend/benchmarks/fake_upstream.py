@@ -0,0 +1,178 @@
+import os
+import sys
+import asyncio
+import random
+import subprocess
+import time
+import argparse
+import urllib.request
+from datetime import datetime, timedelta
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+class FakeBustimes:
+    # Local stand-in for the bustimes.org endpoints used by the backend, with synthetic
+    # services, journeys and stop times, a fixed per-request latency and an optional rate limit
+    # (requests per second) answered with 429 + Retry-After like the real API.
+
+    def __init__(self, services: int = 20, days: int = 3, journeys_per_day: int = 10,
+                 stops_per_journey: int = 20, latency_ms: float = 50.0, rate_limit: float = None,
+                 end_date: str = "2025-04-20", seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.throttled = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+        rng = random.Random(seed)
+        places = [f"Stop {i}" for i in range(stops_per_journey * 4)]
+        end = datetime.fromisoformat(end_date)
+
+        self.services = {}
+        self.journeys = {} # service_id -> journey summaries, newest first
+        self.details = {}  # journey_id -> journey detail
+        journey_id = 1_000_000
+
+        for s in range(services):
+            service_id = 20_000 + s
+            route = rng.sample(places, stops_per_journey)
+            self.services[service_id] = {
+                "id": service_id,
+                "slug": f"service-{service_id}",
+                "line_name": str(rng.randint(1, 999)),
+                "description": f"{route[0]} - {route[-1]}",
+                "region_id": "NW",
+                "mode": "bus",
+                "operator": [rng.choice(["BNGN", "BNSM", "BNFM", "BNDB", "BNVB", "BNML", "ANWE"])],
+            }
+
+            summaries = []
+            for day in range(days):
+                for j in range(journeys_per_day):
+                    journey_id += 1
+                    # Alternating direction; circular journeys are not generated
+                    stops = route if j % 2 == 0 else route[::-1]
+                    start = (end - timedelta(days=day)).replace(hour=6) + timedelta(minutes=j * 1080 // journeys_per_day)
+                    summaries.append({"id": journey_id, "datetime": start.isoformat() + "+01:00"})
+                    self.details[journey_id] = self._journey_detail(rng, journey_id, start, stops)
+            summaries.sort(key=lambda js: js["datetime"], reverse=True)
+            self.journeys[service_id] = summaries
+
+        self.app = self._build_app()
+
+    @staticmethod
+    def _journey_detail(rng, journey_id: int, start: datetime, stops: list) -> dict:
+        # Building a journey with scheduled local times and actual UTC times (BST = UTC+1)
+        detail_stops, delay = [], rng.randint(-1, 3)
+        for index, name in enumerate(stops):
+            aimed = start + timedelta(minutes=3 * index)
+            delay = max(-2, delay + rng.randint(-1, 2))
+            actual_utc = aimed + timedelta(minutes=delay) - timedelta(hours=1)
+            detail_stops.append({
+                "id": journey_id * 100 + index,
+                "name": name,
+                "aimed_departure_time": aimed.strftime("%H:%M"),
+                "actual_departure_time": actual_utc.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+        return {"id": journey_id, "datetime": start.isoformat() + "+01:00", "stops": detail_stops}
+
+    def _throttle(self):
+        # Returning a 429 response when the rate limit is exceeded, else None
+        self.requests += 1
+        if self.rate_limit is None:
+            return None
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        if self._window_count > self.rate_limit:
+            self.throttled += 1
+            retry_after = max(1, round(1.0 - (now - self._window_start)))
+            return JSONResponse({"detail": "Request was throttled."}, status_code=429,
+                                headers={"Retry-After": str(retry_after)})
+        return None
+
+    @staticmethod
+    def _page(request: Request, items: list, page: int, page_size: int) -> dict:
+        start = (page - 1) * page_size
+        has_next = start + page_size < len(items)
+        next_url = str(request.url.include_query_params(page=page + 1)) if has_next else None
+        return {"count": len(items), "next": next_url, "results": items[start:start + page_size]}
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+
+        @app.get("/api/services/")
+        async def list_services(request: Request, page: int = 1, page_size: int = 100, region_id: str = None):
+            return self._page(request, list(self.services.values()), page, page_size)
+
+        @app.get("/api/services/{service_id}")
+        async def get_service(service_id: int):
+            if service_id not in self.services:
+                return JSONResponse({"detail": "Not found."}, status_code=404)
+            return self.services[service_id]
+
+        @app.get("/api/vehiclejourneys/")
+        async def list_journeys(request: Request, service: int, page: int = 1, page_size: int = 100):
+            return self._page(request, self.journeys.get(service, []), page, page_size)
+
+        @app.get("/services/{service_id}/journeys/{journey_id}.json")
+        async def get_journey(service_id: int, journey_id: int):
+            if journey_id not in self.details:
+                return JSONResponse({"detail": "Not found."}, status_code=404)
+            return self.details[journey_id]
+
+        async def latency_and_rate_limit(scope, receive, send):
+            # Delaying every request and answering 429 once over the rate limit
+            if scope["type"] == "http":
+                await asyncio.sleep(self.latency)
+                throttled = self._throttle()
+                if throttled is not None:
+                    return await throttled(scope, receive, send)
+            await app(scope, receive, send)
+
+        return latency_and_rate_limit
+
+class ServerProcess:
+    # Running the fake API in a separate process, so it does not compete with the client for the GIL
+
+    def __init__(self, port: int = 8765, **options):
+        self.url = f"http://127.0.0.1:{port}"
+        self.args = [sys.executable, os.path.abspath(__file__), "--port", str(port)]
+        for name, value in options.items():
+            if value is not None:
+                self.args += [f"--{name.replace('_', '-')}", str(value)]
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.args)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"{self.url}/api/services/?page_size=1", timeout=1)
+                return self
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Fake upstream failed to start")
+                time.sleep(0.1)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake bustimes.org API locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--journeys-per-day", type=int, default=10)
+    args = parser.parse_args()
+
+    fake = FakeBustimes(services=args.services, days=args.days, journeys_per_day=args.journeys_per_day,
+                        latency_ms=args.latency_ms, rate_limit=args.rate_limit)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,152 @@
+import os
+import gzip
+import json
+import time
+import zlib
+import codecs
+from types import SimpleNamespace
+from metrics import peak_rss_mb, current_rss_mb
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+class LocalBlobClient:
+    # Stand-in for an Azure blob client serving <root>/<container>/<blob> from the local
+    # filesystem (used when BLOB_LOCAL_DIR is set, e.g. in development and benchmarks)
+
+    def __init__(self, root: str, container: str, blob: str):
+        self.path = os.path.join(root, container, blob)
+
+    def download_blob(self):
+        path = self.path
+
+        class Download:
+            def readall(self):
+                with open(path, "rb") as f:
+                    return f.read()
+
+            def chunks(self):
+                with open(path, "rb") as f:
+                    while chunk := f.read(CHUNK_SIZE):
+                        yield chunk
+        return Download()
+
+    def upload_blob(self, data: bytes, overwrite: bool = False):
+        # Replacing the file atomically, so readers never see a partial blob
+        if not overwrite and os.path.exists(self.path):
+            raise FileExistsError(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def get_blob_properties(self):
+        stat = os.stat(self.path)
+        return SimpleNamespace(etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+def blob_client(container: str, blob: str):
+    local = os.environ.get("BLOB_LOCAL_DIR")
+    if local:
+        return LocalBlobClient(local, container, blob)
+
+    from azure.storage.blob import BlobServiceClient
+    connection = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
+    service = BlobServiceClient.from_connection_string(connection)
+    return service.get_blob_client(container=container, blob=blob)
+
+# Loading JSON from blob
+def load_from_blob(container: str, blob: str):
+    data = blob_client(container, blob).download_blob().readall()
+
+    if blob.endswith(".gz"):
+        data = gzip.decompress(data)
+
+    return json.loads(data)
+
+def save_to_blob(container: str, blob: str, value):
+    # Writing JSON to blob (gzipped for .gz names), replacing the current contents
+    data = json.dumps(value).encode()
+    if blob.endswith(".gz"):
+        data = gzip.compress(data)
+    blob_client(container, blob).upload_blob(data, overwrite=True)
+
+def blob_version(container: str, blob: str) -> str:
+    # Getting the blob's ETag, which changes whenever the blob is rewritten
+    return blob_client(container, blob).get_blob_properties().etag
+
+def decoded_chunks(chunks, gzipped: bool):
+    # Decompressing (if gzipped) and UTF-8 decoding byte chunks as they arrive
+    # Output is capped at CHUNK_SIZE per step, since JSON inflates many times over
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        if decompressor is None:
+            yield decoder.decode(chunk)
+            continue
+        while chunk:
+            yield decoder.decode(decompressor.decompress(chunk, CHUNK_SIZE))
+            chunk = decompressor.unconsumed_tail
+    tail = decompressor.flush() if decompressor is not None else b""
+    yield decoder.decode(tail, final=True)
+
+def iter_json_array(texts):
+    # Yielding the elements of a top-level JSON array from text chunks, one element at a time.
+    # Only the unparsed tail of the current chunk is buffered.
+    decoder = json.JSONDecoder()
+    buffer, pos, started = "", 0, False
+    for text in texts:
+        buffer = buffer[pos:] + text
+        pos = 0
+        while True:
+            # Skipping whitespace, the opening bracket and separators
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break # element continues in the next chunk
+            if end == len(buffer):
+                break # a number or literal could still continue
+            yield value
+            pos = end
+    raise ValueError("Unexpected end of JSON array" if started else "Empty JSON payload")
+
+def iter_ndjson(texts):
+    # Yielding one record per non-empty line
+    buffer = ""
+    for text in texts:
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+def iter_blob_records(container: str, blob: str):
+    # Streaming the records of a JSON array or NDJSON blob (optionally .gz): chunks are
+    # decompressed and parsed as they are downloaded, so the whole payload is never in memory
+    chunks = blob_client(container, blob).download_blob().chunks()
+    name = blob[:-3] if blob.endswith(".gz") else blob
+    texts = decoded_chunks(chunks, gzipped=blob.endswith(".gz"))
+    if name.endswith((".ndjson", ".jsonl")):
+        return iter_ndjson(texts)
+    return iter_json_array(texts)
+
+def load_blob_into(container: str, blob: str, build):
+    # Feeding the streamed records straight into build(records), logging load time and memory
+    start = time.perf_counter()
+    rss_before = current_rss_mb()
+    result = build(iter_blob_records(container, blob))
+    print(f"Loaded {container}/{blob} in {time.perf_counter() - start:.1f}s "
+          f"(RSS +{current_rss_mb() - rss_before:.0f} MB, peak RSS {peak_rss_mb():.0f} MB)")
+    return result
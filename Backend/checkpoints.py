@@ -0,0 +1,65 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+class CheckpointStore:
+    # Ingestion progress per service, kept in a JSON file so an interrupted or nightly run can
+    # pick up where the last one stopped:
+    #   high_water - datetime of the newest journey of the last fully ingested listing
+    #   journeys   - IDs (and datetimes) of journeys already written at or after the overlap window
+    # Listing pages back to high_water - overlap and skips any journey already recorded, which
+    # also catches journeys that appear in the listing late.
+    # Every method takes the lock, so the store can be used from several threads at once.
+
+    def __init__(self, path: str, overlap: timedelta = timedelta(days=1)):
+        self.path = path
+        self.overlap = overlap
+        self.lock = threading.Lock()
+        self.services = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.services = json.load(f)
+
+    def _entry(self, svc_id) -> dict:
+        return self.services.setdefault(str(svc_id), {"high_water": None, "journeys": {}})
+
+    def since(self, svc_id):
+        # Getting the datetime listing can stop at for a service (None if never ingested)
+        with self.lock:
+            entry = self.services.get(str(svc_id))
+            if not entry or not entry["high_water"]:
+                return None
+            return datetime.fromisoformat(entry["high_water"]) - self.overlap
+
+    def known(self, svc_id) -> set:
+        # Getting the IDs of the service's journeys that are already stored
+        with self.lock:
+            entry = self.services.get(str(svc_id))
+            return {int(jid) for jid in entry["journeys"]} if entry else set()
+
+    def mark_ingested(self, journeys):
+        # Recording (svc_id, journey_id, journey_datetime) tuples whose stop events were written
+        with self.lock:
+            for svc_id, jid, j_datetime in journeys:
+                self._entry(svc_id)["journeys"][str(jid)] = j_datetime
+            self.save()
+
+    def complete(self, svc_id, newest: str):
+        # Advancing the high-water mark once every listed journey of the service is stored,
+        # and forgetting journeys older than the new overlap window
+        with self.lock:
+            entry = self._entry(svc_id)
+            if entry["high_water"] is None or datetime.fromisoformat(newest) > datetime.fromisoformat(entry["high_water"]):
+                entry["high_water"] = newest
+            cutoff = datetime.fromisoformat(entry["high_water"]) - self.overlap
+            entry["journeys"] = {jid: dt for jid, dt in entry["journeys"].items()
+                                 if datetime.fromisoformat(dt) >= cutoff}
+            self.save()
+
+    def save(self):
+        # Writing atomically, so a crash never leaves a truncated checkpoint file
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.services, f)
+        os.replace(tmp, self.path)
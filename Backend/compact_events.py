@@ -0,0 +1,211 @@
+import os
+import argparse
+import hashlib
+import numpy as np
+from bson import Binary
+
+# Compact journey layout for stored stop events. Instead of one document per stop event
+# repeating every string, a journey is one document holding its stops as packed little-endian
+# columns (BSON binary), with stop and route names replaced by codes into a shared dictionary:
+#
+#   {"_id": "<service_id>_<journey_id>", "service_id", "journey_id", "date": "YYYY-MM-DD",
+#    "origin": code, "destination": code, "count": stops,
+#    "stop_name": int32[], "stop_index": int16[], "stop_id": int64[],
+#    "scheduled_mins": int16[], "actual_mins": int16[], "flags": uint8[]}
+#
+# delay_mins, scheduled_dep and actual_dep are derived from the minute columns, and the day of
+# week, holiday and peak fields are packed into the flag byte of each stop. Training and the
+# snapshot exporter read the date partitions of both layouts (stop_event_collections).
+COMPACT_JOURNEYS_COL = "journeysBNCompact"
+NAMES_COL = "stopNamesBN"
+DOCUMENTS_COL = "journeysBN" # partitions of the one-document-per-stop-event layout (load_journeys.JOURNEYS_COL)
+
+STOP_COLUMNS = {
+    "stop_name":      np.dtype("<i4"), # name dictionary code
+    "stop_index":     np.dtype("<i2"),
+    "stop_id":        np.dtype("<i8"),
+    "scheduled_mins": np.dtype("<i2"),
+    "actual_mins":    np.dtype("<i2"),
+    "flags":          np.dtype("u1"),
+}
+
+# Bit layout of the per-stop flag byte
+HOLIDAY_FLAG = 1 << 0
+PEAK_FLAG    = 1 << 1
+DAY_SHIFT    = 2 # day_of_week in bits 2-4
+
+def pack_event_flags(is_holiday: bool, is_peak: bool, day_of_week: int) -> int:
+    return (HOLIDAY_FLAG if is_holiday else 0) | (PEAK_FLAG if is_peak else 0) | (day_of_week << DAY_SHIFT)
+
+def minutes_to_time(mins: int) -> str:
+    return f"{mins // 60:02d}:{mins % 60:02d}"
+
+class NameDictionary:
+    # Stop/route name <-> integer code table shared by every compact journey, kept in its own
+    # collection as {"_id": code, "name": name}. New names get the next free code and are
+    # written by flush(), which must run before the journeys that use them are written.
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.codes = {}
+        self.names = []
+        self.pending = []
+        if collection is not None:
+            for doc in collection.find({}, sort=[("_id", 1)]):
+                if doc["_id"] != len(self.names):
+                    raise ValueError(f"Name dictionary {collection.name} has a gap at code {len(self.names)}")
+                self.codes[doc["name"]] = doc["_id"]
+                self.names.append(doc["name"])
+
+    def code(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+            self.pending.append({"_id": code, "name": name})
+        return code
+
+    def flush(self):
+        if self.pending and self.collection is not None:
+            self.collection.insert_many(self.pending, ordered=True)
+        self.pending = []
+
+def compact_journeys(events, names: NameDictionary) -> list:
+    # Grouping stop event documents (as built by StopEvents.documents) into compact
+    # journey documents, one per (service_id, journey_id), stops kept in their original order
+    journeys = {}
+    for doc in events:
+        journeys.setdefault((doc["service_id"], doc["journey_id"]), []).append(doc)
+
+    docs = []
+    for (service_id, journey_id), stops in journeys.items():
+        columns = {
+            "stop_name":      [names.code(s["stop_name"]) for s in stops],
+            "stop_index":     [s["stop_index"] for s in stops],
+            "stop_id":        [s["stop_id"] for s in stops],
+            "scheduled_mins": [s["scheduled_mins"] for s in stops],
+            "actual_mins":    [s["actual_mins"] for s in stops],
+            "flags":          [pack_event_flags(s["is_holiday"], s["is_peak"], s["day_of_week"]) for s in stops],
+        }
+        first = stops[0]
+        docs.append({
+            "_id":         f"{service_id}_{journey_id}",
+            "service_id":  service_id,
+            "journey_id":  journey_id,
+            "date":        first["date"],
+            "origin":      names.code(first["origin"]),
+            "destination": names.code(first["destination"]),
+            "count":       len(stops),
+            **{col: Binary(np.asarray(values, dtype=STOP_COLUMNS[col]).tobytes()) for col, values in columns.items()},
+        })
+    return docs
+
+def expand_journey(doc: dict, names: list):
+    # Yielding the stop event documents of one compact journey (the inverse of compact_journeys)
+    columns = {col: np.frombuffer(doc[col], dtype=dtype) for col, dtype in STOP_COLUMNS.items()}
+    origin, destination = names[doc["origin"]], names[doc["destination"]]
+    for i in range(doc["count"]):
+        sched, actual, flags = int(columns["scheduled_mins"][i]), int(columns["actual_mins"][i]), int(columns["flags"][i])
+        yield {
+            "_id":            f"{doc['service_id']}_{int(columns['stop_id'][i])}",
+            "service_id":     doc["service_id"],
+            "journey_id":     doc["journey_id"],
+            "stop_index":     int(columns["stop_index"][i]),
+            "stop_name":      names[columns["stop_name"][i]],
+            "stop_id":        int(columns["stop_id"][i]),
+            "date":           doc["date"],
+            "origin":         origin,
+            "destination":    destination,
+            "scheduled_dep":  minutes_to_time(sched),
+            "scheduled_mins": sched,
+            "actual_dep":     minutes_to_time(actual),
+            "actual_mins":    actual,
+            "delay_mins":     actual - sched,
+            "day_of_week":    flags >> DAY_SHIFT,
+            "is_peak":        bool(flags & PEAK_FLAG),
+            "is_holiday":     bool(flags & HOLIDAY_FLAG),
+        }
+
+def iter_stop_events(journeys, names: list):
+    # Streaming the stop events of many compact journeys (e.g. a MongoDB cursor)
+    for doc in journeys:
+        yield from expand_journey(doc, names)
+
+class CompactEvents:
+    # A compact journey collection read as stop event documents, with the part of the collection
+    # API the training loaders use. Queries apply to whole journeys, so only the journey-level
+    # fields (service_id, journey_id, date) select the same events as in the document layout.
+
+    def __init__(self, collection, names: list):
+        self.collection = collection
+        self.names = names
+        self.name = collection.name
+
+    def estimated_document_count(self) -> int:
+        return self.collection.estimated_document_count()
+
+    def find(self, query: dict = None, projection: dict = None, batch_size: int = 1000):
+        keep = None if projection is None else {field for field, on in projection.items() if on}
+        for doc in iter_stop_events(self.collection.find(query or {}, batch_size=batch_size), self.names):
+            yield doc if keep is None else {field: value for field, value in doc.items() if field in keep}
+
+def stop_event_collections(db, start=None, end=None, documents_col: str = DOCUMENTS_COL,
+                           journeys_col: str = COMPACT_JOURNEYS_COL, names_col: str = NAMES_COL) -> list:
+    # (date, collection) of every date partition between start and end, oldest first, whichever
+    # layout the date was stored in; compact journeys come wrapped in CompactEvents. A date stored
+    # in both layouts is an error rather than being read twice.
+    from partitions import list_partitions
+
+    documents = list_partitions(db, documents_col, start, end)
+    compact = list_partitions(db, journeys_col, start, end)
+    both = sorted({day for day, _ in documents} & {day for day, _ in compact})
+    if both:
+        raise ValueError(f"Service dates stored in both {documents_col} and {journeys_col}: "
+                         + ", ".join(map(str, both)))
+    names = NameDictionary(db[names_col]).names if compact else []
+    return sorted([(day, db[name]) for day, name in documents] +
+                  [(day, CompactEvents(db[name], names)) for day, name in compact], key=lambda p: p[0])
+
+def export_snapshot(db, path: str, services_col: str = "servicesBN", journeys_col: str = COMPACT_JOURNEYS_COL,
+                    names_col: str = NAMES_COL, query: dict = None, start=None, end=None,
+                    documents_col: str = DOCUMENTS_COL) -> str:
+    # Building the serving snapshot straight from the stored stop events and the services collection,
+    # reading only the date partitions between start and end (see partitions.py), in either layout.
+    # The version is a hash of the exported data and local model files, so re-exporting unchanged
+    # data yields the same version and running servers do not swap.
+    from departure_index import DepartureIndex
+    from snapshot import write_serving_snapshot, local_inputs_version
+
+    services = list(db[services_col].find({}))
+    collections = stop_event_collections(db, start, end, documents_col, journeys_col, names_col)
+    departures = DepartureIndex(doc for _, col in collections for doc in col.find(query or {}, batch_size=1000))
+
+    digest = hashlib.sha1(local_inputs_version().encode())
+    for array in departures.to_arrays().values():
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(sorted((s["_id"], s.get("description")) for s in services)).encode())
+    version = digest.hexdigest()
+
+    write_serving_snapshot(path, version, services, departures, source=f"mongodb:{documents_col}+{journeys_col}")
+    return version
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Export the serving snapshot from the stop events in MongoDB")
+    parser.add_argument("--output", default=os.environ.get("SNAPSHOT_PATH", "snapshot/serving.snap"))
+    parser.add_argument("--documents", default=DOCUMENTS_COL, help="stop event documents collection (partition base name)")
+    parser.add_argument("--journeys", default=COMPACT_JOURNEYS_COL, help="compact journeys collection (partition base name)")
+    parser.add_argument("--start", default=None, help="first service date to export (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="last service date to export (YYYY-MM-DD)")
+    parser.add_argument("--profiles", action="store_true", help="also precompute the delay profiles (slow)")
+    args = parser.parse_args()
+
+    client = MongoClient("") # MISSING LINK
+    db = client["BusDelayPredict"]
+    version = export_snapshot(db, args.output, journeys_col=args.journeys, start=args.start, end=args.end,
+                              documents_col=args.documents)
+    if args.profiles:
+        from snapshot import add_profiles
+        version = add_profiles(args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB, version {version[:12]})")
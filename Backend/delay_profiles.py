@@ -0,0 +1,185 @@
+import numpy as np
+from departure_index import HOLIDAY_BIT, PEAK_BIT, NAME_BITS, day_bit
+from features import FEATURES
+
+# Precomputed delay answers per departure-index key, on a grid of
+# holiday flag (2) x weekday (7) x time bucket (1440 / resolution), laid out [key, holiday, day, bucket].
+# Each cell holds what /predict_delay would answer at the bucket's midpoint (the model prediction
+# and the scheduled departure of the closest journey that weekday) plus historical delay percentiles
+# of the matching journeys. Cells with no history in the window hold the sentinels below.
+# The grid is an overview (/delay_profile): a request inside a bucket can match another journey than
+# its midpoint does. /predict_delay instead finds its closest journey live and reads the model's
+# answer for that exact journey from the per-journey table [journey, holiday, day], which holds the
+# prediction for every distinct (key, scheduled_mins) of the index.
+WINDOW_MINS = 30  # must match the ±30 minute window of /get_closest_journey
+NO_DELAY = -128   # int8 sentinel: no matching history (serving falls back to live evaluation)
+NO_DEP = -1
+PREDICT_CHUNK = 20_000 # model rows scored per call
+
+def is_peak(mins, weekday: int):
+    # Peak hours (7-9am & 3-6pm on weekdays), vectorised over minutes
+    if weekday >= 5:
+        return np.zeros(np.shape(mins), dtype=bool)
+    return ((420 <= mins) & (mins < 540)) | ((900 <= mins) & (mins < 1080))
+
+def closest(times: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    # Index into sorted `times` of the event nearest each query within the window (-1 if none).
+    # Ties go to the earlier time, and equal times to the first event, as DepartureIndex.closest does.
+    if len(times) == 0:
+        return np.full(len(queries), -1)
+    after = np.searchsorted(times, queries, side="left") # first event at or after the query
+    before = np.searchsorted(times, times[np.maximum(after - 1, 0)], side="left") # first event of the time before
+    far = np.iinfo(np.int32).max
+    d_before = np.where(after > 0, queries - times[np.maximum(after - 1, 0)], far)
+    d_after = np.where(after < len(times), times[np.minimum(after, len(times) - 1)] - queries, far)
+    pick = np.where(d_before <= d_after, before, after)
+    return np.where(np.minimum(d_before, d_after) <= WINDOW_MINS, pick, -1)
+
+def window_percentiles(times: np.ndarray, delays: np.ndarray, queries: np.ndarray, qs) -> np.ndarray:
+    # Nearest-rank percentiles of the delays of events within the window of each query,
+    # from cumulative per-delay counts (shape len(qs) x len(queries); NO_DELAY where empty).
+    # Delays are clipped to the int8 range stored first, which leaves the clipped percentiles
+    # unchanged and bounds the count matrix to 255 columns.
+    out = np.full((len(qs), len(queries)), NO_DELAY, dtype=np.int8)
+    if len(times) == 0:
+        return out
+    delays = np.clip(delays, -127, 127)
+    low = int(delays.min())
+    onehot = np.zeros((len(times) + 1, int(delays.max()) - low + 1), dtype=np.int32)
+    onehot[np.arange(1, len(times) + 1), delays - low] = 1
+    prefix = np.cumsum(onehot, axis=0)
+
+    lo = np.searchsorted(times, queries - WINDOW_MINS, side="left")
+    hi = np.searchsorted(times, queries + WINDOW_MINS, side="right")
+    cumulative = np.cumsum(prefix[hi] - prefix[lo], axis=1)
+    total = hi - lo
+    for i, q in enumerate(qs):
+        rank = np.maximum(np.ceil(q * total), 1)
+        value = low + np.argmax(cumulative >= rank[:, None], axis=1)
+        out[i] = np.where(total > 0, value, NO_DELAY)
+    return out
+
+def build_profiles(departures, routes, model, resolution: int = 15, log=print) -> dict:
+    # Evaluating every key of the departure index on the profile grid (offline, at snapshot build)
+    if resolution <= 0 or 60 % resolution:
+        raise ValueError("Profile resolution must divide 60 minutes (so no bucket straddles a peak boundary)")
+    buckets = 1440 // resolution
+    queries = np.arange(buckets) * resolution + resolution // 2
+    keys = departures.key_count()
+
+    predicted = np.full((keys, 2, 7, buckets), NO_DELAY, dtype=np.int8)
+    p50 = np.full((keys, 2, 7, buckets), NO_DELAY, dtype=np.int8)
+    p90 = np.full((keys, 2, 7, buckets), NO_DELAY, dtype=np.int8)
+    dep = np.full((keys, 7, buckets), NO_DEP, dtype=np.int16)
+    sched = np.full((keys, 2, 7, buckets), -1, dtype=np.int16) # scheduled_mins fed to the model
+
+    names = departures.name_list
+    peak = np.stack([is_peak(queries, d) for d in range(7)]) # [day, bucket]
+    statics = np.full((keys, 5), np.nan) # service_id, stop_index, origin_te, destination_te, stop_name_te
+
+    for k in range(keys):
+        start, end = int(departures.key_bounds[k]), int(departures.key_bounds[k + 1])
+        times = departures.scheduled_mins[start:end].astype(np.int32)
+        flags = departures.flags[start:end]
+        delays = departures.delay_mins[start:end].astype(np.int32)
+
+        # Static model inputs of the key (left NaN, so the key gets no predictions, if unresolvable)
+        key_id = int(departures.key_ids[k])
+        service_id = key_id >> 2 * NAME_BITS
+        route = routes.service(service_id)
+        stop_pos = departures.stop_position(service_id, names[(key_id >> NAME_BITS) & ((1 << NAME_BITS) - 1)])
+        if route is not None and stop_pos is not None:
+            statics[k] = [service_id, departures.stop_values[stop_pos], *route, routes.stop_te[stop_pos]]
+
+        # Closest journey and percentiles within each (holiday, peak) group
+        for holiday in (0, 1):
+            for is_pk in (0, 1):
+                expected = (HOLIDAY_BIT if holiday else 0) | (PEAK_BIT if is_pk else 0)
+                group = np.flatnonzero((flags & (HOLIDAY_BIT | PEAK_BIT)) == expected)
+                nearest = closest(times[group], queries)
+                group_sched = np.append(times[group], -1)[nearest] # -1 (no journey) where nearest is -1
+                pct = window_percentiles(times[group], delays[group], queries, (0.5, 0.9))
+                cells = peak == bool(is_pk) # [day, bucket] cells this group answers
+                for day in range(7):
+                    mask = cells[day]
+                    sched[k, holiday, day, mask] = group_sched[mask]
+                    p50[k, holiday, day, mask] = pct[0, mask]
+                    p90[k, holiday, day, mask] = pct[1, mask]
+
+        # Scheduled departure of the closest journey on the same weekday
+        codes = departures.dep_code[start:end]
+        for day in range(7):
+            same_day = np.flatnonzero(flags & day_bit(day))
+            dep[k, day] = np.append(codes[same_day], NO_DEP)[closest(times[same_day], queries)]
+
+        if log and k and k % 10_000 == 0:
+            log(f"  profiled {k}/{keys} keys")
+
+    # Model answers for every distinct journey time of every key, with each holiday flag its events
+    # have, on every weekday (the inputs of /predict_delay when that journey is the closest match)
+    event_keys = np.repeat(np.arange(keys, dtype=np.int64), np.diff(departures.key_bounds))
+    journey_keys, inverse = np.unique(event_keys * 1440 + departures.scheduled_mins, return_inverse=True)
+    has_holiday = np.zeros((len(journey_keys), 2), dtype=bool)
+    has_holiday[inverse.ravel(), ((departures.flags & HOLIDAY_BIT) != 0).astype(np.intp)] = True
+    j_key, j_sched = journey_keys // 1440, journey_keys % 1440
+    j_idx, h_idx = np.nonzero(has_holiday & ~np.isnan(statics[j_key, 0])[:, None])
+    j_idx, h_idx = np.repeat(j_idx, 7), np.repeat(h_idx, 7)
+    d_idx = np.tile(np.arange(7), len(j_idx) // 7)
+
+    journey_predicted = np.full((len(journey_keys), 2, 7), NO_DELAY, dtype=np.int8)
+    for lo in range(0, len(j_idx), PREDICT_CHUNK): # the tree runtime holds a cursor per (row, tree)
+        hi = min(lo + PREDICT_CHUNK, len(j_idx))
+        rows = j_idx[lo:hi]
+        angle = 2 * np.pi * j_sched[rows].astype(np.float64) / 1440
+        X = np.empty((hi - lo, len(FEATURES)), dtype=np.float64)
+        X[:, 0] = np.sin(angle)
+        X[:, 1] = np.cos(angle)
+        X[:, 2] = d_idx[lo:hi]
+        X[:, 3] = h_idx[lo:hi]
+        X[:, 4:] = statics[j_key[rows]]
+        values = np.trunc(model.predict(X)) # int() truncation, as served live
+        # Delays outside the int8 range are left out, so serving evaluates them live
+        journey_predicted[rows, h_idx[lo:hi], d_idx[lo:hi]] = np.where(np.abs(values) <= 127, values, NO_DELAY)
+
+    # Grid cells take the answer of the journey closest to their midpoint
+    k_idx, h_idx, d_idx, b_idx = np.nonzero(sched >= 0)
+    rows = np.searchsorted(journey_keys, k_idx * 1440 + sched[k_idx, h_idx, d_idx, b_idx])
+    predicted[k_idx, h_idx, d_idx, b_idx] = journey_predicted[rows, h_idx, d_idx]
+    if log:
+        log(f"Delay profiles: {keys} keys x {2 * 7 * buckets} cells, {len(journey_keys)} journey times, "
+            f"{len(j_idx)} model inputs")
+
+    return {"resolution": np.int32(resolution), "predicted": predicted, "p50": p50, "p90": p90, "dep_code": dep,
+            "journey_keys": journey_keys, "journey_predicted": journey_predicted}
+
+class DelayProfiles:
+    # Read-only view of build_profiles output (e.g. memory-mapped from the snapshot)
+
+    def __init__(self, arrays: dict):
+        self.resolution = int(np.asarray(arrays["resolution"]).reshape(-1)[0]) # stored as a 1-element array
+        self.predicted = arrays["predicted"]
+        self.p50 = arrays["p50"]
+        self.p90 = arrays["p90"]
+        self.dep_code = arrays["dep_code"]
+        self.journey_keys = arrays["journey_keys"]
+        self.journey_predicted = arrays["journey_predicted"]
+
+    def journey_prediction(self, key: int, scheduled_mins: int, holiday: bool, weekday: int):
+        # The predicted delay when the journey at scheduled_mins of the key is the closest match,
+        # None if it was not precomputed
+        target = key * 1440 + scheduled_mins
+        row = int(np.searchsorted(self.journey_keys, target))
+        if row == len(self.journey_keys) or self.journey_keys[row] != target:
+            return None
+        value = int(self.journey_predicted[row, int(holiday), weekday])
+        return None if value == NO_DELAY else value
+
+    def day(self, key: int, holiday: bool, weekday: int) -> dict:
+        # The whole day's row of predictions and historical percentiles for one key
+        h = int(holiday)
+        return {
+            "predicted": self.predicted[key, h, weekday],
+            "p50": self.p50[key, h, weekday],
+            "p90": self.p90[key, h, weekday],
+            "dep_code": self.dep_code[key, weekday],
+        }
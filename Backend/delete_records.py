@@ -1,7 +1,30 @@
+import argparse
+from datetime import date, timedelta
 from pymongo import MongoClient
+from partitions import purge
+from load_journeys import JOURNEYS_COL
+from compact_events import COMPACT_JOURNEYS_COL
 
-client = MongoClient("") # MISSING LINK
-db = client["BusDelayPredict"]
-collection = db["journeysBN"]
+# Retention of stored stop events: whole date partitions (see partitions.py) older than the
+# retention window are dropped, for both the document and the compact journey layout
+RETENTION_DAYS = 90
 
-collection.delete_many({})
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop stop event partitions past the retention window")
+    parser.add_argument("--keep-days", type=int, default=RETENTION_DAYS, help="days of service dates to keep")
+    parser.add_argument("--before", default=None, help="drop service dates before this date instead (YYYY-MM-DD)")
+    parser.add_argument("--all", action="store_true", help="drop every partition")
+    parser.add_argument("--dry-run", action="store_true", help="only list the partitions that would be dropped")
+    args = parser.parse_args()
+
+    client = MongoClient("") # MISSING LINK
+    db = client["BusDelayPredict"]
+
+    if args.all:
+        before = date.max
+    else:
+        before = date.fromisoformat(args.before) if args.before else date.today() - timedelta(days=args.keep_days)
+    for base in (JOURNEYS_COL, COMPACT_JOURNEYS_COL):
+        dropped = purge(db, base, before, args.dry_run)
+        print(f"{'Would drop' if args.dry_run else 'Dropped'} {len(dropped)} {base} partitions"
+              + ("" if args.all else f" before {before}") + (f" ({dropped[0]} ... {dropped[-1]})" if dropped else ""))
@@ -0,0 +1,212 @@
+import sys
+from array import array
+import numpy as np
+
+# Bit layout of the packed per-event flags column
+HOLIDAY_BIT = 1 << 0
+PEAK_BIT    = 1 << 1
+DAY_SHIFT   = 2 # day_of_week d is stored as bit (DAY_SHIFT + d)
+
+def day_bit(day: int) -> int:
+    # Getting the flag bit for a day of the week (0 = Monday)
+    return 1 << (DAY_SHIFT + day)
+
+def pack_flags(is_holiday: bool, is_peak: bool, day_of_week: int) -> int:
+    # Packing the boolean/day fields of a stop event into one integer
+    flags = day_bit(day_of_week)
+    if is_holiday:
+        flags |= HOLIDAY_BIT
+    if is_peak:
+        flags |= PEAK_BIT
+    return flags
+
+# Keys are packed into one int64: service_id, then the stop and destination name codes
+NAME_BITS = 21
+SERVICE_BITS = 63 - 2 * NAME_BITS
+
+class DepartureIndex:
+    # In-memory index of historical stop events keyed on (service_id, stop_name, destination).
+    # All events live in flat columnar arrays sorted by (key, scheduled_mins), so every key
+    # owns one contiguous slice and a time window is found with two binary searches.
+    # Keys and lookup tables are sorted arrays too; the only Python-object table is the
+    # stop/destination name -> code dict, so an index mapped from a snapshot stays shared.
+
+    COLUMNS = ("scheduled_mins", "actual_mins", "delay_mins", "journey_id", "dep_code", "flags")
+
+    def __init__(self, records):
+        names = {}         # stop or destination name -> code
+        dep_strings = {}   # scheduled_dep string -> code
+        stop_indexes = {}  # packed (service_id, stop) -> stop_index of the first matching event
+
+        # Encoding every record into parallel typed buffers (records can be a streaming iterator;
+        # each one is dropped as soon as it is encoded)
+        key_ids, sched, actual, delay = array("q"), array("h"), array("h"), array("h")
+        journey, dep_codes, flags = array("q"), array("i"), array("H")
+        for doc in records:
+            service_id = doc["service_id"]
+            if not 0 <= service_id < 1 << SERVICE_BITS:
+                raise ValueError(f"service_id {service_id} does not fit the packed key")
+            stop = names.setdefault(doc["stop_name"], len(names))
+            dest = names.setdefault(doc["destination"], len(names))
+            key_ids.append((service_id << 2 * NAME_BITS) | (stop << NAME_BITS) | dest)
+            sched.append(doc["scheduled_mins"])
+            actual.append(doc["actual_mins"])
+            delay.append(doc["delay_mins"])
+            journey.append(doc["journey_id"])
+            dep_codes.append(dep_strings.setdefault(doc["scheduled_dep"], len(dep_strings)))
+            flags.append(pack_flags(doc["is_holiday"], doc["is_peak"], doc["day_of_week"]))
+            stop_indexes.setdefault((service_id << NAME_BITS) | stop, doc["stop_index"])
+        if len(names) >= 1 << NAME_BITS:
+            raise ValueError(f"{len(names)} distinct stop names do not fit the packed key")
+
+        key_ids = np.frombuffer(key_ids, dtype=np.int64)
+        sched = np.frombuffer(sched, dtype=np.int16)
+
+        # Sorting by key and then by scheduled time (stable, so ties keep file order)
+        order = np.lexsort((sched, key_ids))
+        key_ids = key_ids[order]
+
+        self.scheduled_mins = sched[order]
+        self.actual_mins    = np.frombuffer(actual, dtype=np.int16)[order]
+        self.delay_mins     = np.frombuffer(delay, dtype=np.int16)[order]
+        self.journey_id     = np.frombuffer(journey, dtype=np.int64)[order]
+        self.dep_code       = np.frombuffer(dep_codes, dtype=np.int32)[order]
+        self.flags          = np.frombuffer(flags, dtype=np.uint16)[order]
+        self.dep_strings    = list(dep_strings)
+        self.names          = names
+        self.name_list      = list(names)
+
+        # Storing the distinct keys and the [start, end) slice each one owns
+        self.key_ids, starts = np.unique(key_ids, return_index=True)
+        self.key_bounds = np.append(starts, len(key_ids)).astype(np.int64)
+
+        stop_keys = np.fromiter(stop_indexes, dtype=np.int64, count=len(stop_indexes))
+        stop_values = np.fromiter(stop_indexes.values(), dtype=np.int64, count=len(stop_indexes))
+        order = np.argsort(stop_keys)
+        self.stop_keys, self.stop_values = stop_keys[order], stop_values[order]
+
+        # Inverted stop index: the positions of every key at a stop, grouped by stop name code
+        # (keys of stop code c are name_keys[name_bounds[c]:name_bounds[c + 1]])
+        stop_codes = (self.key_ids >> NAME_BITS) & ((1 << NAME_BITS) - 1)
+        self.name_keys = np.argsort(stop_codes, kind="stable")
+        self.name_bounds = np.searchsorted(stop_codes[self.name_keys], np.arange(len(names) + 1)).astype(np.int64)
+
+    def to_arrays(self) -> dict:
+        # Flattening the index into arrays (the name table becomes a string array)
+        return {
+            **{col: getattr(self, col) for col in self.COLUMNS},
+            "dep_strings": np.asarray(self.dep_strings, dtype=str),
+            "names":       np.asarray(list(self.names), dtype=str),
+            "key_ids":     self.key_ids,
+            "key_bounds":  self.key_bounds,
+            "stop_keys":   self.stop_keys,
+            "stop_values": self.stop_values,
+            "name_keys":   self.name_keys,
+            "name_bounds": self.name_bounds,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        # Rebuilding an index from to_arrays output; the arrays are used as given (e.g. memory-mapped)
+        index = cls.__new__(cls)
+        for name in (*cls.COLUMNS, "key_ids", "key_bounds", "stop_keys", "stop_values", "name_keys", "name_bounds"):
+            setattr(index, name, arrays[name])
+        index.dep_strings = arrays["dep_strings"].tolist()
+        index.name_list = arrays["names"].tolist()
+        index.names = {name: code for code, name in enumerate(index.name_list)}
+        return index
+
+    def __len__(self):
+        return len(self.scheduled_mins)
+
+    def key_count(self) -> int:
+        return len(self.key_ids)
+
+    @staticmethod
+    def _lookup(sorted_keys: np.ndarray, key: int):
+        # Position of key in a sorted key array (None if absent)
+        pos = int(np.searchsorted(sorted_keys, key))
+        return pos if pos < len(sorted_keys) and sorted_keys[pos] == key else None
+
+    def key_position(self, service_id: int, stop_name: str, destination: str):
+        # Getting the position of a key among key_ids (None if the key has no events)
+        stop, dest = self.names.get(stop_name), self.names.get(destination)
+        if stop is None or dest is None or not 0 <= service_id < 1 << SERVICE_BITS:
+            return None
+        return self._lookup(self.key_ids, (service_id << 2 * NAME_BITS) | (stop << NAME_BITS) | dest)
+
+    def bounds(self, service_id: int, stop_name: str, destination: str):
+        # Getting the [start, end) slice of a key (None if the key has no events)
+        pos = self.key_position(service_id, stop_name, destination)
+        return None if pos is None else (int(self.key_bounds[pos]), int(self.key_bounds[pos + 1]))
+
+    def key_parts(self, pos: int):
+        # Decoding the key at a position into (service_id, stop_name, destination)
+        key_id = int(self.key_ids[pos])
+        mask = (1 << NAME_BITS) - 1
+        return key_id >> 2 * NAME_BITS, self.name_list[(key_id >> NAME_BITS) & mask], self.name_list[key_id & mask]
+
+    def keys_at_stop(self, stop_name: str) -> np.ndarray:
+        # Positions of every (service, stop, destination) key at a stop, from the inverted stop index
+        stop = self.names.get(stop_name)
+        if stop is None:
+            return np.empty(0, dtype=np.int64)
+        return self.name_keys[self.name_bounds[stop]:self.name_bounds[stop + 1]]
+
+    def key_window(self, pos: int, low: int, high: int) -> np.ndarray:
+        # Returning the positions of events for the key at pos with low <= scheduled_mins <= high
+        start, end = int(self.key_bounds[pos]), int(self.key_bounds[pos + 1])
+        times = self.scheduled_mins[start:end]
+        lo = start + int(np.searchsorted(times, low, side="left"))
+        hi = start + int(np.searchsorted(times, high, side="right"))
+        return np.arange(lo, hi)
+
+    def window(self, service_id: int, stop_name: str, destination: str, low: int, high: int) -> np.ndarray:
+        # Returning the positions of events for the key with low <= scheduled_mins <= high
+        pos = self.key_position(service_id, stop_name, destination)
+        if pos is None:
+            return np.empty(0, dtype=np.int64)
+        return self.key_window(pos, low, high)
+
+    def find(self, service_id: int, stop_name: str, destination: str, low: int, high: int,
+             mask: int, value: int) -> np.ndarray:
+        # Filtering the time window to events whose flags satisfy (flags & mask) == value
+        positions = self.window(service_id, stop_name, destination, low, high)
+        return positions[(self.flags[positions] & mask) == value]
+
+    def closest(self, positions: np.ndarray, mins: int):
+        # Picking the position whose scheduled time is nearest to mins (None if there are none)
+        if len(positions) == 0:
+            return None
+        return int(positions[np.argmin(np.abs(self.scheduled_mins[positions].astype(np.int32) - mins))])
+
+    def record(self, pos: int, fields) -> dict:
+        # Rebuilding a document-like dict for one event with the requested fields
+        columns = {
+            "scheduled_mins": lambda: int(self.scheduled_mins[pos]),
+            "actual_mins":    lambda: int(self.actual_mins[pos]),
+            "delay_mins":     lambda: int(self.delay_mins[pos]),
+            "journey_id":     lambda: int(self.journey_id[pos]),
+            "scheduled_dep":  lambda: self.dep_strings[self.dep_code[pos]],
+        }
+        return {field: columns[field]() for field in fields}
+
+    def stop_position(self, service_id: int, stop_name: str):
+        # Getting the position of a (service, stop) pair in the stop table (None if unknown)
+        stop = self.names.get(stop_name)
+        if stop is None or not 0 <= service_id < 1 << SERVICE_BITS:
+            return None
+        return self._lookup(self.stop_keys, (service_id << NAME_BITS) | stop)
+
+    def stop_index(self, service_id: int, stop_name: str):
+        # Getting the stop index of a stop on a service (None if unknown)
+        pos = self.stop_position(service_id, stop_name)
+        return None if pos is None else int(self.stop_values[pos])
+
+    def nbytes(self) -> int:
+        # Estimating the memory held by the index (arrays plus lookup tables)
+        arrays = (*self.COLUMNS, "key_ids", "key_bounds", "stop_keys", "stop_values", "name_keys", "name_bounds")
+        total = sum(getattr(self, name).nbytes for name in arrays)
+        total += sys.getsizeof(self.names) + sys.getsizeof(self.name_list) + sum(sys.getsizeof(n) for n in self.names)
+        total += sys.getsizeof(self.dep_strings) + sum(sys.getsizeof(s) for s in self.dep_strings)
+        return total
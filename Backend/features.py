@@ -0,0 +1,33 @@
+import numpy as np
+
+# Model input columns, in the order the LGBM model was trained with
+FEATURES = [
+    "time_sin", "time_cos", "day_of_week", "is_holiday",
+    "service_id", "stop_index",
+    "origin_te", "destination_te", "stop_name_te"
+]
+
+def build_matrix(items) -> np.ndarray:
+    # Building the feature matrix for a list of resolved requests in one pass.
+    # Each item is a dict with scheduled_mins, day_of_week, is_holiday, service_id,
+    # stop_index and the origin_te, destination_te and stop_name_te target encodings.
+    scheduled_mins = np.array([it["scheduled_mins"] for it in items], dtype=np.float64)
+    angle = 2 * np.pi * scheduled_mins / 1440
+
+    X = np.empty((len(items), len(FEATURES)), dtype=np.float64)
+    X[:, 0] = np.sin(angle)
+    X[:, 1] = np.cos(angle)
+    X[:, 2] = [it["day_of_week"] for it in items]
+    X[:, 3] = [it["is_holiday"] for it in items]
+    X[:, 4] = [it["service_id"] for it in items]
+    X[:, 5] = [it["stop_index"] for it in items]
+    X[:, 6] = [it["origin_te"] for it in items]
+    X[:, 7] = [it["destination_te"] for it in items]
+    X[:, 8] = [it["stop_name_te"] for it in items]
+    return X
+
+def predict_matrix(model, X: np.ndarray) -> np.ndarray:
+    # Running the model once over a whole feature matrix
+    if len(X) == 0:
+        return np.empty(0)
+    return model.predict(X)
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import joblib
+import lightgbm as lgb
+from features import FEATURES
+from compact_events import stop_event_collections
+from training_data import stream_columns
+from target_encoding import TargetEncoder
+from tree_runtime import export_model
+from snapshot import MODEL_PATH, ENCODER_PATH
+
+# Warm-start retraining: instead of rebuilding the model from the whole history, boosting
+# continues from the deployed model (init_model) on the date partitions stored since the last
+# training run. The newest day is held out, and the new model is only published if it is no
+# worse than the deployed one on it; that day is then trained on by the next run.
+MODEL_PKL = "models/lgbm_model.pkl"
+STATE_PATH = "models/training_state.json" # last service date the deployed model was trained on
+BOOST_ROUNDS = 25  # trees added per incremental run
+HOLDOUT_DAYS = 1
+TOLERANCE = 0.01   # the new model may be up to 1% worse in holdout RMSE (noise between runs)
+
+def load_state(path: str = STATE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {"trained_through": None, "runs": []}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state: dict, path: str = STATE_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def time_features(frame: pd.DataFrame) -> pd.DataFrame:
+    # The non-encoded model inputs, as train_model.py builds them
+    angle = 2 * np.pi * frame["scheduled_mins"].astype(int) / 1440
+    return pd.DataFrame({"time_sin": np.sin(angle), "time_cos": np.cos(angle),
+                         "day_of_week": frame["day_of_week"], "is_holiday": frame["is_holiday"],
+                         "service_id": frame["service_id"], "stop_index": frame["stop_index"]})
+
+def prior_encodings(frame: pd.DataFrame, encoder: TargetEncoder, target: str = "delay_mins"):
+    # Target encodings of the frame's rows from the running statistics with the frame's own events
+    # taken out, so no row's delay leaks into its features (load_journeys has usually folded them
+    # in already). Returns ({col: encoded array}, covered): covered is False when the running
+    # statistics do not contain the frame's events, which are then encoded as they stand.
+    own = TargetEncoder(encoder.columns, encoder.default).update(frame, target)
+    codes, own_codes, covered = {}, {}, True
+    for col in encoder.columns:
+        codes[col] = encoder.codes(col, frame[col])
+        own_codes[col] = own.codes(col, frame[col])
+        counts = np.append(encoder.counts[col], 0)[codes[col]]
+        covered &= bool(np.all((codes[col] >= 0) | (own_codes[col] < 0)) and
+                        np.all(counts >= np.append(own.counts[col], 0)[own_codes[col]]))
+
+    encoded = {}
+    for col in encoder.columns:
+        sums = np.append(encoder.sums[col], 0.0)[codes[col]]
+        counts = np.append(encoder.counts[col], 0)[codes[col]]
+        if covered:
+            sums = sums - np.append(own.sums[col], 0.0)[own_codes[col]]
+            counts = counts - np.append(own.counts[col], 0)[own_codes[col]]
+        out = np.full(len(frame), encoder.default, dtype=np.float64)
+        seen = counts > 0
+        out[seen] = sums[seen] / counts[seen]
+        encoded[col] = out
+    return encoded, covered
+
+def model_inputs(frame: pd.DataFrame, encoded: dict) -> pd.DataFrame:
+    X = time_features(frame)
+    for col, values in encoded.items():
+        X[f"{col}_te"] = values
+    return X[FEATURES]
+
+def warm_start(model: lgb.LGBMRegressor, X, y, rounds: int = BOOST_ROUNDS) -> lgb.LGBMRegressor:
+    # Adding `rounds` trees to a copy of the model, fitted to the residuals on the new events
+    params = model.get_params()
+    params["n_estimators"] = rounds
+    updated = lgb.LGBMRegressor(**params)
+    updated.fit(X, y, init_model=model.booster_)
+    return updated
+
+def rmse(model, X, y) -> float:
+    return float(np.sqrt(np.mean((model.predict(X) - np.asarray(y, dtype=np.float64)) ** 2)))
+
+def retrain(db, end=None, rounds: int = BOOST_ROUNDS, holdout_days: int = HOLDOUT_DAYS,
+            tolerance: float = TOLERANCE, dry_run: bool = False) -> dict:
+    # One incremental run over the complete days (up to `end`, default yesterday) since the last run
+    state = load_state()
+    if not state["trained_through"]:
+        raise RuntimeError(f"No training state in {STATE_PATH}: run train_model.py for the first model")
+    start = date.fromisoformat(state["trained_through"]) + timedelta(days=1)
+    end = date.fromisoformat(end) if end else date.today() - timedelta(days=1)
+    partitions = stop_event_collections(db, start, end)
+    if len(partitions) <= holdout_days:
+        print(f"{len(partitions)} new day(s) since {state['trained_through']}, "
+              f"need more than {holdout_days} to train and validate")
+        return {"published": False}
+
+    started = time.perf_counter()
+    train_days, holdout = partitions[:-holdout_days], partitions[-holdout_days:]
+    train = stream_columns([col for _, col in train_days])
+    valid = stream_columns([col for _, col in holdout])
+    model = joblib.load(MODEL_PKL)
+    encoder = TargetEncoder.load(ENCODER_PATH)
+    new = pd.concat([train, valid], ignore_index=True)
+    for col in encoder.columns: # categories differ between the frames; missing values stay None
+        new[col] = new[col].astype(object).where(new[col].notna(), None)
+    encoded, covered = prior_encodings(new, encoder)
+    X = model_inputs(new, encoded)
+    X_train, y_train = X.iloc[:len(train)], new["delay_mins"].iloc[:len(train)]
+    X_valid, y_valid = X.iloc[len(train):], new["delay_mins"].iloc[len(train):]
+
+    updated = warm_start(model, X_train, y_train, rounds)
+    seconds = time.perf_counter() - started
+    before, after = rmse(model, X_valid, y_valid), rmse(updated, X_valid, y_valid)
+    run = {
+        "days": f"{train_days[0][0]}..{train_days[-1][0]}", "holdout": f"{holdout[0][0]}..{holdout[-1][0]}",
+        "events": len(train), "holdout_events": len(valid), "seconds": round(seconds, 2),
+        "rmse_before": round(before, 4), "rmse_after": round(after, 4), "trees": updated.booster_.num_trees(),
+        "published": after <= before * (1 + tolerance) and not dry_run,
+    }
+    print(f"Trained on {run['events']} events ({run['days']}) in {seconds:.1f}s: holdout RMSE "
+          f"{before:.3f} -> {after:.3f}, {run['trees']} trees")
+    if not run["published"]:
+        print("Not published" + (" (dry run)" if dry_run else f": worse than the deployed model on {run['holdout']}"))
+        return run
+
+    # Publishing the model; the serving snapshot is rebuilt because its model files changed
+    joblib.dump(updated, f"{MODEL_PKL}.tmp")
+    os.replace(f"{MODEL_PKL}.tmp", MODEL_PKL)
+    export_model(updated.booster_, f"{MODEL_PATH}.tmp.npz")
+    os.replace(f"{MODEL_PATH}.tmp.npz", MODEL_PATH)
+    if not covered:
+        # Refreshing the running statistics with the trained days (load_journeys did not fold them in)
+        encoder.update(train)
+        encoder.save(ENCODER_PATH)
+    state["trained_through"] = train_days[-1][0].isoformat()
+    state["runs"].append(run)
+    save_state(state)
+    print(f"Published {MODEL_PKL} and {MODEL_PATH}, trained through {state['trained_through']}")
+    return run
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Continue boosting the deployed model on newly stored days")
+    parser.add_argument("--end", default=None, help="last service date to use (default yesterday)")
+    parser.add_argument("--rounds", type=int, default=BOOST_ROUNDS, help="trees to add")
+    parser.add_argument("--holdout-days", type=int, default=HOLDOUT_DAYS)
+    parser.add_argument("--dry-run", action="store_true", help="train and validate without publishing")
+    args = parser.parse_args()
+
+    client = MongoClient("") # MISSING LINK
+    retrain(client["BusDelayPredict"], args.end, args.rounds, args.holdout_days, dry_run=args.dry_run)
+    client.close()
@@ -0,0 +1,267 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+
+class TokenBucket:
+    # Global async rate limiter: `rate` requests per second with bursts of up to `burst`.
+    # A 429 from the upstream pauses every caller until its Retry-After has passed.
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        # Holding back all requests for the given number of seconds
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+def retry_after_seconds(value: str, default: float = 60.0) -> float:
+    # Parsing a Retry-After header given either in seconds or as an HTTP date
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+async def get_json(client: httpx.AsyncClient, limiter: TokenBucket, url: str, params: dict = None,
+                   max_attempts: int = 5, stats=None):
+    # Rate-limited GET that honours 429 Retry-After (without counting it as a failed attempt)
+    # and backs off exponentially on network errors and 5xx responses.
+    # Requests and 429s are counted on `stats` (e.g. IngestStats) when given.
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        if stats is not None:
+            stats.requests += 1
+        try:
+            resp = await client.get(url, params=params)
+            if resp.status_code == 429:
+                if stats is not None:
+                    stats.throttled += 1
+                limiter.pause(retry_after_seconds(resp.headers.get("Retry-After")))
+                continue
+            if resp.status_code < 500:
+                resp.raise_for_status()
+                return resp.json()
+            error = f"HTTP {resp.status_code}"
+        except httpx.TransportError as e:
+            error = repr(e)
+
+        attempt += 1
+        if attempt >= max_attempts:
+            raise RuntimeError(f"Giving up on {url} after {attempt} attempts: {error}")
+        print(f"Error fetching {url}: {error} (attempt {attempt}), backing off")
+        await asyncio.sleep(min(60, 2 ** attempt))
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.journeys = 0
+        self.events = 0
+        self.written = 0
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (f"{self.journeys} journeys, {self.events} stop events ({self.written} written) in {elapsed:.1f}s: "
+                f"{self.journeys / elapsed if elapsed else 0:.1f} journeys/s, {self.requests} requests, "
+                f"{self.throttled} throttled, {self.failed} failed")
+
+class JourneyIngester:
+    # Concurrent journey ingestion: services are listed a few at a time, up to `max_in_flight`
+    # journey details are fetched at once under one shared rate limit, and stop events are written
+    # by a separate writer task so fetching and Mongo writes overlap. Journey details are
+    # transformed a whole write batch at a time. With a checkpoint store, listing stops at each
+    # service's checkpoint and already stored journeys are skipped; the store (which rewrites its
+    # file on every update) is only used from worker threads, never on the event loop.
+    #   transform(journeys) -> stop events (sized with len()) for a list of (svc_id, jid, detail)
+    #   write(events) -> number of stop events written
+    # (both called in a worker thread)
+
+    def __init__(self, transform, write, base_url: str = "https://bustimes.org", rate: float = 2.0,
+                 burst: int = 5, max_in_flight: int = 8, list_concurrency: int = 2,
+                 batch_size: int = 500, page_size: int = 100, max_attempts: int = 5, timeout: float = 10.0,
+                 checkpoints=None, transport=None):
+        self.transform = transform
+        self.write = write
+        self.base_url = base_url.rstrip("/")
+        self.limiter = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.list_concurrency = list_concurrency
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.checkpoints = checkpoints # optional CheckpointStore for resumable runs
+        self.transport = transport     # optional httpx transport (e.g. httpx.MockTransport in tests)
+        self.progress = {} # svc_id -> outstanding journey count, failure flag and newest journey
+        self.stats = IngestStats()
+
+    async def _get_json(self, client: httpx.AsyncClient, url: str, params: dict = None):
+        return await get_json(client, self.limiter, url, params, self.max_attempts, self.stats)
+
+    async def list_journeys(self, client: httpx.AsyncClient, svc_id: int, start_date, end_date,
+                            since=None, known=frozenset()):
+        # Collecting the (ID, datetime) of the service's journeys between start_date and end_date,
+        # stopping early at `since` and leaving out `known` journey IDs.
+        # Also returns the datetime of the newest journey in range.
+        url = f"{self.base_url}/api/vehiclejourneys/"
+        params = {"service": svc_id, "page_size": self.page_size}
+        journeys, newest = [], None
+
+        while url:
+            data = await self._get_json(client, url, params)
+            for j in data.get("results", []):
+                j_datetime = datetime.fromisoformat(j["datetime"])
+                j_date = j_datetime.date()
+
+                # Skipping journeys newer than the end date
+                if j_date > end_date:
+                    continue
+                # Stopping paging once a journey before the start date or the checkpoint is found
+                if j_date < start_date or (since is not None and j_datetime < since):
+                    return journeys, newest
+                if newest is None:
+                    newest = j["datetime"]
+                if j["id"] not in known:
+                    journeys.append((j["id"], j["datetime"]))
+
+            # Advancing to the next page (the 'next' URL already contains query params)
+            url = data.get("next")
+            params = None
+        return journeys, newest
+
+    async def _lister(self, client, services: asyncio.Queue, fetches: asyncio.Queue, start_date, end_date):
+        while True:
+            svc_id = await services.get()
+            try:
+                since, known = None, frozenset()
+                if self.checkpoints is not None:
+                    since, known = await asyncio.to_thread(
+                        lambda: (self.checkpoints.since(svc_id), self.checkpoints.known(svc_id)))
+                journeys, newest = await self.list_journeys(client, svc_id, start_date, end_date, since, known)
+                print(f"Service {svc_id}: {len(journeys)} new journey IDs collected")
+
+                self.progress[svc_id] = {"remaining": len(journeys), "failed": False, "newest": newest}
+                if not journeys:
+                    await self._maybe_complete(svc_id)
+                for jid, j_datetime in journeys:
+                    await fetches.put((svc_id, jid, j_datetime))
+            except Exception as e:
+                self.stats.failed += 1
+                print(f"Listing service {svc_id} failed: {e!r}")
+            finally:
+                services.task_done()
+
+    async def _fetcher(self, client, fetches: asyncio.Queue, writes: asyncio.Queue):
+        while True:
+            svc_id, jid, j_datetime = await fetches.get()
+            try:
+                detail = await self._get_json(client, f"{self.base_url}/services/{svc_id}/journeys/{jid}.json")
+                self.stats.journeys += 1
+                await writes.put((svc_id, jid, j_datetime, detail))
+            except Exception as e:
+                self.stats.failed += 1
+                await self._journey_done(svc_id, failed=True)
+                print(f"Fetching journey {jid} of service {svc_id} failed: {e!r}")
+            finally:
+                fetches.task_done()
+
+    async def _journey_done(self, svc_id: int, failed: bool):
+        # Counting down a service's outstanding journeys
+        progress = self.progress[svc_id]
+        progress["remaining"] -= 1
+        progress["failed"] |= failed
+        await self._maybe_complete(svc_id)
+
+    async def _maybe_complete(self, svc_id: int):
+        # Advancing the service's high-water mark once all its journeys are stored without failures
+        progress = self.progress[svc_id]
+        if progress["remaining"] == 0 and not progress["failed"] and progress["newest"] \
+                and self.checkpoints is not None:
+            await asyncio.to_thread(self.checkpoints.complete, svc_id, progress["newest"])
+
+    async def _writer(self, writes: asyncio.Queue):
+        # Transforming and flushing stop events in bulk batches of about `batch_size` stops;
+        # fetchers keep running while a batch is written. Journeys are checkpointed only after
+        # their stop events have been written.
+        pending, journeys, stops = [], [], 0
+        while True:
+            item = await writes.get()
+            if item is not None:
+                svc_id, jid, j_datetime, detail = item
+                pending.append((svc_id, jid, detail))
+                journeys.append((svc_id, jid, j_datetime))
+                stops += len(detail.get("stops", []))
+            if journeys and (item is None or stops >= self.batch_size):
+                batch, done, pending, journeys, stops = pending, journeys, [], [], 0
+                failed, events = False, ()
+                try:
+                    events = await asyncio.to_thread(self.transform, batch)
+                    self.stats.events += len(events)
+                    if len(events):
+                        self.stats.written += await asyncio.to_thread(self.write, events)
+                    if self.checkpoints is not None:
+                        await asyncio.to_thread(self.checkpoints.mark_ingested, done)
+                except Exception as e:
+                    failed = True
+                    self.stats.failed += 1
+                    print(f"Writing {len(events)} stop events of {len(batch)} journeys failed: {e!r}")
+                for svc_id, _, _ in done:
+                    await self._journey_done(svc_id, failed)
+            writes.task_done()
+            if item is None:
+                return
+
+    async def run(self, service_ids, start_date, end_date) -> IngestStats:
+        services = asyncio.Queue()
+        for svc_id in service_ids:
+            services.put_nowait(svc_id)
+        fetches = asyncio.Queue(maxsize=self.max_in_flight * 4)
+        writes = asyncio.Queue(maxsize=16)
+
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+            writer = asyncio.create_task(self._writer(writes))
+            workers = [asyncio.create_task(self._lister(client, services, fetches, start_date, end_date))
+                       for _ in range(self.list_concurrency)]
+            workers += [asyncio.create_task(self._fetcher(client, fetches, writes))
+                        for _ in range(self.max_in_flight)]
+
+            # Waiting for every service to be listed and every journey fetched, then draining the writer
+            await services.join()
+            await fetches.join()
+            for worker in workers:
+                worker.cancel()
+            await writes.put(None)
+            await writer
+
+        print(self.stats.summary())
+        return self.stats
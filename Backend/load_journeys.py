@@ -1,188 +1,120 @@
-import requests, time, holidays
-from datetime import datetime, timedelta
-from pymongo import MongoClient, UpdateOne
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import os, asyncio, argparse, threading
+import numpy as np
+from datetime import date, datetime
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from ingest import JourneyIngester
+from checkpoints import CheckpointStore
+from target_encoding import TargetEncoder
+from compact_events import NameDictionary, compact_journeys, COMPACT_JOURNEYS_COL, NAMES_COL
+from stop_events import transform_journeys
+from partitions import group_by_date, partition_name
 
 # CONFIGURATION PARAMETERS
 SERVICES_COL = "servicesBN"
 JOURNEYS_COL = "journeysBN"
 
-START_DATE   = "2025-04-17"   
-END_DATE     = "2025-04-20"   
-PAGE_SIZE    = 100
-BATCH_SIZE   = 100
-PAUSE        = 15
-
-uk_holidays = holidays.UK(subdiv="ENG")
+START_DATE    = "2025-04-17" # earliest date ingested when a service has no checkpoint yet
+END_DATE      = "2025-04-20" # or "today" for nightly incremental runs
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+ENCODER_FILE  = "models/target_encoder.npz" # running target-encoding statistics to keep fresh
+BASE_URL      = "https://bustimes.org"
+PAGE_SIZE     = 100
+WRITE_BATCH   = 1000 # stop events per bulk write
+RATE_LIMIT    = 2.5  # requests per second, shared by all workers
+BURST         = 5
+MAX_IN_FLIGHT = 8    # concurrent journey detail fetches
+DUPLICATE_KEY = 11000 # MongoDB error code of an insert whose _id is already stored
 # ----------------------------------------
 
-def chunk_list(list, size):
-    # Yields successive chunks of the set size
-    for i in range(0, len(list), size):
-        yield list[i:i+size]
-
-def load_journeys():
+def insert_new(collection, docs: list):
+    # Unordered bulk insert of documents, skipping those already stored.
+    # Returns a mask of the inserted documents and the write errors other than duplicate keys.
+    inserted = np.ones(len(docs), dtype=bool)
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        inserted[[err["index"] for err in errors]] = False
+        return inserted, [err for err in errors if err.get("code") != DUPLICATE_KEY]
+    return inserted, []
+
+def insert_partitioned(db, base: str, docs: list):
+    # insert_new into the per-date partitions of `base` (see partitions.py)
+    inserted, errors = np.zeros(len(docs), dtype=bool), []
+    for day, positions in group_by_date(docs).items():
+        stored, failed = insert_new(db[partition_name(base, day)], [docs[i] for i in positions])
+        inserted[positions] = stored
+        errors += failed
+    return inserted, errors
+
+def load_journeys(start=START_DATE, end=END_DATE, checkpoint_file=CHECKPOINT_FILE, encoder_file=ENCODER_FILE,
+                  layout="documents"):
     # Connecting to MongoDB and fetching the bus services
     client = MongoClient("") # MISSING LINK
     db = client["BusDelayPredict"]
     service_ids = [s["_id"] for s in db[SERVICES_COL].find({}, {"_id":1})]
-    journeys_col = db[JOURNEYS_COL]
 
-    # Configuring HTTP session with retry/backoff
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    session.mount("https://", HTTPAdapter(max_retries=retries))
+    # Stop events are stored one document each, or as compact journeys (see compact_events.py),
+    # in one collection per service date
+    compact = layout == "compact"
+    journeys_base = COMPACT_JOURNEYS_COL if compact else JOURNEYS_COL
+    names = NameDictionary(db[NAMES_COL]) if compact else None
+
+    # Folding newly stored stop events into the serving target encodings as they are written
+    encoder = TargetEncoder.load(encoder_file) if encoder_file and os.path.exists(encoder_file) else None
+    encoder_lock = threading.Lock()
+
+    def write(events):
+        # Inserting a batch of new stop events (runs in a worker thread while fetching continues).
+        # Events already stored are left as they are, so re-ingesting a journey is a no-op.
+        docs = events.documents()
+        if compact:
+            # New names must be stored before the journeys that reference them
+            journeys = compact_journeys(docs, names)
+            names.flush()
+            stored, errors = insert_partitioned(db, journeys_base, journeys)
+            inserted = {(doc["service_id"], doc["journey_id"]) for doc, ok in zip(journeys, stored) if ok}
+            new = np.array([key in inserted for key in zip(events.columns["service_id"].tolist(),
+                                                            events.columns["journey_id"].tolist())], dtype=bool)
+        else:
+            new, errors = insert_partitioned(db, journeys_base, docs)
+        print(f"     - inserted {int(new.sum())} of {len(events)} stop events")
+
+        if encoder is not None and new.any():
+            # Only first-time inserts count, so re-ingested events are never added twice
+            added = events.take(new).columns
+            with encoder_lock:
+                encoder.update({col: list(added[col]) for col in [*encoder.columns, "delay_mins"]})
+                encoder.save(encoder_file)
+        if errors:
+            raise RuntimeError(f"{len(errors)} stop event writes failed, first: {errors[0].get('errmsg')}")
+        return int(new.sum())
 
     # Setting up and parsing threshold dates
-    start_date = datetime.fromisoformat(START_DATE).date()
-    end_date   = datetime.fromisoformat(END_DATE).date()
-
-    # Iterating over each service
-    for svc_id in service_ids:
-        print(f"\nProcessing service {svc_id}")
-
-        # Configuring the API URL for listing the journies of the current bus service
-        apiURL = f"https://bustimes.org/api/vehiclejourneys/?service={svc_id}"
-        params = {"page_size": PAGE_SIZE}
-        stop_paging = False
-        total_for_service = 0
-
-        # Getting all journey IDs for the current bus service within the date parameters
-        journeys = []
-
-        while apiURL and not stop_paging:
-            # Fetching the journeys via the API
-            apiResp = requests.get(apiURL, params=params, timeout=10)
-            apiResp.raise_for_status()
-            data = apiResp.json()
-
-            # Iterating over each journey 
-            for j in data.get("results", []):
-                j_date = datetime.fromisoformat(j["datetime"]).date()
-
-                # Skipping journeys newer than the END_dATE
-                if j_date > end_date:
-                    continue
-                # Stopping paging once a journey before the START_DATE is found
-                if j_date < start_date:
-                    stop_paging = True
-                    break
-
-                # If the journey matches the date filter, the journey ID is saved
-                journeys.append(j["id"])
-            
-            # Advancing to the next page
-            apiURL = data.get("next")
-            params = None # (the 'next' URL already contains query params)
-
-        print(f" - {len(journeys)} journey IDs collected and batching in groups of {BATCH_SIZE}")
-
-        # Processing the journeys in batches to control load
-        operations = []
-
-        for batch_num, batch in enumerate(chunk_list(journeys, BATCH_SIZE), 1):
-            print(f" * Processing batch {batch_num} ({len(batch)} journeys)...")
-            for jid in batch:
-
-                while True:
-                    try:
-                        # Fetching the journey details
-                        detail = session.get(f"https://bustimes.org/services/{svc_id}/journeys/{jid}.json", timeout=10).json()
-                        break  # Success, exit the retry loop
-                    except (requests.exceptions.RequestException, requests.exceptions.ConnectionError) as e:
-                        print(f"Network error occurred while fetching journey {jid}: {e}")
-                        print("Waiting 60 seconds before retrying...")
-                        time.sleep(60)
-
-                # Delaying the operation to control load
-                time.sleep(0.4)
-
-                stops = detail.get("stops", [])
-                if not stops:
-                    continue
-
-                first = stops[0] # Origin of the journey
-                last  = stops[-1] # Destination of the journey
-                j_date  = datetime.fromisoformat(detail["datetime"]).date()
-                day = get_day(j_date.isoformat()) # Day of the week
-                is_holiday = j_date in uk_holidays # Checks whether day is a holiday
-
-                # Iterating over all stops in the current journey
-                for index, stop in enumerate(stops):
-
-                    actual_dep_string = stop.get("actual_departure_time")
-
-                    sched_dep = stop.get("aimed_departure_time") 
-
-                    if not actual_dep_string or not sched_dep:
-                        continue
-                
-                    sched_mins = time_to_mins(sched_dep)
-
-                    dt = datetime.fromisoformat(actual_dep_string.replace("Z", "+00:00")) + timedelta(hours=1)
-                    actual_dep = dt.strftime("%H:%M")
-                    actual_mins = time_to_mins(actual_dep)
-
-                    # Calculate delay
-                    delay = actual_mins - sched_mins
-
-                    # Building the MongoDB document for the stop event
-                    doc = {
-                        "_id":           f"{svc_id}_{stop['id']}",
-                        "service_id":    svc_id,
-                        "journey_id":    jid,
-                        "stop_index":    index,
-                        "stop_name":     stop["name"],
-                        "stop_id":       stop["id"],   
-                        "date":          j_date.isoformat(),
-                        "origin":        first.get("name"),
-                        "destination":   last.get("name"),
-                        "scheduled_dep": sched_dep,
-                        "scheduled_mins":sched_mins,
-                        "actual_dep":    actual_dep,
-                        "actual_mins":   actual_mins,
-                        "delay_mins":    delay,
-                        "day_of_week":   day,
-                        "is_peak":       is_peak(sched_mins, day),
-                        "is_holiday":    is_holiday,
-                    }
-                    operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
-                    total_for_service += 1
-
-            # Writing current batch to MongoDB to control local memory usage
-            if operations:
-                result = journeys_col.bulk_write(operations)
-                print(f"     - batch {batch_num} wrote {result.upserted_count} upserts, {result.modified_count} updates")
-                operations.clear()
-
-            # Pausing before executing the next batch
-            if batch_num * BATCH_SIZE < len(journeys):
-                print(f"     - sleeping {PAUSE}s ...")
-                time.sleep(PAUSE)
-
-        print(f" FINISHED: Collected {total_for_service} journeys for {svc_id}")
-        time.sleep(1)
-
-def time_to_mins(timestr: str) -> int:
-    # Converting date variable to minutes since midnight for easier calculation
-    try:
-        h, m = map(int, timestr.split(":"))
-        return h * 60 + m
-    except AttributeError:
-        return print(timestr)
-
-def get_day(date: str) -> int:
-    # Getting the day of the week
-    return datetime.fromisoformat(date).date().weekday()
+    start_date = datetime.fromisoformat(start).date()
+    end_date   = date.today() if end == "today" else datetime.fromisoformat(end).date()
 
-def is_peak(minutes: int, weekday: int) -> bool:
-    # Checking whether the journey is during peak hours
-    # PEAK HOURS: MONDAY - FRIDAY (07:00 - 09:00 OR 15:00 - 18:00)
+    # Resuming from the per-service checkpoints unless a full reload was requested
+    checkpoints = CheckpointStore(checkpoint_file) if checkpoint_file else None
 
-    if weekday >= 5:
-        return False
-    return (420 <= minutes < 540) or (900 <= minutes < 1080)
+    # Fetching journeys for all services concurrently under one shared rate limit
+    ingester = JourneyIngester(
+        transform_journeys, write,
+        base_url=BASE_URL, rate=RATE_LIMIT, burst=BURST, max_in_flight=MAX_IN_FLIGHT,
+        batch_size=WRITE_BATCH, page_size=PAGE_SIZE, checkpoints=checkpoints,
+    )
+    asyncio.run(ingester.run(service_ids, start_date, end_date))
 
 if __name__ == "__main__":
-    load_journeys()
+    parser = argparse.ArgumentParser(description="Load Bee Network journeys from bustimes.org into MongoDB")
+    parser.add_argument("--start", default=START_DATE, help="earliest date for services without a checkpoint")
+    parser.add_argument("--end", default=END_DATE, help="latest date to ingest (YYYY-MM-DD or 'today')")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="checkpoint file used to resume")
+    parser.add_argument("--full", action="store_true", help="ignore checkpoints and reload the whole range")
+    parser.add_argument("--encoder", default=ENCODER_FILE, help="target encoder to update with new stop events ('' to skip)")
+    parser.add_argument("--layout", choices=["documents", "compact"], default="documents",
+                        help="store one document per stop event, or compact journeys with packed stop columns")
+    args = parser.parse_args()
+
+    load_journeys(args.start, args.end, None if args.full else args.checkpoint, args.encoder, args.layout)
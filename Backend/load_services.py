@@ -1,60 +1,151 @@
-import requests
-from pymongo import MongoClient, UpdateOne
+import json
+import asyncio
+import argparse
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
+import httpx
+from pymongo import MongoClient, UpdateOne, DeleteOne
+from ingest import TokenBucket, get_json
+from blobs import save_to_blob
+from snapshot import CONTAINER, SERVICES_BLOB
 
 # Configuration parameters
 OPERATORS = {"BNVB", "BNSM", "BNML", "BNGN", "BNFM", "BNDB"} # Bee Network operators (Vision Bus, Stagecoach, Metroline, Go North West, First Manchester, Diamond Bus)
 PAGE_SIZE = 100 # Number of services per request
+BASE_URL = "https://bustimes.org"
+RATE_LIMIT = 2.5 # requests per second
+BURST = 5
+MAX_IN_FLIGHT = 4 # concurrent page fetches
+SERVICE_FIELDS = ("slug", "number", "description", "region_id", "mode", "operator") # compared between syncs
+
+def service_document(svc: dict):
+    # Building the stored document of a Bee Network service (None for other operators)
+    operator = set(svc.get("operator") or []) & OPERATORS
+    if not operator:
+        return None
+    return {
+        "_id":         svc["id"],
+        "slug":        svc.get("slug"),
+        "number":      svc.get("line_name"),
+        "description": svc.get("description"),
+        "region_id":   svc.get("region_id"),
+        "mode":        svc.get("mode"),
+        "operator":    min(operator), # stable choice for services run by several operators
+    }
+
+def service_hash(doc: dict) -> str:
+    # Hash of the catalogue fields of a service document (other stored fields are ignored)
+    return hashlib.sha1(json.dumps([doc.get(f) for f in SERVICE_FIELDS], default=str).encode()).hexdigest()
+
+def diff_services(stored, fetched: dict):
+    # Comparing the stored documents with the fetched ones ({_id: doc}).
+    # Returns the added and changed documents and the IDs of withdrawn services.
+    hashes = {doc["_id"]: service_hash(doc) for doc in stored}
+    added = [doc for sid, doc in fetched.items() if sid not in hashes]
+    changed = [doc for sid, doc in fetched.items() if sid in hashes and hashes[sid] != service_hash(doc)]
+    withdrawn = sorted(sid for sid in hashes if sid not in fetched)
+    return added, changed, withdrawn
+
+def page_url(second_page: str, page: int):
+    # URL of any page, derived from the 'next' link of the first page (None if the
+    # pagination style is not recognised, in which case pages are followed one by one)
+    parts = urlsplit(second_page)
+    query = parse_qs(parts.query)
+    if "page" in query:
+        query["page"] = [str(page)]
+    elif "offset" in query and "limit" in query:
+        query["offset"] = [str((page - 1) * int(query["limit"][0]))]
+    else:
+        return None
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+async def fetch_services(base_url: str = BASE_URL, rate: float = RATE_LIMIT, burst: int = BURST,
+                         max_in_flight: int = MAX_IN_FLIGHT, page_size: int = PAGE_SIZE) -> list:
+    # Listing every NW-region service. The first page gives the total count, and the remaining
+    # pages are then fetched concurrently under one rate limit. If the listing changed while
+    # paging (the results do not add up to the count), it is walked again page by page.
+    limiter = TokenBucket(rate, burst)
+    url = f"{base_url.rstrip('/')}/api/services/"
+    async with httpx.AsyncClient(timeout=10) as client:
+        first = await get_json(client, limiter, url, {"page_size": page_size, "region_id": "NW"})
+        results, count, next_url = first.get("results", []), first.get("count"), first.get("next")
+        urls = None
+        if next_url and count and results:
+            urls = [page_url(next_url, page) for page in range(2, -(-count // len(results)) + 1)]
+
+        if not next_url:
+            print(f"Fetched {len(results)} services")
+            return results
+        if urls and all(urls):
+            semaphore = asyncio.Semaphore(max_in_flight)
+
+            async def fetch(page: str):
+                async with semaphore:
+                    return (await get_json(client, limiter, page)).get("results", [])
+
+            for page in await asyncio.gather(*(fetch(u) for u in urls)):
+                results.extend(page)
+            if len({svc["id"] for svc in results}) == count:
+                print(f"Fetched {len(results)} services in {1 + len(urls)} pages")
+                return results
+            print(f"Service listing changed while paging ({len(results)} of {count}), walking it again")
+            next_url = url
+            results, params = [], {"page_size": page_size, "region_id": "NW"}
+        else:
+            params = None
+
+        # Following the 'next' links one page after another
+        while next_url:
+            data = await get_json(client, limiter, next_url, params)
+            results.extend(data.get("results", []))
+            next_url, params = data.get("next"), None
+        print(f"Fetched {len(results)} services")
+        return results
+
+def load_services(full: bool = False, dry_run: bool = False, base_url: str = BASE_URL):
+    # Syncing the Bee Network services into MongoDB. Only added, changed and withdrawn services
+    # are written, and services.json (and with it the server's snapshot and search index) is only
+    # regenerated when something changed. `full` rewrites every service and services.json.
+    fetched = {}
+    for svc in asyncio.run(fetch_services(base_url)):
+        doc = service_document(svc)
+        if doc is not None:
+            fetched[doc["_id"]] = doc
+    if not fetched:
+        print("No services found!")
+        return
 
-def load_services():
     # Connecting to MongoDB
     client = MongoClient("") # MISSING LINK
     db = client.get_default_database()
     col = db.servicesBN
 
-    # Base URL for the Bustimes API with North West region filter
-    url = "https://bustimes.org/api/services/"
-    params = {"page_size": PAGE_SIZE, "region_id":"NW"}
-
-    ops = [] # List to hold update operations
-
-    # Iterate through the pages of results until there is no next page
-    while url:
-        # Making GET request to current page URL
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Processing each service returned by API
-        for svc in data.get("results", []):
-            # Filter to Bee Network operators
-            operators = svc.get("operator")
-            operator = set(operators) & set(OPERATORS)
-
-            if operator:
-                # Building document with relevant info
-                doc = {
-                    "_id":         svc["id"],
-                    "slug":        svc.get("slug"),
-                    "number":      svc.get("line_name"),
-                    "description": svc.get("description"),
-                    "region_id":   svc.get("region_id"),
-                    "mode":        svc.get("mode"),
-                    "operator":    list(operator)[0],
-                }
-                ops.append(
-                    UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
-                )
-        # Logging how many services were fetched from the page
-        print(f"Fetched {len(data.get('results', []))} services from {url}")
-        url = data.get("next") # Setting URL to next page
-        params = None 
-
-    # Upload collected data to MongoDB
+    stored = list(col.find({}, {field: 1 for field in SERVICE_FIELDS}))
+    added, changed, withdrawn = diff_services(stored, fetched)
+    print(f"{len(fetched)} Bee Network services: {len(added)} added, {len(changed)} changed, "
+          f"{len(withdrawn)} withdrawn")
+
+    upserts = list(fetched.values()) if full else added + changed
+    ops = [UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True) for doc in upserts]
+    ops += [DeleteOne({"_id": sid}) for sid in withdrawn]
+    if dry_run or not (ops or full):
+        return
+
     if ops:
-        result = col.bulk_write(ops)
-        print(f"Uploaded {result.upserted_count} services.")
-    else:
-        print("No services found!")
-        
+        result = col.bulk_write(ops, ordered=False)
+        print(f"Uploaded {result.upserted_count} new and {result.modified_count} updated services, "
+              f"removed {result.deleted_count}")
+
+    # Regenerating the serving catalogue; servers pick it up through the blob's new version
+    services = list(col.find({}, sort=[("_id", 1)]))
+    save_to_blob(CONTAINER, SERVICES_BLOB, services)
+    print(f"Wrote {CONTAINER}/{SERVICES_BLOB} with {len(services)} services")
+
 if __name__ == "__main__":
-    load_services()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync the Bee Network services from bustimes.org into MongoDB")
+    parser.add_argument("--full", action="store_true", help="rewrite every service and services.json")
+    parser.add_argument("--dry-run", action="store_true", help="only report the changes")
+    parser.add_argument("--base-url", default=BASE_URL)
+    args = parser.parse_args()
+
+    load_services(args.full, args.dry_run, args.base_url)
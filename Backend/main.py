@@ -1,41 +1,117 @@
 import uvicorn
-import joblib # loads machine learning models
-import pandas as pd
 import numpy as np
 import holidays
-import requests
-import gzip, json, io, os
-from datetime import datetime
-from fastapi import FastAPI, HTTPException
+import os
+import asyncio
+import time
+from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
 from pydantic import BaseModel
-from azure.storage.blob import BlobServiceClient
+from service_index import ServiceIndex
+from departure_index import DepartureIndex, HOLIDAY_BIT, PEAK_BIT, day_bit
+from features import FEATURES, build_matrix, predict_matrix
+from batcher import MicroBatcher
+from tree_runtime import TreeModel
+from prediction_cache import PredictionCache
+from upstream import StopsClient
+from route_tables import RouteTables
+from snapshot import open_serving_snapshot, load_json_array
+from delay_profiles import DelayProfiles, NO_DELAY
+from metrics import Histogram, StageTimings, LATENCY_BUCKETS, prometheus_histogram, prometheus_metric
+from profiler import SamplingProfiler
 
 app = FastAPI() # FastAPI setup
 
-# Loading JSON from blob
-def load_from_blob(container, blob):
-    connection = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
-    service = BlobServiceClient.from_connection_string(connection)
-    client = service.get_blob_client(container=container, blob=blob)
+# Local binary snapshot of the services, departures and model (rebuilt from blob when its inputs change)
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "snapshot/serving.snap")
+# 0 serves the snapshot file as published (e.g. exported from MongoDB) without checking the blobs
+SNAPSHOT_REBUILD = os.environ.get("SNAPSHOT_REBUILD", "1") != "0"
 
-    data = client.download_blob().readall()
-    
-    if blob.endswith(".gz"):
-        data = gzip.decompress(data)
+# Caching predictions; invalidated whenever a new model or departures dataset is loaded
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", 50_000)),
+    max_bytes=int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", 300)),
+)
+CACHE_RESOLUTION_MINS = int(os.environ.get("PREDICTION_CACHE_RESOLUTION_MINS", 1))
 
-    return json.loads(data)
-    
-services_db = load_from_blob("busdata", "services.json")
-departures_db = load_from_blob("busdata", "departures.json")
+# How often each worker checks for a newly published snapshot (0 disables hot-swapping)
+SNAPSHOT_POLL_SECONDS = float(os.environ.get("SNAPSHOT_POLL_SECONDS", 300))
+
+# Taking /predict_delay's model answer for the closest journey from the snapshot's precomputed
+# per-journey table when it has one (added offline by snapshot.py --profiles; the server never
+# builds it). 0 always evaluates the model live.
+USE_DELAY_PROFILES = os.environ.get("USE_DELAY_PROFILES", "1") != "0"
+
+# Bounds on /departures_board requests, which keep its work (and one model call) small
+BOARD_MAX_WINDOW_MINS = int(os.environ.get("BOARD_MAX_WINDOW_MINS", 180))
+BOARD_MAX_ROWS = int(os.environ.get("BOARD_MAX_ROWS", 100))
+
+# Per-stage latency of the request hot paths, exported from /metrics (per worker process)
+stage_timings = StageTimings()
+
+# On-demand stack sampling behind /profile, only when PROFILING_ENABLED=1
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+profiler = SamplingProfiler(max_seconds=float(os.environ.get("PROFILING_MAX_SECONDS", 60)))
+
+class ServingData:
+    # Everything served from one snapshot: the service catalogue, the departure index, the model
+    # and its encodings. Arrays stay in the shared read-only mapping of the snapshot file, and
+    # the whole set is swapped as one object, so a request never mixes two versions.
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+
+        # Indexing the service catalogue for typeahead search
+        self.services = ServiceIndex(load_json_array(snapshot.array("services")))
 
-# Loading pre-trained LGBM model and data encodings
-model = joblib.load("models/lgbm_model.pkl")
-target_maps = joblib.load("models/target_encodings.pkl")
+        # Historical stop events indexed by (service_id, stop_name, destination)
+        self.departures = DepartureIndex.from_arrays(snapshot.arrays("departures"))
+
+        # Pre-trained LGBM model (exported to flat tree arrays)
+        self.model = TreeModel(snapshot.arrays("model"))
+        if self.model.feature_names != FEATURES:
+            raise RuntimeError(f"Model features {self.model.feature_names} do not match {FEATURES}")
+
+        # Route endpoint and stop-name target encodings, pre-joined per service and (service, stop)
+        self.routes = RouteTables.from_arrays(snapshot.arrays("routes"))
+
+        # Precomputed per-key answers on a weekday x holiday x time-bucket grid (None if not built)
+        self.profiles = DelayProfiles(snapshot.arrays("profiles")) if "profiles/predicted" in snapshot else None
+
+serving = None
+
+def load_snapshot() -> bool:
+    # Mapping the current snapshot (rebuilding it if its inputs changed) and swapping it in if it
+    # is a new version. Requests in flight keep using the data they started with.
+    global serving
+    snapshot = open_serving_snapshot(SNAPSHOT_PATH, rebuild=SNAPSHOT_REBUILD)
+    if serving is not None and snapshot.version == serving.version:
+        return False
+
+    data = ServingData(snapshot)
+    print(f"Snapshot {data.version[:12]}: {len(data.departures)} stop events, {data.departures.key_count()} keys, "
+          f"{data.departures.nbytes() / 1e6:.1f} MB mapped")
+    serving = data
+    prediction_cache.invalidate()
+    return True
+
+load_snapshot()
 
 uk_holidays = holidays.UK(subdiv="ENG")
 
+# Shared, pooled client for the bustimes.org stop lists
+stops_client = StopsClient(
+    base_url=os.environ.get("BUSTIMES_BASE_URL", "https://bustimes.org"),
+    fresh_ttl=float(os.environ.get("STOPS_CACHE_TTL_SECONDS", 3600)),
+    stale_ttl=float(os.environ.get("STOPS_CACHE_STALE_SECONDS", 86400)),
+    empty_ttl=float(os.environ.get("STOPS_CACHE_EMPTY_SECONDS", 60)),
+)
+
 # Enable CORS (Allow React frontend to access API)
 app.add_middleware(
     CORSMiddleware,
@@ -46,6 +122,29 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+class RequestTimer:
+    # ASGI middleware recording the latency of every HTTP request per matched route template
+    # (so path parameters and unmatched URLs do not create new series)
+
+    def __init__(self, app, seconds: dict):
+        self.app = app
+        self.seconds = seconds # (method, route) -> Histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "unmatched")
+            hist = self.seconds.get(key) or self.seconds.setdefault(key, Histogram(LATENCY_BUCKETS))
+            hist.observe(time.perf_counter() - start)
+
+request_seconds = {}
+app.add_middleware(RequestTimer, seconds=request_seconds)
+
 # Request structure for delay prediction
 class PredictRequest(BaseModel):
     service_id: int
@@ -75,197 +174,437 @@ def home():
     return {"message": "FastAPI is running!"}
 
 @app.get("/get_services")
-def get_services(query: str ):
-    # Searching for services in MongoDB using regex
-    services = services_db.find(
-    {
-        "$or": [
-            {"number": {"$regex":query, "$options": "i"}},
-            {"description": {"$regex":query, "$options": "i"}},
-        ]
-    },
-    {})
-
-    results = list(services)
-    return results
+def get_services(query: str, limit: int | None = Query(None, ge=1)):
+    # Searching the service index by line number and route description
+    return serving.services.search(query, limit)
 
 @app.post("/get_closest_journey")
 def get_closest_journey(req: PredictRequest):
+    return closest_journeys(req, serving)
+
+def parse_date_time(req: PredictRequest):
+    # Parsing the request's date and departure time (in minutes after midnight)
+    with stage_timings.time("parse_request"):
+        try:
+            return datetime.fromisoformat(req.date).date(), time_to_minutes(req.time)
+        except ValueError as e:
+            raise HTTPException(400, f"Invalid date/time: {e}")
 
-    # Parsing date and time
-    date = datetime.fromisoformat(req.date).date()
-    hr, mins = map(int, req.time.split(":"))
-    dep_mins = hr * 60 + mins
+def closest_journeys(req: PredictRequest, data: ServingData, date_time=None) -> dict:
+    # date_time: the request's (date, minutes) when already parsed by parse_date_time
+    departures_db = data.departures
+    date, dep_mins = date_time or parse_date_time(req)
 
     # Establishing time range
     window = 30
     low = dep_mins - window
     high = dep_mins + window
 
-    # Building filter for MongoDB to get journeys around the specified time
-    filter = {
-        "service_id": req.service_id,
-        "stop_name": req.stop_name,
-        "destination": req.destination,
-        "scheduled_mins": {"$gte": low, "$lte": high},
-        "is_holiday": date in uk_holidays,
-        "is_peak": is_peak(dep_mins, date.weekday()),
-    }
-    
-    # MongoDB query - specifying the attributes to return
-    retrieved_journeys_general = list(departures_db.find(filter, {
-        "_id": 0,
-        "delay_mins": 1,
-        "scheduled_mins": 1,
-        "actual_mins": 1,
-        "journey_id": 1
-    }))
-
-    # Building filter to find closest journey on the same day
-    filter = {
-        "service_id": req.service_id,
-        "stop_name": req.stop_name,
-        "destination": req.destination,
-        "scheduled_mins": {"$gte": low, "$lte": high},
-        "day_of_week": get_day(req.date),
-    }
+    # Finding journeys around the specified time with the same holiday/peak status
+    with stage_timings.time("general_lookup"):
+        expected = (HOLIDAY_BIT if date in uk_holidays else 0) | (PEAK_BIT if is_peak(dep_mins, date.weekday()) else 0)
+        retrieved_journeys_general = departures_db.find(
+            req.service_id, req.stop_name, req.destination, low, high,
+            HOLIDAY_BIT | PEAK_BIT, expected
+        )
 
-    # MongoDB - specifying the attributes to return
-    retrieved_journeys_dated = list(departures_db.find(filter, {
-        "scheduled_dep": 1,
-        "scheduled_mins": 1,
-    }))
+    # Finding journeys around the specified time on the same day of the week
+    with stage_timings.time("dated_lookup"):
+        day = day_bit(date.weekday())
+        retrieved_journeys_dated = departures_db.find(
+            req.service_id, req.stop_name, req.destination, low, high, day, day
+        )
 
-    if not retrieved_journeys_general:
+    if len(retrieved_journeys_general) == 0:
         raise HTTPException(404, "No matching history found")
     
     # Finding closest journey on the specific day
-    closest = min(retrieved_journeys_general, key=lambda doc: abs(doc["scheduled_mins"] - dep_mins))
-
-    # Checking if such journey exists to prevent errors
-    if retrieved_journeys_dated:
-        closest_on_date = min(
-            retrieved_journeys_dated,
-            key=lambda doc: abs(doc["scheduled_mins"] - dep_mins)
+    with stage_timings.time("closest_journey"):
+        closest = departures_db.record(
+            departures_db.closest(retrieved_journeys_general, dep_mins),
+            ("delay_mins", "scheduled_mins", "actual_mins", "journey_id")
         )
-    else:
-        closest_on_date = ""
+
+        # Checking if such journey exists to prevent errors
+        if len(retrieved_journeys_dated):
+            closest_on_date = departures_db.record(
+                departures_db.closest(retrieved_journeys_dated, dep_mins),
+                ("scheduled_dep", "scheduled_mins")
+            )
+        else:
+            closest_on_date = ""
 
     return {"closest": closest, "closest_on_date": closest_on_date}
 
-@app.post("/predict_delay")
-def predict_delay(req: PredictRequest):
+def resolve_request(req: PredictRequest, data: ServingData) -> dict:
+    # Gathering everything the model needs for one request (raises HTTPException on failure)
+
     # Finding closest historical journeys
-    closest_js = get_closest_journey(req)
+    j_date, dep_mins = parse_date_time(req)
+    closest_js = closest_journeys(req, data, (j_date, dep_mins))
     closest_j = closest_js["closest"]
     closest_j_with_date = closest_js["closest_on_date"]
 
     if not closest_j:
         raise HTTPException(404, "No historical journey found in window")
     
-    # Getting the origin and destination from the route description
-    svc = services_db.find_one({"_id": req.service_id})
-    if not svc or "description" not in svc:
+    # Getting the origin and destination encodings of the route
+    with stage_timings.time("service_lookup"):
+        route = data.routes.service(req.service_id)
+    if route is None:
         raise HTTPException(500, "Service description missing")
+    origin_te, destination_te = route
 
-    origin, destination = [p.strip() for p in svc["description"].split(" - ")]
-
-    # Retrieving stop index
-    sample = departures_db.find_one(
-        {"service_id": req.service_id, "stop_name": req.stop_name},
-        {"stop_index": 1}
-    )
-    if not sample:
+    # Retrieving stop index and stop-name encoding
+    with stage_timings.time("stop_index"):
+        stop_pos = data.departures.stop_position(req.service_id, req.stop_name)
+    if stop_pos is None:
         raise HTTPException(404, f"Stop {req.stop_name!r} not found.")
-    stop_idx = sample["stop_index"]
 
-    # Processing time and date
-    try:
-        j_date = datetime.fromisoformat(req.date).date()
-        sched_mins = time_to_minutes(req.time)
-    except Exception as e:
-        raise HTTPException(400, f"Invalid date/time: {e}")
+    if closest_j_with_date:
+        scheduled_dep = closest_j_with_date["scheduled_dep"]
+    else:
+        scheduled_dep = ""
 
-    day_of_week = j_date.weekday()
-    is_holiday = j_date in uk_holidays
+    return {
+        "scheduled_mins": closest_j.get("scheduled_mins", 720), # default to 12:00 if missing
+        "day_of_week": j_date.weekday(),
+        "is_holiday": j_date in uk_holidays,
+        "service_id": req.service_id,
+        "stop_index": int(data.departures.stop_values[stop_pos]),
+        "origin_te": origin_te,
+        "destination_te": destination_te,
+        "stop_name_te": float(data.routes.stop_te[stop_pos]),
+        "scheduled_dep": scheduled_dep,
+    }
 
-    # Constructing features for the model
+def predict_resolved(items: list, data: ServingData) -> np.ndarray:
+    # Constructing features for the model and making predictions in a single call, with the model
+    # of the snapshot the items were resolved against
     try:
-        # Extracting and preparing encoded categorical features
-        scheduled_mins = closest_j.get("scheduled_mins", 720)  # default to 12:00 if missing
-        origin_enc = target_maps["origin"].get(origin.strip(), 0)
-        destination_enc = target_maps["destination"].get(destination.strip(), 0)
-        stop_name_enc = target_maps["stop_name"].get(req.stop_name.strip(), 0)
-
-        row = {
-        "time_sin": [np.sin(2 * np.pi * scheduled_mins / 1440)],
-        "time_cos": [np.cos(2 * np.pi * scheduled_mins / 1440)],
-        "day_of_week": [day_of_week],
-        "is_holiday": [is_holiday],
-        "service_id": [req.service_id],
-        "stop_index": [stop_idx],
-        "origin_te": [origin_enc],
-        "destination_te": [destination_enc],
-        "stop_name_te": [stop_name_enc],
-        }
+        with stage_timings.time("build_matrix"):
+            X = build_matrix(items)
     except Exception as e:
         raise HTTPException(500, f"Failed to build feature vector: {e}")
-    
-    # Making prediction
-    X = pd.DataFrame(row)
+
     try:
-        prediction = model.predict(X)[0]
+        with stage_timings.time("model_predict"):
+            return predict_matrix(data.model, X)
     except Exception as e:
         raise HTTPException(500, f"Prediction failed: {e}")
-    
-    if closest_j_with_date:
-        scheduled_dep = closest_j_with_date["scheduled_dep"]
-    else:
-        scheduled_dep = ""
 
-    return {
-        "predicted_delay_mins": int(prediction),
-        "scheduled_dep": scheduled_dep
-    }
-
-@app.get("/get_stops")
-def get_stops(service_id: int):
-    # Get journey details
-    resp = requests.get("https://bustimes.org/api/vehiclejourneys/", params={"service": service_id, "page_size": 1}, timeout=10)
-    resp.raise_for_status()
-    journeys = resp.json().get("results") or []
-
-    # Get service details
-    resp = requests.get(f"http://bustimes.org/api/services/{service_id}", params={"page_size": 1}, timeout = 10)
-    resp.raise_for_status()
-    svc = resp.json()
-    origin, destination = [p.strip() for p in svc["description"].split(" - ")]
-
-    if not journeys or not svc:
-        return {"stops": []}
-    
-    # Iterating through first few journeys to find one that ends at the known destination
-    journey_index = 0
-    while (True):
-        if journey_index > 5:
-            return []
+# Coalescing concurrent /predict_delay calls into one model call per window
+batcher = MicroBatcher(
+    predict_resolved,
+    window_ms=float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 2)),
+    max_size=int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 64)),
+)
 
-        journey = journeys[journey_index]
-        journey_id = journey["id"]
+def cache_key(req: PredictRequest, data: ServingData):
+    # Keying on what the prediction depends on: the snapshot version, the date only through its
+    # weekday and holiday status, and the time bucketed to CACHE_RESOLUTION_MINS (None if unparseable)
+    try:
+        j_date = datetime.fromisoformat(req.date).date()
+        mins = time_to_minutes(req.time)
+    except Exception:
+        return None
+    return (data.version, req.service_id, req.stop_name, req.destination,
+            j_date.weekday(), j_date in uk_holidays, mins // CACHE_RESOLUTION_MINS)
+
+def profile_prediction(req: PredictRequest, item: dict, data: ServingData):
+    # The model's answer for the request's closest journey, read from the snapshot's precomputed
+    # per-journey table; None when it is not there, so the caller evaluates the model
+    if not USE_DELAY_PROFILES or data.profiles is None:
+        return None
+    pos = data.departures.key_position(req.service_id, req.stop_name, req.destination)
+    if pos is None:
+        return None
+    return data.profiles.journey_prediction(pos, item["scheduled_mins"], item["is_holiday"], item["day_of_week"])
 
-        stops_resp = requests.get(
-            f"https://bustimes.org/services/{service_id}/journeys/{journey_id}.json", timeout=10
-        )
-        stops_resp.raise_for_status()
+@app.post("/predict_delay")
+async def predict_delay(req: PredictRequest):
+    data = serving
+    with stage_timings.time("cache_lookup"):
+        key = cache_key(req, data)
+        cached = prediction_cache.get(key) if key else None
+    if cached is not None:
+        return cached
+
+    item = resolve_request(req, data)
+    with stage_timings.time("profile_lookup"):
+        prediction = profile_prediction(req, item, data)
+    if prediction is None:
+        with stage_timings.time("batch_predict"): # queueing in the batcher plus the batch's model call
+            prediction = await batcher.submit(item, data)
+
+    result = {
+        "predicted_delay_mins": int(prediction),
+        "scheduled_dep": item["scheduled_dep"]
+    }
+    if key:
+        prediction_cache.put(key, result)
+    return result
+
+@app.post("/predict_delay_batch")
+def predict_delay_batch(reqs: list[PredictRequest]):
+    # Resolving every uncached request, keeping per-item errors instead of failing the whole batch
+    data = serving
+    results = [None] * len(reqs)
+    items, positions, keys = [], [], []
+    for i, req in enumerate(reqs):
+        key = cache_key(req, data)
+        cached = prediction_cache.get(key) if key else None
+        if cached is not None:
+            results[i] = cached
+            continue
+        try:
+            item = resolve_request(req, data)
+        except HTTPException as e:
+            results[i] = {"error": e.detail, "status_code": e.status_code}
+            continue
+        profiled = profile_prediction(req, item, data)
+        if profiled is not None:
+            results[i] = {"predicted_delay_mins": profiled, "scheduled_dep": item["scheduled_dep"]}
+            if key:
+                prediction_cache.put(key, results[i])
+            continue
+        items.append(item)
+        positions.append(i)
+        keys.append(key)
+
+    # Scoring all resolved requests with one model call
+    predictions = predict_resolved(items, data)
+    for i, key, item, prediction in zip(positions, keys, items, predictions):
+        results[i] = {
+            "predicted_delay_mins": int(prediction),
+            "scheduled_dep": item["scheduled_dep"]
+        }
+        if key:
+            prediction_cache.put(key, results[i])
+
+    return {"results": results}
+
+@app.get("/delay_profile")
+def delay_profile(service_id: int, stop_name: str, destination: str, date: str):
+    # The precomputed delay profile of a stop for one date: per time bucket, the predicted delay and
+    # the historical median / 90th percentile delay of matching journeys (None where there is no history)
+    data = serving
+    if data.profiles is None:
+        raise HTTPException(404, "Delay profiles are not built for this snapshot")
+    try:
+        j_date = datetime.fromisoformat(date).date()
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid date: {e}")
+    pos = data.departures.key_position(service_id, stop_name, destination)
+    if pos is None:
+        raise HTTPException(404, "No matching history found")
 
-        stops = [ stop["name"] for stop in stops_resp.json().get("stops", []) if stop.get("name")]
+    day = data.profiles.day(pos, j_date in uk_holidays, j_date.weekday())
+    resolution = data.profiles.resolution
+    value = lambda v: None if v == NO_DELAY else int(v)
+    buckets = []
+    for b in range(len(day["predicted"])):
+        start = b * resolution
+        code = int(day["dep_code"][b])
+        buckets.append({
+            "time": f"{start // 60:02d}:{start % 60:02d}",
+            "predicted_delay_mins": value(day["predicted"][b]),
+            "p50_delay_mins": value(day["p50"][b]),
+            "p90_delay_mins": value(day["p90"][b]),
+            "scheduled_dep": data.departures.dep_strings[code] if code >= 0 else "",
+        })
+    return {"resolution_mins": resolution, "buckets": buckets}
+
+def board_candidates(data: ServingData, stop_name: str, stop_keys, day, start: int, window: int) -> list:
+    # Enumerating the distinct scheduled departures at a stop in [start, start + window) minutes
+    # from its keys in the inverted stop index, taking each route's timetable from the history of the same
+    # weekday. Routes terminating at the stop are left out, and windows running past midnight
+    # continue on the next day. Returns (minutes from the start of `day`, date, key position,
+    # event position) per departure.
+    departures_db = data.departures
+    keys = [pos for pos in stop_keys if departures_db.key_parts(pos)[2] != stop_name]
+    rows = []
+    end = start + window
+    segment_start, offset = start, 0
+    while segment_start < end:
+        segment_end = min(end, offset + 1440)
+        date = day + timedelta(days=offset // 1440)
+        weekday = day_bit(date.weekday())
+        for pos in keys:
+            events = departures_db.key_window(pos, segment_start - offset, segment_end - offset - 1)
+            events = events[(departures_db.flags[events] & weekday) != 0]
+            if len(events) == 0:
+                continue
+            times, first = np.unique(departures_db.scheduled_mins[events], return_index=True)
+            rows.extend(zip((times + offset).tolist(), [date] * len(times), [int(pos)] * len(times),
+                            events[first].tolist()))
+        segment_start, offset = segment_end, offset + 1440
+    return rows
+
+@app.get("/departures_board")
+def departures_board(stop_name: str, date: str, start_time: str = Query(alias="time"), window_mins: int = 60,
+                     limit: int = 30):
+    # Every departure from a stop in the time window (all services and destinations), scored with
+    # one model call and sorted by scheduled time. At most `limit` rows are scored, so the cost is
+    # bounded however many routes serve the stop.
+    data = serving
+    if not 1 <= window_mins <= BOARD_MAX_WINDOW_MINS:
+        raise HTTPException(400, f"window_mins must be between 1 and {BOARD_MAX_WINDOW_MINS}")
+    if not 1 <= limit <= BOARD_MAX_ROWS:
+        raise HTTPException(400, f"limit must be between 1 and {BOARD_MAX_ROWS}")
+    try:
+        day = datetime.fromisoformat(date).date()
+        hr, mins = map(int, start_time.split(":"))
+    except Exception as e:
+        raise HTTPException(400, f"Invalid date/time: {e}")
+    if not (0 <= hr < 24 and 0 <= mins < 60):
+        raise HTTPException(400, "time must be between 00:00 and 23:59")
+    start = hr * 60 + mins
+
+    with stage_timings.time("board_lookup"):
+        stop_keys = data.departures.keys_at_stop(stop_name)
+        if len(stop_keys) == 0:
+            raise HTTPException(404, f"Stop {stop_name!r} not found.")
+        rows = board_candidates(data, stop_name, stop_keys, day, start, window_mins)
+        rows.sort(key=lambda row: (row[0], row[2]))
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+
+        # Resolving the model inputs of each departure
+        board, items = [], []
+        for mins, dep_date, pos, event in rows:
+            service_id, _, destination = data.departures.key_parts(pos)
+            route = data.routes.service(service_id)
+            stop_pos = data.departures.stop_position(service_id, stop_name)
+            svc = data.services.get(service_id) or {}
+            entry = {
+                "service_id": service_id,
+                "number": svc.get("number"),
+                "destination": destination,
+                "date": dep_date.isoformat(),
+                "scheduled_dep": data.departures.dep_strings[data.departures.dep_code[event]],
+                "predicted_delay_mins": None,
+                "expected_dep": None,
+            }
+            board.append(entry)
+            if route is not None and stop_pos is not None:
+                items.append((entry, mins, {
+                    "scheduled_mins": int(data.departures.scheduled_mins[event]),
+                    "day_of_week": dep_date.weekday(),
+                    "is_holiday": dep_date in uk_holidays,
+                    "service_id": service_id,
+                    "stop_index": int(data.departures.stop_values[stop_pos]),
+                    "origin_te": route[0],
+                    "destination_te": route[1],
+                    "stop_name_te": float(data.routes.stop_te[stop_pos]),
+                }))
+
+    # Scoring the whole board in one call
+    with stage_timings.time("board_predict"):
+        predictions = predict_matrix(data.model, build_matrix([item for _, _, item in items]))
+    for (entry, mins, _), prediction in zip(items, predictions):
+        delay = int(prediction)
+        expected = (mins + delay) % 1440
+        entry["predicted_delay_mins"] = delay
+        entry["expected_dep"] = f"{expected // 60:02d}:{expected % 60:02d}"
+
+    return {"stop_name": stop_name, "date": day.isoformat(), "time": start_time, "window_mins": window_mins,
+            "truncated": truncated, "departures": board}
+
+@app.get("/batcher_stats")
+def batcher_stats():
+    # Queue depth, batch-size histogram and queue wait time of the prediction batcher
+    return batcher.stats()
+
+@app.get("/cache_stats")
+def cache_stats():
+    # Size and hit/miss/eviction counters of the prediction cache
+    return prediction_cache.stats()
 
-        # If the last stop is the intended destination or the first and last stops are the same (in the case of circular routes), break the loop and return the stops list
-        if (destination in stops[-1] or origin in stops[0]) or stops[0] == stops[-1]:
-            break;
-        journey_index += 1
- 
-    return stops
+@app.get("/get_stops")
+async def get_stops(service_id: int):
+    # Getting the stop list of a service from bustimes.org (cached per service)
+    with stage_timings.time("get_stops"):
+        return await stops_client.get_stops(service_id)
+
+@app.get("/upstream_stats")
+def upstream_stats():
+    # Hit/miss counters of the bustimes.org stop list cache
+    return stops_client.stats()
+
+@app.get("/snapshot")
+def snapshot_info():
+    # Version and build details of the snapshot this worker is serving
+    return {"version": serving.version, "meta": serving.snapshot.meta, "pid": os.getpid()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus exposition of this worker's latency histograms and counters
+    batch, cache, upstream = batcher.stats(), prediction_cache.stats(), stops_client.stats()
+    lines = [
+        *prometheus_histogram("busdelay_stage_duration_seconds", "Time spent in each stage of the request hot paths",
+                              [({"stage": stage}, hist) for stage, hist in stage_timings.items()]),
+        *prometheus_histogram("busdelay_http_request_duration_seconds", "HTTP request latency per route",
+                              [({"method": method, "route": route}, hist)
+                               for (method, route), hist in sorted(request_seconds.items())]),
+        *prometheus_histogram("busdelay_batch_size", "Items per model batch", [({}, batcher.batch_sizes)]),
+        *prometheus_histogram("busdelay_batch_wait_seconds", "Time items waited in the batcher queue",
+                              [({}, batcher.wait_ms)], scale=0.001),
+        *prometheus_histogram("busdelay_batch_predict_seconds", "Model call time per batch",
+                              [({}, batcher.predict_ms)], scale=0.001),
+        *prometheus_metric("busdelay_batch_queue_depth", "gauge", "Items waiting in the batcher",
+                           [({}, batch["queue_depth"])]),
+        *prometheus_metric("busdelay_prediction_cache_lookups_total", "counter", "Prediction cache lookups",
+                           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+        *prometheus_metric("busdelay_prediction_cache_entries", "gauge", "Entries in the prediction cache",
+                           [({}, cache["entries"])]),
+        *prometheus_histogram("busdelay_upstream_request_duration_seconds", "bustimes.org request latency",
+                              [({}, stops_client.request_seconds)]),
+        *prometheus_metric("busdelay_upstream_cache_lookups_total", "counter", "Stop list cache lookups",
+                           [({"result": "hit"}, upstream["hits"]), ({"result": "stale"}, upstream["stale_hits"]),
+                            ({"result": "miss"}, upstream["misses"])]),
+        *prometheus_metric("busdelay_upstream_fetch_errors_total", "counter", "Failed stop list fetches",
+                           [({}, upstream["fetch_errors"])]),
+        *prometheus_metric("busdelay_snapshot_info", "gauge", "Snapshot this worker is serving",
+                           [({"version": serving.version}, 1)]),
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.post("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    # Sampling this worker's stacks for a while (opt-in via PROFILING_ENABLED=1); returns folded
+    # stacks for flamegraph.pl / speedscope. Requests keep being served during the capture.
+    if not PROFILING_ENABLED:
+        raise HTTPException(404, "Profiling is disabled (set PROFILING_ENABLED=1)")
+    try:
+        result = await asyncio.to_thread(profiler.capture, seconds, interval_ms)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    return PlainTextResponse(profiler.folded(result["stacks"]), headers={
+        "X-Profile-Samples": str(result["samples"]), "X-Profile-Seconds": f"{result['seconds']:.3f}",
+        "X-Profile-Pid": str(os.getpid())})
+
+async def watch_snapshot():
+    # Periodically picking up a newly published snapshot (or rebuilding it when its inputs changed)
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+        try:
+            await asyncio.to_thread(load_snapshot)
+        except Exception as e:
+            print(f"Snapshot refresh failed, still serving {serving.version[:12]}: {e!r}")
+
+@app.on_event("startup")
+async def start_snapshot_watch():
+    if SNAPSHOT_POLL_SECONDS > 0:
+        app.state.snapshot_watch = asyncio.create_task(watch_snapshot())
+
+@app.on_event("shutdown")
+async def close_upstream():
+    watch = getattr(app.state, "snapshot_watch", None)
+    if watch is not None:
+        watch.cancel()
+    await stops_client.aclose()
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Workers share the snapshot's pages; each maps it read-only (WEB_CONCURRENCY sets the count)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.environ.get("WEB_CONCURRENCY", 1)))
\ No newline at end of file
@@ -0,0 +1,124 @@
+import time
+import bisect
+import resource
+import threading
+from contextlib import contextmanager
+
+def _proc_status_mb(field: str):
+    # Reading a memory field (in KiB) from /proc/self/status (None where unavailable)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def peak_rss_mb() -> float:
+    # Peak resident set size of this process so far. VmHWM is preferred because ru_maxrss
+    # (KiB on Linux) carries over the parent's peak into a forked and exec'd child.
+    peak = _proc_status_mb("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current_rss_mb() -> float:
+    # Current resident set size of this process (0 where unavailable)
+    return _proc_status_mb("VmRSS") or 0.0
+
+class Histogram:
+    # Cumulative-bucket histogram (Prometheus style) that is safe to update from worker threads
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # the last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        # Returning cumulative counts per upper bound, plus count/sum/mean/max
+        with self.lock:
+            cumulative, running = {}, 0
+            for bound, n in zip(self.buckets + ["+Inf"], self.counts):
+                running += n
+                cumulative[str(bound)] = running
+            return {
+                "buckets": cumulative,
+                "count": self.count,
+                "sum": self.total,
+                "mean": self.total / self.count if self.count else 0.0,
+                "max": self.max,
+            }
+
+# Latency bucket bounds in seconds, from 50µs lookups to multi-second upstream calls
+LATENCY_BUCKETS = [0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+class StageTimings:
+    # One latency histogram (in seconds) per named stage of a request path, created on first use
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        hist = self.stages.get(stage)
+        if hist is None:
+            with self.lock:
+                hist = self.stages.setdefault(stage, Histogram(self.buckets))
+        return hist
+
+    @contextmanager
+    def time(self, stage: str):
+        # Timing the body of a with-block (also when it raises)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(stage).observe(time.perf_counter() - start)
+
+    def items(self) -> list:
+        with self.lock:
+            return sorted(self.stages.items())
+
+# Prometheus text exposition format (version 0.0.4)
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+def _number(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def prometheus_histogram(name: str, help: str, series, scale: float = 1.0) -> list:
+    # Rendering (labels, Histogram) pairs as one histogram metric; scale converts the observed
+    # unit to the exported one (e.g. 0.001 for histograms kept in milliseconds)
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for labels, hist in series:
+        snap = hist.snapshot()
+        bounds = [_number(b * scale) for b in hist.buckets] + ["+Inf"]
+        for le, count in zip(bounds, snap["buckets"].values()):
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(snap['sum'] * scale)}")
+        lines.append(f"{name}_count{_labels(labels)} {snap['count']}")
+    return lines
+
+def prometheus_metric(name: str, kind: str, help: str, series) -> list:
+    # Rendering (labels, value) pairs as one counter or gauge metric
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in series]
+    return lines
@@ -0,0 +1,86 @@
+import re
+import argparse
+from datetime import date, timedelta
+import numpy as np
+
+# Stop events are stored in one collection per service date, "<base>_YYYYMMDD" (e.g.
+# journeysBN_20250417), for both the document and the compact journey layout. Reading a date
+# range only touches the matching collections, and retention drops whole collections instead
+# of deleting documents one by one.
+SUFFIX = re.compile(r"_(\d{8})$")
+
+def as_date(day) -> date:
+    return day if isinstance(day, date) else date.fromisoformat(day)
+
+def partition_name(base: str, day) -> str:
+    return f"{base}_{as_date(day):%Y%m%d}"
+
+def partition_date(base: str, name: str):
+    # Service date of a partition of `base` (None for any other collection)
+    match = SUFFIX.search(name)
+    if not match or name[:match.start()] != base:
+        return None
+    try:
+        return date(int(match[1][:4]), int(match[1][4:6]), int(match[1][6:]))
+    except ValueError:
+        return None
+
+def list_partitions(db, base: str, start=None, end=None) -> list:
+    # (date, collection name) of the partitions of `base` between start and end (inclusive), oldest first
+    start, end = start and as_date(start), end and as_date(end)
+    names = db.list_collection_names(filter={"name": {"$regex": f"^{re.escape(base)}_[0-9]{{8}}$"}})
+    found = [(partition_date(base, name), name) for name in names]
+    return sorted((day, name) for day, name in found
+                  if day is not None and (start is None or day >= start) and (end is None or day <= end))
+
+def partition_collections(db, base: str, start=None, end=None) -> list:
+    # The collections holding the stop events of a date range
+    return [db[name] for _, name in list_partitions(db, base, start, end)]
+
+def group_by_date(docs) -> dict:
+    # Positions of the documents of each service date ("date" field), in document order
+    days, inverse = np.unique(np.asarray([doc["date"] for doc in docs], dtype=object), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(days)))
+    return {day: positions for day, positions in zip(days.tolist(), np.split(order, bounds[:-1]))}
+
+def purge(db, base: str, before, dry_run: bool = False) -> list:
+    # Dropping every partition of `base` older than `before`; returns the dropped names
+    dropped = [name for day, name in list_partitions(db, base, end=as_date(before) - timedelta(days=1))]
+    if not dry_run:
+        for name in dropped:
+            db.drop_collection(name)
+    return dropped
+
+def migrate(db, base: str, drop: bool = False) -> dict:
+    # Splitting an unpartitioned collection into per-date partitions (server side, one $merge per
+    # date; documents already in a partition are kept). Returns {partition: documents}.
+    source = db[base]
+    counts = {}
+    for day in sorted(d for d in source.distinct("date") if d):
+        name = partition_name(base, day)
+        source.aggregate([{"$match": {"date": day}},
+                          {"$merge": {"into": name, "on": "_id", "whenMatched": "keepExisting"}}])
+        counts[name] = db[name].estimated_document_count()
+    if drop:
+        db.drop_collection(base)
+    return counts
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from load_journeys import JOURNEYS_COL
+
+    parser = argparse.ArgumentParser(description="List stop event partitions or split an unpartitioned collection")
+    parser.add_argument("command", choices=["list", "migrate"])
+    parser.add_argument("--collection", default=JOURNEYS_COL, help="base collection name")
+    parser.add_argument("--drop", action="store_true", help="drop the unpartitioned collection after migrating")
+    args = parser.parse_args()
+
+    client = MongoClient("") # MISSING LINK
+    db = client["BusDelayPredict"]
+    if args.command == "migrate":
+        for name, count in migrate(db, args.collection, args.drop).items():
+            print(f"{name}: {count} documents")
+    else:
+        for day, name in list_partitions(db, args.collection):
+            print(f"{day}  {name}  {db[name].estimated_document_count()} documents")
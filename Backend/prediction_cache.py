@@ -0,0 +1,92 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+class PredictionCache:
+    # LRU cache with a time-to-live, capped both in entries and in (estimated) bytes
+
+    def __init__(self, max_entries: int = 50_000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.entries = OrderedDict() # key -> (value, expires_at, size)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _size(key, value) -> int:
+        # Estimating the memory held by one entry
+        size = sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key) + sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+        return size
+
+    def get(self, key):
+        # Returning the cached value, or None on a miss or an expired entry
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (value, time.monotonic() + self.ttl, size)
+            self.bytes += size
+
+            # Evicting least recently used entries until both caps are met
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self):
+        # Dropping every entry (called when a new model or dataset is loaded)
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+class SamplingProfiler:
+    # In-process sampling profiler for diagnosing latency in a running server without a redeploy.
+    # A background thread reads the stack of every other thread at a fixed interval and counts
+    # identical stacks; the result is in folded format ("frame;frame;frame count" per line), which
+    # flamegraph.pl, speedscope and inferno render directly. One capture runs at a time.
+
+    def __init__(self, max_seconds: float = 60.0, min_interval_ms: float = 1.0):
+        self.max_seconds = max_seconds
+        self.min_interval_ms = min_interval_ms
+        self.lock = threading.Lock()
+        self.captures = 0
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _stack(self, frame, thread_name: str) -> str:
+        # Root-first stack of one thread, prefixed with the thread so threads stay separable
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame))
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names))
+
+    def capture(self, seconds: float, interval_ms: float = 5.0) -> dict:
+        # Sampling all threads for `seconds` (blocking the caller). Raises RuntimeError if a
+        # capture is already running.
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile capture is already running")
+        try:
+            seconds = min(max(seconds, 0.0), self.max_seconds)
+            interval = max(interval_ms, self.min_interval_ms) / 1000
+            me = threading.get_ident()
+            stacks, samples = Counter(), 0
+            start = time.perf_counter()
+            deadline = start + seconds
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        stacks[self._stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+                samples += 1
+                time.sleep(interval)
+            self.captures += 1
+            return {"seconds": time.perf_counter() - start, "samples": samples, "stacks": stacks}
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def folded(stacks: Counter) -> str:
+        # Folded-stack text, hottest stacks first
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
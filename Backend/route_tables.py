@@ -0,0 +1,54 @@
+import numpy as np
+from departure_index import NAME_BITS
+
+class RouteTables:
+    # Static per-dataset lookups for the model inputs that do not depend on the request time:
+    # service -> origin/destination target encodings (from the route description), and the
+    # stop-name encoding of every (service, stop) entry of the departure index's stop table.
+    # Built once with the snapshot, so a request does no string splitting or encoding lookups.
+
+    def __init__(self, service_ids: np.ndarray, origin_te: np.ndarray, destination_te: np.ndarray,
+                 stop_te: np.ndarray):
+        self.service_ids = service_ids       # sorted
+        self.origin_te = origin_te           # aligned with service_ids
+        self.destination_te = destination_te # aligned with service_ids
+        self.stop_te = stop_te               # aligned with DepartureIndex.stop_keys
+
+    @classmethod
+    def build(cls, services, departures, encoder):
+        # Joining the target encodings onto every service with a usable "origin - destination"
+        # description, and onto the stop names of the departure index
+        by_id = {svc["_id"]: svc for svc in services} # the last listing wins, as in ServiceIndex
+        ids, origins, destinations = [], [], []
+        for service_id in sorted(by_id):
+            try:
+                origin, destination = [p.strip() for p in by_id[service_id]["description"].split(" - ")]
+            except (KeyError, AttributeError, ValueError):
+                continue
+            ids.append(service_id)
+            origins.append(origin)
+            destinations.append(destination)
+
+        names = np.asarray(departures.name_list, dtype=object)
+        stop_names = names[departures.stop_keys & ((1 << NAME_BITS) - 1)] if len(names) else []
+        return cls(
+            service_ids=np.asarray(ids, dtype=np.int64),
+            origin_te=encoder.transform("origin", origins),
+            destination_te=encoder.transform("destination", destinations),
+            stop_te=encoder.transform("stop_name", [name.strip() for name in stop_names]),
+        )
+
+    def to_arrays(self) -> dict:
+        return {"service_ids": self.service_ids, "origin_te": self.origin_te,
+                "destination_te": self.destination_te, "stop_te": self.stop_te}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        return cls(**{name: arrays[name] for name in ("service_ids", "origin_te", "destination_te", "stop_te")})
+
+    def service(self, service_id: int):
+        # (origin_te, destination_te) of a service, None if unknown or its description is unusable
+        pos = int(np.searchsorted(self.service_ids, service_id))
+        if pos == len(self.service_ids) or self.service_ids[pos] != service_id:
+            return None
+        return float(self.origin_te[pos]), float(self.destination_te[pos])
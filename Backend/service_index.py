@@ -0,0 +1,94 @@
+from collections import defaultdict
+import numpy as np
+
+GRAM_SIZE = 3 # longest n-gram stored; shorter queries are answered straight from the postings
+
+def ngrams(text: str, size: int = GRAM_SIZE) -> set:
+    # Getting every substring of length 1..size of the text
+    return {text[i:i + n] for n in range(1, size + 1) for i in range(len(text) - n + 1)}
+
+class ServiceIndex:
+    # Search index over the bus service catalogue, built once when services.json is loaded.
+    # Matches are case-insensitive substrings of the line number or route description,
+    # ranked: exact line number, line number prefix, line number substring, description substring.
+
+    def __init__(self, services):
+        self.services = list(services)
+        self.by_id = {svc["_id"]: svc for svc in self.services}
+
+        self.numbers = [str(svc.get("number") or "").lower() for svc in self.services]
+        self.descriptions = [str(svc.get("description") or "").lower() for svc in self.services]
+
+        # Mapping whole line numbers and their prefixes to service positions
+        exact, prefixes = defaultdict(list), defaultdict(list)
+        for pos, number in enumerate(self.numbers):
+            exact[number].append(pos)
+            for i in range(1, len(number) + 1):
+                prefixes[number[:i]].append(pos)
+        self.exact = dict(exact)
+        self.prefixes = dict(prefixes)
+
+        self.number_grams = self._build_postings(self.numbers)
+        self.description_grams = self._build_postings(self.descriptions)
+
+    @staticmethod
+    def _build_postings(texts) -> dict:
+        # Building n-gram -> sorted array of positions of the texts containing it
+        postings = defaultdict(list)
+        for pos, text in enumerate(texts):
+            for gram in ngrams(text):
+                postings[gram].append(pos)
+        return {gram: np.asarray(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+    @staticmethod
+    def _contains(postings: dict, texts, query: str):
+        # Yielding positions of texts containing the query, in catalogue order
+        if len(query) <= GRAM_SIZE:
+            yield from postings.get(query, ())
+            return
+
+        # Intersecting the trigram postings (smallest first) and verifying the survivors
+        grams = sorted((postings.get(g) for g in ngrams(query) if len(g) == GRAM_SIZE),
+                       key=lambda p: 0 if p is None else len(p))
+        if grams[0] is None:
+            return
+        candidates = grams[0]
+        for posting in grams[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(candidates) == 0:
+                return
+        for pos in candidates:
+            if query in texts[pos]:
+                yield pos
+
+    def get(self, service_id: int):
+        # Getting a service document by its ID (None if unknown)
+        return self.by_id.get(service_id)
+
+    def search(self, query: str, limit: int = None) -> list:
+        # Returning ranked services matching the query (every service for an empty query)
+        if limit is not None and limit <= 0:
+            return []
+        query = query.lower()
+        if not query:
+            return self.services[:limit]
+
+        tiers = (
+            self.exact.get(query, ()),
+            self.prefixes.get(query, ()),
+            self._contains(self.number_grams, self.numbers, query),
+            self._contains(self.description_grams, self.descriptions, query),
+        )
+
+        # Merging the tiers in rank order, stopping as soon as the limit is reached
+        seen, results = set(), []
+        for tier in tiers:
+            for pos in tier:
+                pos = int(pos)
+                if pos in seen:
+                    continue
+                if limit is not None and len(results) >= limit:
+                    return results
+                seen.add(pos)
+                results.append(self.services[pos])
+        return results
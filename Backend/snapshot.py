@@ -0,0 +1,225 @@
+import os
+import json
+import mmap
+import fcntl
+import struct
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+from blobs import load_blob_into, blob_version
+from departure_index import DepartureIndex
+from target_encoding import TargetEncoder
+from tree_runtime import TreeModel
+from route_tables import RouteTables
+from delay_profiles import build_profiles
+
+# Single-file binary snapshot of everything the server loads at startup.
+# Layout: MAGIC, a little-endian uint64 header length, a JSON header, then raw arrays each
+# starting on a 64-byte boundary. The header holds the snapshot version plus the dtype, shape
+# and offset of every array, so a reader memory-maps the file and wraps the arrays in place.
+MAGIC = b"BDPSNAP\x01"
+ALIGN = 64
+FORMAT = 7 # bumped whenever the arrays stored by write_serving_snapshot change
+
+# Inputs of the serving snapshot
+CONTAINER = "busdata"
+SERVICES_BLOB = os.environ.get("SERVICES_BLOB", "services.json")
+DEPARTURES_BLOB = os.environ.get("DEPARTURES_BLOB", "departures.json") # JSON array or NDJSON, optionally .gz
+BLOBS = (SERVICES_BLOB, DEPARTURES_BLOB)
+MODEL_PATH = "models/lgbm_model_trees.npz"
+ENCODER_PATH = "models/target_encoder.npz"
+LEGACY_ENCODINGS_PATH = "models/target_encodings.pkl"
+
+# Time resolution of the delay profiles precomputed offline by add_profiles (snapshot.py --profiles)
+PROFILE_RESOLUTION_MINS = int(os.environ.get("PROFILE_RESOLUTION_MINS", 15))
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_snapshot(path: str, version: str, arrays: dict, meta: dict = None):
+    # Writing {name: ndarray} with a version string, atomically (readers never see a partial file)
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    for name, a in arrays.items():
+        if a.dtype.hasobject:
+            raise TypeError(f"Array {name!r} has object dtype and cannot be snapshotted")
+
+    # Offsets are relative to the start of the data section, which follows the header
+    table, offset = {}, 0
+    for name, a in arrays.items():
+        offset = _aligned(offset)
+        table[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset += a.nbytes
+    header = json.dumps({"version": version, "meta": meta or {}, "arrays": table}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, a in arrays.items():
+            f.seek(data_start + table[name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+def read_header(path: str) -> dict:
+    # Reading only the JSON header (None if the file is missing or not a snapshot)
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = struct.unpack("<Q", f.read(8))
+            return json.loads(f.read(length))
+    except (OSError, ValueError, struct.error):
+        return None
+
+class Snapshot:
+    # Read-only, memory-mapped view of a snapshot file. Arrays are backed by the page cache,
+    # so processes mapping the same file share its pages.
+
+    def __init__(self, path: str):
+        self.path = path
+        header = read_header(path)
+        if header is None:
+            raise ValueError(f"{path} is not a snapshot file")
+        self.version = header["version"]
+        self.meta = header["meta"]
+        self.table = header["arrays"]
+
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (length,) = struct.unpack_from("<Q", self.buffer, len(MAGIC))
+        self.data_start = _aligned(len(MAGIC) + 8 + length)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.table
+
+    def array(self, name: str) -> np.ndarray:
+        entry = self.table[name]
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        a = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.data_start + entry["offset"])
+        return a.reshape(entry["shape"])
+
+    def arrays(self, prefix: str) -> dict:
+        # All arrays stored under "<prefix>/", keyed without the prefix
+        start = f"{prefix}/"
+        return {name[len(start):]: self.array(name) for name in self.table if name.startswith(start)}
+
+def prefixed(prefix: str, arrays: dict) -> dict:
+    return {f"{prefix}/{name}": a for name, a in arrays.items()}
+
+def json_array(value) -> np.ndarray:
+    # Storing a small JSON-serialisable value as a byte array
+    return np.frombuffer(json.dumps(value).encode(), dtype=np.uint8)
+
+def load_json_array(a: np.ndarray):
+    return json.loads(a.tobytes())
+
+def local_inputs_version() -> str:
+    # Identifying the snapshot layout settings and the local model files (by content hash)
+    parts = [f"format={FORMAT}"]
+    for path in (MODEL_PATH, ENCODER_PATH, LEGACY_ENCODINGS_PATH):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                parts.append(f"{path}={hashlib.sha1(f.read()).hexdigest()}")
+    return "\n".join(parts)
+
+def source_version() -> str:
+    # Identifying the snapshot inputs: blob ETags plus the local inputs
+    parts = [f"{blob}={blob_version(CONTAINER, blob)}" for blob in BLOBS]
+    return hashlib.sha1("\n".join([local_inputs_version(), *parts]).encode()).hexdigest()
+
+def load_encoder() -> TargetEncoder:
+    # Running target-encoding statistics, falling back to the legacy mean-only encodings
+    if os.path.exists(ENCODER_PATH):
+        return TargetEncoder.load(ENCODER_PATH)
+    return TargetEncoder.from_means(joblib.load(LEGACY_ENCODINGS_PATH))
+
+def write_serving_snapshot(path: str, version: str, services: list, departures: DepartureIndex,
+                           source: str = "blob"):
+    # Writing one snapshot with the services, the departure index, the model trees and the route tables
+    # (with the target encodings pre-joined); delay profiles are added offline by add_profiles
+    with np.load(MODEL_PATH, allow_pickle=False) as data:
+        model = {name: data[name] for name in data.files}
+    routes = RouteTables.build(services, departures, load_encoder())
+
+    arrays = {
+        "services": json_array(services),
+        **prefixed("departures", departures.to_arrays()),
+        **prefixed("model", model),
+        **prefixed("routes", routes.to_arrays()),
+    }
+    meta = {"created": datetime.now(timezone.utc).isoformat(), "source": source, "services": len(services),
+            "stop_events": len(departures)}
+    write_snapshot(path, version, arrays, meta)
+
+def source_of(header: dict) -> str:
+    # The input version a snapshot was built from (a profiled snapshot has its own version)
+    return header["meta"].get("source_version", header["version"])
+
+def add_profiles(path: str, resolution: int = PROFILE_RESOLUTION_MINS) -> str:
+    # Offline step: precomputing the delay profiles of a snapshot (see delay_profiles.py) and
+    # rewriting it with them under a new version, so running servers swap to it. The snapshot still
+    # counts as built from the same inputs; a server that rebuilds it because its inputs changed
+    # drops the profiles until this runs again.
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshot = Snapshot(path)
+        arrays = {name: snapshot.array(name) for name in snapshot.table if not name.startswith("profiles/")}
+        profiles = build_profiles(DepartureIndex.from_arrays(snapshot.arrays("departures")),
+                                  RouteTables.from_arrays(snapshot.arrays("routes")),
+                                  TreeModel(snapshot.arrays("model")), resolution)
+        arrays.update(prefixed("profiles", profiles))
+        source = source_of({"version": snapshot.version, "meta": snapshot.meta})
+        version = hashlib.sha1(f"{source}\nprofiles={resolution}".encode()).hexdigest()
+        write_snapshot(path, version, arrays, {**snapshot.meta, "source_version": source, "profiles": resolution})
+    return version
+
+def build_serving_snapshot(path: str, version: str):
+    # Streaming the services and departures from blob into their indexes
+    services = load_blob_into(CONTAINER, SERVICES_BLOB, list)
+    departures = load_blob_into(CONTAINER, DEPARTURES_BLOB, DepartureIndex)
+    write_serving_snapshot(path, version, services, departures)
+
+def open_serving_snapshot(path: str, rebuild: bool = True) -> Snapshot:
+    # Memory-mapping the local snapshot, rebuilding it first if its inputs have changed.
+    # A lock file makes concurrent workers wait for one rebuild instead of each doing their own.
+    # With rebuild=False the snapshot is served as published (e.g. by compact_events.py).
+    if not rebuild:
+        return Snapshot(path)
+    try:
+        version = source_version()
+    except Exception as e:
+        if read_header(path) is None:
+            raise
+        print(f"Could not check snapshot inputs ({e!r}); using the local snapshot as is")
+        return Snapshot(path)
+
+    header = read_header(path)
+    if header is None or source_of(header) != version:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            header = read_header(path)
+            if header is None or source_of(header) != version:
+                print(f"Building snapshot {path} (version {version[:12]})")
+                build_serving_snapshot(path, version)
+    return Snapshot(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the serving snapshot from Azure Blob and the local model files")
+    parser.add_argument("--output", default=os.environ.get("SNAPSHOT_PATH", "snapshot/serving.snap"))
+    parser.add_argument("--profiles", action="store_true",
+                        help="also precompute the delay profiles (slow; keeps an up-to-date snapshot instead of rebuilding it)")
+    args = parser.parse_args()
+
+    version = source_version()
+    header = read_header(args.output)
+    if not args.profiles or header is None or source_of(header) != version:
+        build_serving_snapshot(args.output, version)
+    if args.profiles:
+        print(f"Added delay profiles, version {add_profiles(args.output)[:12]}")
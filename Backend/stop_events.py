@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import holidays
+from datetime import datetime
+
+# Batch transform of bustimes.org journey details into stop events. A whole batch of journeys is
+# flattened into columns in one pass; time parsing, the UTC -> Europe/London conversion of
+# actual departures and the delay/peak/holiday flags are then computed on arrays, not per stop.
+TIMEZONE = "Europe/London"
+NAT_SECONDS = np.datetime64("NaT").astype(np.int64)
+TIME_STRINGS = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)], dtype=object)
+
+uk_holidays = holidays.UK(subdiv="ENG")
+
+def parse_hhmm(values: list) -> np.ndarray:
+    # Minutes since midnight of "HH:MM" (or "H:MM") strings, -1 where a value is not a valid time
+    padded = [v if isinstance(v, str) and len(v) == 5 else
+              "0" + v if isinstance(v, str) and len(v) == 4 else "--:--" for v in values]
+    chars = np.frombuffer("".join(padded).encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 5)
+    digits = chars[:, [0, 1, 3, 4]].astype(np.int32) - ord("0")
+    hours, mins = digits[:, 0] * 10 + digits[:, 1], digits[:, 2] * 10 + digits[:, 3]
+    valid = (chars[:, 2] == ord(":")) & ((digits >= 0) & (digits <= 9)).all(axis=1) & (hours < 24) & (mins < 60)
+    return np.where(valid, hours * 60 + mins, -1)
+
+def utc_offsets(seconds: np.ndarray) -> np.ndarray:
+    # Europe/London UTC offsets (in seconds) at UTC epoch seconds. Offsets only change on the hour,
+    # so the timezone conversion runs once per distinct hour in the batch.
+    hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    utc = pd.DatetimeIndex((hours * 3600).astype("datetime64[s]")).tz_localize("UTC")
+    local = utc.tz_convert(TIMEZONE).tz_localize(None)
+    return (local.values - utc.tz_localize(None).values).astype("timedelta64[s]").astype(np.int64)[inverse]
+
+def utc_seconds(timestamps: list) -> np.ndarray:
+    # UTC epoch seconds of ISO 8601 timestamps, NaT_SECONDS where missing or invalid.
+    # Plain UTC "YYYY-MM-DDTHH:MM:SSZ" strings, as bustimes.org sends, are parsed by numpy; anything
+    # else (other offsets, fractional seconds) goes through pandas.
+    try:
+        if not all(isinstance(t, str) and len(t) == 20 and t[-1] == "Z" for t in timestamps):
+            raise ValueError("not plain UTC timestamps")
+        parsed = np.array([t[:19] for t in timestamps], dtype="datetime64[s]")
+    except ValueError:
+        parsed = pd.to_datetime(pd.Series(timestamps, dtype=object), utc=True, format="ISO8601",
+                                errors="coerce").dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    return parsed.astype(np.int64)
+
+def peak_flags(mins: np.ndarray, weekday: np.ndarray) -> np.ndarray:
+    # Peak hours (7-9am & 3-6pm on weekdays)
+    return (weekday < 5) & (((420 <= mins) & (mins < 540)) | ((900 <= mins) & (mins < 1080)))
+
+class StopEvents:
+    # Columnar batch of stop events: one array (or list, for strings) per stop event field
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["service_id"])
+
+    def take(self, index) -> "StopEvents":
+        # Selecting rows by a boolean mask or integer positions
+        index = np.asarray(index)
+        positions = np.flatnonzero(index) if index.dtype == bool else index
+        return StopEvents({name: col[positions] if isinstance(col, np.ndarray) else [col[i] for i in positions]
+                           for name, col in self.columns.items()})
+
+    def documents(self) -> list:
+        # Stop event documents in the stored layout (as previously built per stop by load_journeys)
+        c = self.columns
+        sched, actual = c["scheduled_mins"], c["actual_mins"]
+        rows = zip(c["service_id"].tolist(), c["journey_id"].tolist(), c["stop_index"].tolist(), c["stop_name"],
+                   c["stop_id"], c["date"], c["origin"], c["destination"], TIME_STRINGS[sched].tolist(),
+                   sched.tolist(), TIME_STRINGS[actual].tolist(), actual.tolist(), c["delay_mins"].tolist(),
+                   c["day_of_week"].tolist(), c["is_peak"].tolist(), c["is_holiday"].tolist())
+        return [{
+            "_id":            f"{svc_id}_{stop_id}",
+            "service_id":     svc_id,
+            "journey_id":     jid,
+            "stop_index":     index,
+            "stop_name":      name,
+            "stop_id":        stop_id,
+            "date":           day,
+            "origin":         origin,
+            "destination":    destination,
+            "scheduled_dep":  sched_dep,
+            "scheduled_mins": sched_mins,
+            "actual_dep":     actual_dep,
+            "actual_mins":    actual_mins,
+            "delay_mins":     delay,
+            "day_of_week":    weekday,
+            "is_peak":        peak,
+            "is_holiday":     holiday,
+        } for (svc_id, jid, index, name, stop_id, day, origin, destination, sched_dep, sched_mins, actual_dep,
+               actual_mins, delay, weekday, peak, holiday) in rows]
+
+def transform_journeys(journeys) -> StopEvents:
+    # Turning a batch of (svc_id, jid, detail) journey details into stop events. Stops without both
+    # an aimed and an actual departure time (or with unparseable ones) are left out.
+    svc_ids, jids, journey_times, origins, destinations, counts, stops = [], [], [], [], [], [], []
+    for svc_id, jid, detail in journeys:
+        journey_stops = detail.get("stops", [])
+        if not journey_stops:
+            continue
+        svc_ids.append(svc_id)
+        jids.append(jid)
+        journey_times.append(detail["datetime"])
+        origins.append(journey_stops[0].get("name"))
+        destinations.append(journey_stops[-1].get("name"))
+        counts.append(len(journey_stops))
+        stops.extend(journey_stops)
+    aimed = [stop.get("aimed_departure_time") for stop in stops]
+    actual = [stop.get("actual_departure_time") for stop in stops]
+
+    # Journey dates in local time, with their weekday and holiday status
+    starts = np.array([datetime.fromisoformat(t).timestamp() for t in journey_times], dtype=np.int64)
+    days = ((starts + utc_offsets(starts)) // 86400).astype("datetime64[D]")
+    dates = np.datetime_as_string(days).tolist()
+    weekday = ((days.astype(np.int64) + 3) % 7).astype(np.int8) # 1970-01-01 was a Thursday
+    holiday = np.array([d in uk_holidays for d in days.tolist()], dtype=bool)
+
+    # Scheduled times are local "HH:MM"; actual times are UTC timestamps converted to local minutes
+    counts = np.asarray(counts, dtype=np.int64)
+    journey_of = np.repeat(np.arange(len(counts)), counts)
+    stop_index = np.arange(len(stops)) - np.repeat(np.cumsum(counts) - counts, counts)
+    sched = parse_hhmm(aimed)
+    actual_secs = utc_seconds(actual)
+    keep = np.flatnonzero((sched >= 0) & (actual_secs != NAT_SECONDS))
+    actual_secs = actual_secs[keep]
+
+    journey_of, sched = journey_of[keep], sched[keep].astype(np.int16)
+    actual_mins = ((actual_secs + utc_offsets(actual_secs)) // 60 % 1440).astype(np.int16)
+    day = weekday[journey_of]
+    return StopEvents({
+        "service_id":     np.asarray(svc_ids, dtype=np.int64)[journey_of],
+        "journey_id":     np.asarray(jids, dtype=np.int64)[journey_of],
+        "stop_index":     stop_index[keep].astype(np.int16),
+        "stop_name":      [stops[i]["name"] for i in keep.tolist()],
+        "stop_id":        [stops[i]["id"] for i in keep.tolist()],
+        "date":           [dates[j] for j in journey_of.tolist()],
+        "origin":         [origins[j] for j in journey_of.tolist()],
+        "destination":    [destinations[j] for j in journey_of.tolist()],
+        "scheduled_mins": sched,
+        "actual_mins":    actual_mins,
+        "delay_mins":     actual_mins - sched,
+        "day_of_week":    day,
+        "is_peak":        peak_flags(sched, day),
+        "is_holiday":     holiday[journey_of],
+    })
@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import pandas as pd
+
+ENCODED_COLUMNS = ["origin", "destination", "stop_name"]
+
+class TargetEncoder:
+    # Mean-delay target encoding kept as running sums and counts per category.
+    # Each column has a vocabulary (value -> integer code) and parallel sum/count arrays, so
+    # new stop events can be folded in at any time and a lookup is one dict hit plus an array
+    # index. Categories never seen (or with no events) encode to `default`, as serving always did.
+
+    def __init__(self, columns=ENCODED_COLUMNS, default: float = 0.0):
+        self.columns = list(columns)
+        self.default = default
+        self.vocab = {col: {} for col in self.columns}
+        self.sums = {col: np.zeros(0, dtype=np.float64) for col in self.columns}
+        self.counts = {col: np.zeros(0, dtype=np.int64) for col in self.columns}
+        self._means = {}
+
+    def codes(self, col: str, values, add: bool = False) -> np.ndarray:
+        # Mapping values to integer codes (-1 for unknown values unless add=True)
+        vocab = self.vocab[col]
+        if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+            # Translating each category once, then remapping the categorical codes
+            categories = self.codes(col, list(values.cat.categories), add)
+            cat_codes = values.cat.codes.to_numpy()
+            return np.where(cat_codes >= 0, categories[cat_codes], -1) if len(categories) else \
+                np.full(len(cat_codes), -1, dtype=np.int64)
+
+        if add:
+            return np.fromiter((-1 if v is None else vocab.setdefault(v, len(vocab)) for v in values),
+                               dtype=np.int64)
+        return np.fromiter((vocab.get(v, -1) for v in values), dtype=np.int64)
+
+    def update(self, frame, target: str = "delay_mins"):
+        # Folding new events into the running statistics (frame: DataFrame or dict of columns)
+        y = np.asarray(frame[target], dtype=np.float64)
+        for col in self.columns:
+            codes = self.codes(col, frame[col], add=True)
+            size = len(self.vocab[col])
+            known = codes >= 0
+            sums = np.bincount(codes[known], weights=y[known], minlength=size)
+            counts = np.bincount(codes[known], minlength=size)
+            self.sums[col] = np.pad(self.sums[col], (0, size - len(self.sums[col]))) + sums
+            self.counts[col] = np.pad(self.counts[col], (0, size - len(self.counts[col]))) + counts
+        self._means.clear()
+        return self
+
+    def means(self, col: str) -> np.ndarray:
+        # Mean per code with the default appended, so code -1 indexes the default
+        if col not in self._means:
+            counts = self.counts[col]
+            means = np.full(len(counts) + 1, self.default, dtype=np.float64)
+            seen = counts > 0
+            means[:-1][seen] = self.sums[col][seen] / counts[seen]
+            self._means[col] = means
+        return self._means[col]
+
+    def encode_codes(self, col: str, codes) -> np.ndarray:
+        # O(1) per row lookup for already integer-coded values
+        return self.means(col)[np.asarray(codes)]
+
+    def transform(self, col: str, values) -> np.ndarray:
+        return self.encode_codes(col, self.codes(col, values))
+
+    def transform_oof(self, frame, target: str = "delay_mins", folds: int = 5, seed: int = 42) -> dict:
+        # Out-of-fold encodings for training: each row is encoded from the other folds only, so a
+        # row's own delay never leaks into its features. Uses this encoder's vocabulary but not
+        # its running statistics. Returns {col: encoded array}.
+        y = np.asarray(frame[target], dtype=np.float64)
+        fold = np.random.default_rng(seed).integers(0, folds, len(y))
+        encoded = {}
+        for col in self.columns:
+            codes = self.codes(col, frame[col], add=True)
+            size = len(self.vocab[col]) + 1
+            codes = np.where(codes >= 0, codes, size - 1) # missing values share the last slot
+
+            # Per-(fold, category) sums and counts, and their totals over all folds
+            slot = fold * size + codes
+            fold_sums = np.bincount(slot, weights=y, minlength=folds * size).reshape(folds, size)
+            fold_counts = np.bincount(slot, minlength=folds * size).reshape(folds, size)
+            other_sums = fold_sums.sum(axis=0)[codes] - fold_sums[fold, codes]
+            other_counts = fold_counts.sum(axis=0)[codes] - fold_counts[fold, codes]
+
+            out = np.full(len(y), self.default, dtype=np.float64)
+            seen = (other_counts > 0) & (codes != size - 1)
+            out[seen] = other_sums[seen] / other_counts[seen]
+            encoded[col] = out
+        return encoded
+
+    @classmethod
+    def from_means(cls, target_maps: dict, default: float = 0.0):
+        # Wrapping a legacy {column: {value: mean}} encoding (one pseudo-event per category)
+        encoder = cls(list(target_maps), default)
+        for col, mapping in target_maps.items():
+            encoder.vocab[col] = {value: code for code, value in enumerate(mapping)}
+            encoder.sums[col] = np.fromiter(mapping.values(), dtype=np.float64, count=len(mapping))
+            encoder.counts[col] = np.ones(len(mapping), dtype=np.int64)
+        return encoder
+
+    def to_arrays(self) -> dict:
+        arrays = {"columns": np.asarray(self.columns), "default": np.float64(self.default)}
+        for col in self.columns:
+            arrays[f"{col}_values"] = np.asarray(list(self.vocab[col]), dtype=str)
+            arrays[f"{col}_sums"] = self.sums[col]
+            arrays[f"{col}_counts"] = self.counts[col]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        encoder = cls([str(c) for c in arrays["columns"]], float(arrays["default"]))
+        for col in encoder.columns:
+            encoder.vocab[col] = {v: code for code, v in enumerate(arrays[f"{col}_values"].tolist())}
+            encoder.sums[col] = arrays[f"{col}_sums"]
+            encoder.counts[col] = arrays[f"{col}_counts"]
+        return encoder
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **self.to_arrays())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays({name: data[name] for name in data.files})
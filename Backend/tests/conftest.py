@@ -0,0 +1,4 @@
+import os, sys
+
+# The backend modules are imported as top-level modules, as the scripts and benchmarks do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
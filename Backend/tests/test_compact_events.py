@@ -0,0 +1,144 @@
+import os
+import re
+import numpy as np
+import pytest
+from compact_events import (NameDictionary, CompactEvents, compact_journeys, iter_stop_events, export_snapshot,
+                            stop_event_collections, DOCUMENTS_COL, COMPACT_JOURNEYS_COL, NAMES_COL)
+from departure_index import DepartureIndex
+from snapshot import Snapshot
+from partitions import group_by_date, partition_name
+from stop_events import transform_journeys
+from training_data import stream_columns
+
+class FakeCollection:
+    # The parts of a pymongo collection the loaders and exporters use, over a list of documents
+
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = []
+
+    def find(self, query=None, projection=None, batch_size=None, sort=None):
+        docs = [doc for doc in self.docs if all(doc.get(k) == v for k, v in (query or {}).items())]
+        for field, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        keep = None if projection is None else {k for k, v in projection.items() if v}
+        return iter([doc if keep is None else {k: v for k, v in doc.items() if k in keep} for doc in docs])
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(doc) for doc in docs)
+
+    def estimated_document_count(self) -> int:
+        return len(self.docs)
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection(name)
+        return collection
+
+    def list_collection_names(self, filter=None):
+        pattern = re.compile(filter["name"]["$regex"]) if filter else None
+        return [name for name in self if pattern is None or pattern.search(name)]
+
+def stop_events() -> list:
+    # Stop event documents of a few journeys on two service dates, as load_journeys builds them
+    journeys = []
+    for n, (start, svc_id) in enumerate([("2025-04-17T07:10:00Z", 20001), ("2025-04-17T16:05:00Z", 20002),
+                                         ("2025-04-18T09:40:00Z", 20001), ("2025-04-18T22:50:00Z", 20002)]):
+        hh, mm = int(start[11:13]) + 1, int(start[14:16])
+        stops = []
+        for i in range(4):
+            at = hh * 60 + mm + 7 * i
+            stops.append({"name": ["Piccadilly Gardens", "Market Street", "Oxford Road", "Airport"][i], "id": 100 + i,
+                          "aimed_departure_time": f"{at // 60 % 24:02d}:{at % 60:02d}",
+                          "actual_departure_time": f"{start[:11]}{(at + n - 60) // 60 % 24:02d}:{(at + n) % 60:02d}:00Z"})
+        journeys.append((svc_id, 500 + n, {"datetime": start, "stops": stops}))
+    return transform_journeys(journeys).documents()
+
+def store(db, docs: list, layout: str, days=None):
+    # Writing stop events into date partitions of one layout, as load_journeys does (returns db)
+    names = NameDictionary(db[NAMES_COL]) if layout == "compact" else None
+    for day, positions in group_by_date(docs).items():
+        if days is not None and day not in days:
+            continue
+        batch = [docs[i] for i in positions]
+        if layout == "compact":
+            journeys = compact_journeys(batch, names)
+            names.flush()
+            db[partition_name(COMPACT_JOURNEYS_COL, day)].insert_many(journeys)
+        else:
+            db[partition_name(DOCUMENTS_COL, day)].insert_many(batch)
+    return db
+
+def frame(db):
+    df = stream_columns([col for _, col in stop_event_collections(db)])
+    return df.astype({col: object for col in df.columns if df[col].dtype == "category"})
+
+def test_training_frame_is_the_same_from_either_layout():
+    docs = stop_events()
+    documents = store(FakeDatabase(), docs, "documents")
+    compact = store(FakeDatabase(), docs, "compact")
+    assert len(frame(documents)) == len(docs)
+    assert frame(compact).equals(frame(documents))
+
+def test_dates_are_read_from_whichever_layout_holds_them():
+    docs = stop_events()
+    db = FakeDatabase()
+    store(db, docs, "documents", days={"2025-04-17"})
+    store(db, docs, "compact", days={"2025-04-18"})
+    collections = stop_event_collections(db)
+    assert [str(day) for day, _ in collections] == ["2025-04-17", "2025-04-18"]
+    assert isinstance(collections[1][1], CompactEvents)
+    assert frame(db).equals(frame(store(FakeDatabase(), docs, "documents")))
+
+def test_a_date_stored_in_both_layouts_is_an_error():
+    docs = stop_events()
+    db = FakeDatabase()
+    store(db, docs, "documents")
+    store(db, docs, "compact", days={"2025-04-18"})
+    with pytest.raises(ValueError, match="2025-04-18"):
+        stop_event_collections(db)
+
+def test_name_dictionary_codes_persist():
+    db = FakeDatabase()
+    names = NameDictionary(db[NAMES_COL])
+    assert [names.code(n) for n in ["Airport", "Oxford Road", "Airport"]] == [0, 1, 0]
+    assert db[NAMES_COL].docs == []  # nothing written before flush
+    names.flush()
+    reloaded = NameDictionary(db[NAMES_COL])
+    assert reloaded.names == ["Airport", "Oxford Road"]
+    assert reloaded.code("Oxford Road") == 1 and reloaded.code("Market Street") == 2
+
+def test_name_dictionary_rejects_a_gap():
+    db = FakeDatabase()
+    db[NAMES_COL].insert_many([{"_id": 0, "name": "Airport"}, {"_id": 2, "name": "Oxford Road"}])
+    with pytest.raises(ValueError, match="gap at code 1"):
+        NameDictionary(db[NAMES_COL])
+
+def test_compact_journeys_round_trip_to_the_same_documents():
+    docs = stop_events()
+    names = NameDictionary()
+    journeys = compact_journeys(docs, names)
+    assert len(journeys) == 4 and sum(j["count"] for j in journeys) == len(docs)
+    assert list(iter_stop_events(journeys, names.names)) == docs
+
+def test_exported_index_matches_the_document_path(tmp_path, monkeypatch):
+    # The exporter reads the local model files relative to the backend directory
+    monkeypatch.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    docs = stop_events()
+    services = [{"_id": 20001, "description": "Piccadilly Gardens - Airport"},
+                {"_id": 20002, "description": "Piccadilly Gardens - Airport"}]
+    versions, snapshots = {}, {}
+    for layout in ("documents", "compact"):
+        db = store(FakeDatabase(), docs, layout)
+        db["servicesBN"].insert_many(services)
+        path = str(tmp_path / f"{layout}.snap")
+        versions[layout] = export_snapshot(db, path)
+        snapshots[layout] = Snapshot(path)
+
+    expected = DepartureIndex(docs).to_arrays()
+    for layout, snapshot in snapshots.items():
+        exported = snapshot.arrays("departures")
+        assert sorted(exported) == sorted(expected)
+        for name, array in expected.items():
+            assert np.array_equal(exported[name], array), (layout, name)
+    assert versions["documents"] == versions["compact"]
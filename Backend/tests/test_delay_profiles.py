@@ -0,0 +1,78 @@
+import numpy as np
+from departure_index import DepartureIndex, HOLIDAY_BIT, PEAK_BIT
+from delay_profiles import DelayProfiles, build_profiles, is_peak, NO_DELAY
+from features import build_matrix
+
+SERVICE, STOP, DESTINATION = 20001, "Market Street", "Piccadilly Gardens"
+
+class FakeRoutes:
+    # Route endpoint and stop-name encodings of the one service
+    stop_te = np.array([1.25])
+
+    def service(self, service_id):
+        return (0.5, -0.75) if service_id == SERVICE else None
+
+class TimeModel:
+    # A delay that differs between journeys a few minutes apart, plus weekday and holiday terms
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+
+    def predict(self, X):
+        mins = np.round(np.arctan2(X[:, 0], X[:, 1]) * 1440 / (2 * np.pi)) % 1440
+        return self.scale * (mins % 37 + X[:, 2] + 3 * X[:, 3] + 0.5)
+
+def departures():
+    # Journeys at 10:00 and 10:14 share a 15-minute bucket, whose midpoint (10:07) is closest to 10:00
+    records = []
+    for n, (mins, day, holiday) in enumerate([(600, 0, False), (614, 0, False), (640, 2, False), (455, 1, False),
+                                              (614, 4, True), (700, 5, False), (1439, 6, False), (5, 3, False)]):
+        records.append({"service_id": SERVICE, "stop_name": STOP, "destination": DESTINATION, "stop_index": 0,
+                        "scheduled_mins": mins, "actual_mins": mins + 2, "delay_mins": 2, "journey_id": n,
+                        "scheduled_dep": f"{mins // 60:02d}:{mins % 60:02d}", "day_of_week": day,
+                        "is_holiday": holiday, "is_peak": bool(is_peak(mins, day))})
+    return DepartureIndex(records)
+
+def live(index, model, mins: int, weekday: int, holiday: bool):
+    # (closest scheduled_mins, prediction) as /predict_delay evaluates it without profiles
+    expected = (HOLIDAY_BIT if holiday else 0) | (PEAK_BIT if is_peak(mins, weekday) else 0)
+    found = index.find(SERVICE, STOP, DESTINATION, mins - 30, mins + 30, HOLIDAY_BIT | PEAK_BIT, expected)
+    if len(found) == 0:
+        return None
+    sched = int(index.scheduled_mins[index.closest(found, mins)])
+    item = {"scheduled_mins": sched, "day_of_week": weekday, "is_holiday": holiday, "service_id": SERVICE,
+            "stop_index": 0, "origin_te": 0.5, "destination_te": -0.75, "stop_name_te": 1.25}
+    return sched, int(model.predict(build_matrix([item]))[0])
+
+def test_journey_table_matches_live_evaluation_at_every_minute():
+    index, model = departures(), TimeModel()
+    profiles = DelayProfiles(build_profiles(index, FakeRoutes(), model, log=None))
+    pos = index.key_position(SERVICE, STOP, DESTINATION)
+    checked = 0
+    for holiday in (False, True):
+        for weekday in range(7):
+            for mins in range(1440):
+                expected = live(index, model, mins, weekday, holiday)
+                if expected is None:
+                    continue
+                sched, prediction = expected
+                assert profiles.journey_prediction(pos, sched, holiday, weekday) == prediction
+                checked += 1
+    assert checked > 0
+
+def test_bucket_grid_is_not_used_for_requests():
+    # 10:13 matches the 10:14 journey live, while its bucket's answer is the 10:00 journey's
+    index, model = departures(), TimeModel()
+    profiles = DelayProfiles(build_profiles(index, FakeRoutes(), model, log=None))
+    pos = index.key_position(SERVICE, STOP, DESTINATION)
+    sched, prediction = live(index, model, 613, 0, False)
+    assert sched == 614
+    assert profiles.day(pos, False, 0)["predicted"][613 // 15] != prediction
+    assert profiles.journey_prediction(pos, sched, False, 0) == prediction
+
+def test_journeys_without_a_precomputed_answer_fall_back():
+    index = departures()
+    profiles = DelayProfiles(build_profiles(index, FakeRoutes(), TimeModel(scale=10.0), log=None))
+    pos = index.key_position(SERVICE, STOP, DESTINATION)
+    assert profiles.journey_prediction(pos, 601, False, 0) is None  # no journey at 10:01
+    assert profiles.journey_prediction(pos, 614, False, 0) is None  # 10 x 22.5 does not fit int8
+    assert int(profiles.journey_predicted.min()) == NO_DELAY
@@ -0,0 +1,136 @@
+import time
+import asyncio
+import threading
+from datetime import date, datetime, timedelta
+import httpx
+from ingest import JourneyIngester, TokenBucket
+from checkpoints import CheckpointStore
+from stop_events import transform_journeys
+
+BASE_URL = "https://bustimes.test"
+RETRY_AFTER = 0.15
+
+class FakeUpstream:
+    # bustimes.org journey listing and detail endpoints for a few services. The first request for
+    # every fourth journey and for each service's first listing page is answered 429 + Retry-After.
+
+    def __init__(self, services: int = 3, journeys: int = 8, stops: int = 4, page_size: int = 5):
+        self.page_size = page_size
+        self.journeys, self.details = {}, {}
+        start = datetime(2025, 4, 18, 21, 0)
+        for s in range(services):
+            service_id = 20001 + s
+            summaries = []
+            for j in range(journeys):
+                jid = service_id * 100 + j
+                at = start - timedelta(minutes=47 * j)
+                summaries.append({"id": jid, "datetime": at.isoformat() + "+01:00"})
+                self.details[jid] = {"id": jid, "datetime": at.isoformat() + "+01:00", "stops": [
+                    {"id": jid * 10 + i, "name": f"Stop {i}",
+                     "aimed_departure_time": (at + timedelta(minutes=5 * i)).strftime("%H:%M"),
+                     "actual_departure_time": (at + timedelta(minutes=5 * i + 1, hours=-1)).strftime("%Y-%m-%dT%H:%M:%SZ")}
+                    for i in range(stops)]}
+            self.journeys[service_id] = summaries
+        self.log = []         # (arrival time, url, status)
+        self.throttled = set()
+
+    def throttle(self, url: str) -> bool:
+        if url.endswith(".json"):
+            first = int(url.rsplit("/", 1)[1][:-5]) % 4 == 0
+        else:
+            first = "page=" not in url
+        if first and url not in self.throttled:
+            self.throttled.add(url)
+            return True
+        return False
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if self.throttle(url):
+            self.log.append((time.monotonic(), url, 429))
+            return httpx.Response(429, headers={"Retry-After": str(RETRY_AFTER)}, json={"detail": "Throttled."})
+        self.log.append((time.monotonic(), url, 200))
+        if request.url.path == "/api/vehiclejourneys/":
+            items = self.journeys[int(request.url.params["service"])]
+            page = int(request.url.params.get("page", 1))
+            start = (page - 1) * self.page_size
+            more = start + self.page_size < len(items)
+            return httpx.Response(200, json={
+                "next": str(request.url.copy_merge_params({"page": page + 1})) if more else None,
+                "results": items[start:start + self.page_size]})
+        jid = int(request.url.path.rsplit("/", 1)[1][:-5])
+        return httpx.Response(200, json=self.details[jid])
+
+def ingest(upstream: FakeUpstream, rate: float, burst: int, checkpoints=None):
+    stored = []
+
+    def write(events):
+        stored.extend(doc["_id"] for doc in events.documents())
+        return len(events)
+
+    ingester = JourneyIngester(transform_journeys, write, base_url=BASE_URL, rate=rate, burst=burst,
+                               max_in_flight=4, batch_size=10, page_size=upstream.page_size,
+                               checkpoints=checkpoints, transport=httpx.MockTransport(upstream.handler))
+    stats = asyncio.run(ingester.run(list(upstream.journeys), date(2025, 4, 17), date(2025, 4, 19)))
+    return stored, stats
+
+def test_every_stop_event_is_stored_exactly_once():
+    upstream = FakeUpstream()
+    stored, stats = ingest(upstream, rate=100, burst=5)
+    expected = {stop["id"] for detail in upstream.details.values() for stop in detail["stops"]}
+    assert len(stored) == len(set(stored)) == len(expected)
+    assert stats.throttled == len(upstream.throttled) > 0 and stats.failed == 0
+
+def test_retry_after_is_honoured():
+    upstream = FakeUpstream()
+    ingest(upstream, rate=100, burst=5)
+    for at, url, status in upstream.log:
+        if status != 429:
+            continue
+        retried = [t for t, u, s in upstream.log if u == url and t > at]
+        assert retried and retried[0] - at >= RETRY_AFTER * 0.95, url
+        # Requests acquired before the 429 may still arrive; nothing new starts during the pause
+        during = [t for t, _, _ in upstream.log if at < t < at + RETRY_AFTER * 0.95]
+        assert len(during) <= 4 + 2 # max_in_flight fetchers + list_concurrency listers
+
+def test_token_bucket_caps_the_request_rate():
+    upstream = FakeUpstream()
+    rate, burst = 40.0, 3
+    ingest(upstream, rate=rate, burst=burst)
+    times = sorted(t for t, _, _ in upstream.log)
+    for i in range(len(times)):
+        for j in range(i + 1, len(times)):
+            # One request of slack for the gap between taking a token and reaching the server
+            assert j - i + 1 <= burst + rate * (times[j] - times[i]) + 1
+
+def test_token_bucket_pause_holds_back_acquirers():
+    async def run():
+        bucket = TokenBucket(rate=1000, burst=1)
+        await bucket.acquire()
+        bucket.pause(0.1)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.095
+
+class ThreadRecordingStore(CheckpointStore):
+    # Checkpoint store noting which threads its file was written from
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.save_threads = set()
+
+    def save(self):
+        self.save_threads.add(threading.get_ident())
+        super().save()
+
+def test_checkpoints_are_written_off_the_event_loop_and_resume(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    checkpoints = ThreadRecordingStore(path)
+    stored, _ = ingest(FakeUpstream(), rate=100, burst=5, checkpoints=checkpoints)
+    assert checkpoints.save_threads and threading.get_ident() not in checkpoints.save_threads
+    assert all(CheckpointStore(path).since(svc_id) is not None for svc_id in FakeUpstream().journeys)
+
+    # A resumed run finds every journey already stored
+    resumed, stats = ingest(FakeUpstream(), rate=100, burst=5, checkpoints=CheckpointStore(path))
+    assert resumed == [] and stats.journeys == 0 and len(stored) == len(set(stored))
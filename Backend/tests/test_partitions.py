@@ -0,0 +1,49 @@
+import re
+from datetime import date
+from partitions import partition_name, partition_date, list_partitions, purge
+
+class FakeDatabase(dict):
+    # Collection name -> documents, with the two database calls partitions.py makes
+
+    def list_collection_names(self, filter=None):
+        pattern = re.compile(filter["name"]["$regex"]) if filter else None
+        return [name for name in self if pattern is None or pattern.search(name)]
+
+    def drop_collection(self, name):
+        self.pop(name, None)
+
+def database(*days, base="journeysBN"):
+    db = FakeDatabase({partition_name(base, day): [] for day in days})
+    db[base] = []                         # unpartitioned collection
+    db[f"{base}Compact_20250101"] = []    # another base sharing the prefix
+    return db
+
+def test_partition_names_round_trip():
+    assert partition_name("journeysBN", "2025-04-17") == "journeysBN_20250417"
+    assert partition_date("journeysBN", "journeysBN_20250417") == date(2025, 4, 17)
+    assert partition_date("journeysBN", "journeysBNCompact_20250417") is None
+    assert partition_date("journeysBN", "journeysBN_20250231") is None
+
+def test_list_partitions_is_inclusive_and_sorted():
+    db = database("2025-04-18", "2025-04-16", "2025-04-17", "2025-04-19")
+    assert list_partitions(db, "journeysBN", "2025-04-17", "2025-04-18") == [
+        (date(2025, 4, 17), "journeysBN_20250417"), (date(2025, 4, 18), "journeysBN_20250418")]
+    assert [day for day, _ in list_partitions(db, "journeysBN")] == [
+        date(2025, 4, 16), date(2025, 4, 17), date(2025, 4, 18), date(2025, 4, 19)]
+
+def test_purge_drops_only_partitions_before_the_cutoff():
+    db = database("2025-01-30", "2025-01-31", "2025-02-01", "2025-02-02")
+    dropped = purge(db, "journeysBN", date(2025, 2, 1))
+    assert dropped == ["journeysBN_20250130", "journeysBN_20250131"]
+    assert "journeysBN_20250201" in db and "journeysBN_20250202" in db
+    assert "journeysBN" in db and "journeysBNCompact_20250101" in db
+
+def test_purge_dry_run_keeps_everything():
+    db = database("2025-01-30", "2025-02-01")
+    assert purge(db, "journeysBN", "2025-02-01", dry_run=True) == ["journeysBN_20250130"]
+    assert "journeysBN_20250130" in db
+
+def test_purge_everything():
+    db = database("2025-01-30", "2025-02-01")
+    assert len(purge(db, "journeysBN", date.max)) == 2
+    assert list_partitions(db, "journeysBN") == []
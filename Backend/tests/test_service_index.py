@@ -0,0 +1,22 @@
+import pytest
+from service_index import ServiceIndex
+
+SERVICES = [{"_id": i, "number": number, "description": description} for i, (number, description) in enumerate([
+    ("1", "Blackburn - Darwen"), ("1A", "Blackburn - Accrington"), ("11", "Burnley - Nelson"),
+    ("X41", "Accrington - Manchester"), ("21", "Darwen - Bolton")])]
+
+@pytest.mark.parametrize("query", ["", "1", "darwen"])
+def test_search_returns_at_most_limit_services(query):
+    index = ServiceIndex(SERVICES)
+    everything = index.search(query)
+    for limit in range(1, len(everything) + 2):
+        assert index.search(query, limit) == everything[:limit]
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_search_with_non_positive_limit_returns_nothing(limit):
+    assert ServiceIndex(SERVICES).search("1", limit) == []
+    assert ServiceIndex(SERVICES).search("", limit) == []
+
+def test_search_ranks_line_numbers_before_descriptions():
+    results = [svc["number"] for svc in ServiceIndex(SERVICES).search("1")]
+    assert results == ["1", "1A", "11", "X41", "21"]
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pytest
+from departure_index import DepartureIndex
+from delay_profiles import DelayProfiles
+from route_tables import RouteTables
+from snapshot import Snapshot, write_serving_snapshot, add_profiles, read_header, source_of
+from tree_runtime import TreeModel
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def departures() -> DepartureIndex:
+    records = []
+    for n in range(400):
+        service_id, stop, sched, day = 20001 + n % 3, n % 7, 360 + 3 * n % 900, n % 7
+        records.append({"service_id": service_id, "stop_name": f"Stop {stop}", "destination": "Airport",
+                        "stop_index": stop, "scheduled_mins": sched, "actual_mins": sched + n % 5,
+                        "delay_mins": n % 5, "journey_id": n, "scheduled_dep": f"{sched // 60:02d}:{sched % 60:02d}",
+                        "day_of_week": day, "is_holiday": False, "is_peak": False})
+    return DepartureIndex(records)
+
+def write(tmp_path, monkeypatch) -> str:
+    # A profiled serving snapshot built from the local model files
+    monkeypatch.chdir(BACKEND)
+    services = [{"_id": 20000 + i, "description": "Piccadilly Gardens - Airport"} for i in range(1, 4)]
+    path = str(tmp_path / "serving.snap")
+    write_serving_snapshot(path, "test", services, departures())
+    add_profiles(path)
+    return path
+
+def served_arrays(snapshot: Snapshot) -> dict:
+    # Every array the server keeps per snapshot, loaded as ServingData does
+    parts = {"departures": DepartureIndex.from_arrays(snapshot.arrays("departures")),
+             "routes": RouteTables.from_arrays(snapshot.arrays("routes")),
+             "model": TreeModel(snapshot.arrays("model")),
+             "profiles": DelayProfiles(snapshot.arrays("profiles"))}
+    arrays = {}
+    for part, obj in parts.items():
+        for name, value in vars(obj).items():
+            if isinstance(value, np.ndarray) and value.ndim and value.size > 1:
+                arrays[f"{part}.{name}"] = value
+    return arrays
+
+def test_served_arrays_are_views_of_the_mapping(tmp_path, monkeypatch):
+    snapshot = Snapshot(write(tmp_path, monkeypatch))
+    mapping = np.frombuffer(snapshot.buffer, dtype=np.uint8)
+    # Derived lookup tables the runtime builds for itself (not stored in the snapshot)
+    derived = {"model.children", "model.is_leaf"}
+    arrays = served_arrays(snapshot)
+    assert "departures.scheduled_mins" in arrays and "profiles.journey_predicted" in arrays
+    for name, array in arrays.items():
+        if name in derived:
+            continue
+        assert np.shares_memory(array, mapping), f"{name} was copied out of the snapshot"
+        assert not array.flags.writeable and not array.flags.owndata, name
+
+def mapping_memory_kb(path: str) -> dict:
+    # Resident and private dirty (copied-on-write) memory of this process's mappings of a file,
+    # from /proc/self/smaps
+    totals, inside = {"Rss:": 0, "Private_Dirty:": 0}, False
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and len(fields) >= 5: # mapping header: address perms offset dev inode [path]
+                inside = fields[-1] == path
+            elif inside and fields[0] in totals:
+                totals[fields[0]] += int(fields[1])
+    return {"rss": totals["Rss:"], "private_dirty": totals["Private_Dirty:"]}
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps"), reason="needs /proc/self/smaps")
+def test_reading_the_served_arrays_copies_no_pages(tmp_path, monkeypatch):
+    # Touching every served array only faults in clean, file-backed pages that all worker processes
+    # share through the page cache; a copy would show up as private dirty memory of the mapping
+    path = os.path.realpath(write(tmp_path, monkeypatch))
+    snapshot = Snapshot(path)
+    arrays = served_arrays(snapshot)
+    checksum = sum(float(np.sum(array, dtype=np.float64)) for array in arrays.values())
+    assert np.isfinite(checksum)
+    mapping = np.frombuffer(snapshot.buffer, dtype=np.uint8)
+    mapped_bytes = sum(a.nbytes for a in arrays.values() if np.shares_memory(a, mapping))
+    memory = mapping_memory_kb(path)
+    assert memory["rss"] * 1024 >= mapped_bytes # the arrays' pages are resident as file pages
+    assert memory["private_dirty"] == 0
+
+def test_profiled_snapshot_keeps_its_source_version(tmp_path, monkeypatch):
+    # add_profiles publishes a new version, so servers swap, but still counts as built from the same inputs
+    path = write(tmp_path, monkeypatch)
+    header = read_header(path)
+    assert header["version"] != "test" and source_of(header) == "test"
+    assert DelayProfiles(Snapshot(path).arrays("profiles")).resolution == 15
@@ -0,0 +1,56 @@
+import numpy as np
+from stop_events import utc_offsets, utc_seconds, transform_journeys
+
+def journey(start: str, *stops):
+    # A journey detail as bustimes.org returns it, from (aimed, actual) departure pairs
+    return {"datetime": start, "stops": [{"name": f"Stop {i}", "id": i, "aimed_departure_time": aimed,
+                                          "actual_departure_time": actual} for i, (aimed, actual) in enumerate(stops)]}
+
+def test_utc_offsets_change_at_the_clock_changes():
+    seconds = utc_seconds(["2025-03-30T00:59:59Z", "2025-03-30T01:00:00Z",
+                           "2025-10-26T00:59:59Z", "2025-10-26T01:00:00Z"])
+    assert utc_offsets(seconds).tolist() == [0, 3600, 3600, 0]
+
+def test_actual_times_use_the_offset_in_force_at_each_stop():
+    # Spring forward at 01:00 UTC: the first stop is still GMT, the second already BST
+    events = transform_journeys([(1, 10, journey("2025-03-30T00:40:00+00:00",
+                                                 ("00:50", "2025-03-30T00:52:00Z"),
+                                                 ("02:10", "2025-03-30T01:12:00Z")))])
+    assert events.columns["actual_mins"].tolist() == [52, 132]
+    assert events.columns["delay_mins"].tolist() == [2, 2]
+
+def test_autumn_repeated_hour_maps_to_local_time():
+    # 00:30 UTC is 01:30 BST and 01:30 UTC is 01:30 GMT on the day the clocks go back
+    events = transform_journeys([(1, 10, journey("2025-10-26T00:20:00+00:00",
+                                                 ("01:30", "2025-10-26T00:30:00Z"),
+                                                 ("01:30", "2025-10-26T01:30:00Z")))])
+    assert events.columns["actual_mins"].tolist() == [90, 90]
+
+def test_journey_after_local_midnight_takes_the_local_date():
+    # 23:30 UTC on Wednesday 16 April is 00:30 BST on Thursday 17 April
+    events = transform_journeys([(1, 10, journey("2025-04-16T23:30:00Z", ("00:30", "2025-04-16T23:33:00Z")))])
+    assert events.columns["date"] == ["2025-04-17"]
+    assert events.columns["day_of_week"].tolist() == [3]
+    assert events.columns["actual_mins"].tolist() == [33]
+    assert events.columns["delay_mins"].tolist() == [3]
+
+def test_actual_minutes_wrap_past_midnight():
+    events = transform_journeys([(1, 10, journey("2025-04-16T22:40:00Z", ("23:58", "2025-04-16T23:03:00Z")))])
+    assert events.columns["actual_mins"].tolist() == [3]
+    assert events.documents()[0]["actual_dep"] == "00:03"
+
+def test_holiday_follows_the_local_date():
+    # 23:10 UTC on 24 December is still Christmas Eve in London (GMT)
+    events = transform_journeys([(1, 10, journey("2025-12-24T23:10:00Z", ("23:10", "2025-12-24T23:12:00Z"))),
+                                 (1, 11, journey("2025-12-25T09:00:00Z", ("09:00", "2025-12-25T09:01:00Z")))])
+    assert events.columns["is_holiday"].tolist() == [False, True]
+
+def test_stops_without_valid_times_are_left_out():
+    events = transform_journeys([(1, 10, journey("2025-04-17T08:00:00Z",
+                                                 ("09:00", "2025-04-17T08:01:00Z"),
+                                                 (None, "2025-04-17T08:05:00Z"),
+                                                 ("09:10", None),
+                                                 ("25:00", "2025-04-17T08:20:00Z"),
+                                                 ("09:30", "not a time")))])
+    assert events.columns["stop_index"].tolist() == [0]
+    assert np.array_equal(events.columns["scheduled_mins"], [540])
@@ -0,0 +1,44 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from training_data import NUMERIC_COLUMNS, read_cache, write_cache, cache_source
+
+def training_frame(rows: int = 100_000, missing: bool = True) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = {col: rng.integers(0, 2 if dtype is np.bool_ else 100, rows).astype(dtype)
+            for col, dtype in NUMERIC_COLUMNS.items()}
+    for col in ["origin", "destination", "stop_name", "date"]:
+        data[col] = pd.Categorical.from_codes(rng.integers(-1 if missing else 0, 3, rows), categories=["a", "b", "c"])
+    return pd.DataFrame(data)
+
+def test_cache_round_trip(tmp_path):
+    df = training_frame()
+    path = str(tmp_path / "cache.arrow")
+    write_cache(df, path, source="fingerprint")
+    assert cache_source(path) == "fingerprint"
+    pd.testing.assert_frame_equal(read_cache(path), df)
+
+def file_mappings(path: str) -> list:
+    # (start, end) address ranges of the process's mappings of the file, from /proc/self/maps
+    ranges = []
+    with open("/proc/self/maps") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 6 and fields[5] == path:
+                start, end = (int(a, 16) for a in fields[0].split("-"))
+                ranges.append((start, end))
+    return ranges
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+def test_cached_integer_columns_are_views_of_the_file(tmp_path):
+    path = str(tmp_path / "cache.arrow")
+    write_cache(training_frame(missing=False), path)
+    df = read_cache(path)
+    mappings = file_mappings(path)
+    for col in df:
+        if df[col].dtype == bool:
+            continue # bit-packed in Arrow, so always copied
+        values = df[col].cat.codes.to_numpy() if df[col].dtype == "category" else df[col].to_numpy()
+        start = values.ctypes.data
+        assert any(low <= start and start + values.nbytes <= high for low, high in mappings), col
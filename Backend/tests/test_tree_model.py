@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+import pytest
+from features import FEATURES
+from tree_runtime import TreeModel, export_model, MISSING_NONE, MISSING_ZERO, MISSING_NAN
+
+def training_rows(rows: int, seed: int = 0) -> np.ndarray:
+    # Feature rows like the model's: cyclic time, integer-coded categories (weekday, holiday flag,
+    # service id, stop index) and target encodings, with some encodings missing
+    rng = np.random.default_rng(seed)
+    angle = rng.uniform(0, 2 * np.pi, rows)
+    X = np.column_stack([
+        np.sin(angle), np.cos(angle),
+        rng.integers(0, 7, rows), rng.integers(0, 2, rows),
+        rng.choice([20001, 20002, 20417, 31000], rows), rng.integers(0, 40, rows),
+        rng.normal(2, 3, rows), rng.normal(2, 3, rows), rng.normal(2, 3, rows),
+    ]).astype(np.float64)
+    X[rng.random(rows) < 0.15, 6] = np.nan
+    X[rng.random(rows) < 0.15, 8] = np.nan
+    return X
+
+def target(X: np.ndarray, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    service_effect = {20001: 1.0, 20002: -2.0, 20417: 4.0, 31000: 0.5}
+    return (3 * X[:, 0] + np.where(np.isnan(X[:, 6]), 5.0, X[:, 6]) + (X[:, 2] >= 5) * -2
+            + np.vectorize(service_effect.get)(X[:, 4]) + rng.normal(0, 0.5, len(X)))
+
+def exported(booster, tmp_path) -> TreeModel:
+    path = str(tmp_path / "trees.npz")
+    export_model(booster, path)
+    return TreeModel.load(path)
+
+def check_rows(X: np.ndarray) -> np.ndarray:
+    # Rows the runtime must agree on: unseen category values, missing values in every column
+    rows = training_rows(500, seed=7)
+    rows[:20, 4] = 99999          # unseen service id
+    rows[20:40, 2] = 9            # out-of-range weekday
+    rows[40:60, 7] = np.nan       # missing where training never had missing values
+    rows[60:80, 6] = 0.0          # exact zero encoding
+    rows[80:100, :] = np.nan      # nothing known
+    return np.vstack([X[:200], rows])
+
+@pytest.mark.parametrize("params, missing", [({}, MISSING_NAN), ({"zero_as_missing": True}, MISSING_ZERO),
+                                             ({"use_missing": False}, MISSING_NONE)])
+def test_runtime_matches_lightgbm(tmp_path, params, missing):
+    X = training_rows(3000)
+    booster = lgb.train({"objective": "regression", "num_leaves": 31, "min_data_in_leaf": 5, "verbose": -1,
+                         "seed": 0, **params}, lgb.Dataset(pd.DataFrame(X, columns=FEATURES), target(X)),
+                        num_boost_round=40)
+    model = exported(booster, tmp_path)
+    assert missing in model.missing # the missing-value handling under test is in the trees
+    rows = check_rows(X)
+    assert np.allclose(model.predict(rows), booster.predict(rows))
+
+def test_categorical_splits_are_rejected(tmp_path):
+    # The runtime only evaluates numeric splits, so a booster with LightGBM categorical features
+    # must fail at export rather than predict wrongly
+    X = training_rows(2000)
+    frame = pd.DataFrame(X, columns=FEATURES).astype({"service_id": "category"})
+    booster = lgb.train({"objective": "regression", "verbose": -1, "min_data_per_group": 5, "cat_smooth": 1},
+                        lgb.Dataset(frame, target(X)), num_boost_round=10)
+    with pytest.raises(ValueError, match="Unsupported split type"):
+        export_model(booster, str(tmp_path / "trees.npz"))
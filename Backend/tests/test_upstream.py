@@ -0,0 +1,67 @@
+import gc
+import asyncio
+import httpx
+from upstream import StopsClient
+
+SERVICE = {"id": 1, "description": "Blackburn - Darwen"}
+ROUTE = ["Blackburn Bus Station", "Ewood", "Darwen Circus"]
+
+def stops_client(journeys: dict, **options):
+    # StopsClient against a mock bustimes.org serving the given {journey_id: stop names, status code
+    # or seconds to stall}
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path == "/api/vehiclejourneys/":
+            return httpx.Response(200, json={"results": [{"id": jid} for jid in journeys]})
+        if request.url.path == "/api/services/1":
+            return httpx.Response(200, json=SERVICE)
+        stops = journeys[int(request.url.path.rsplit("/", 1)[1][:-5])]
+        if isinstance(stops, float):
+            await asyncio.sleep(stops)
+            stops = []
+        if isinstance(stops, int):
+            return httpx.Response(stops)
+        return httpx.Response(200, json={"stops": [{"name": name} for name in stops]})
+
+    return StopsClient("https://bustimes.test", transport=httpx.MockTransport(handler), **options), requests
+
+def test_candidate_fetches_are_finished_when_stops_are_returned():
+    async def run():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        client, _ = stops_client({1: ["Accrington", "Oswaldtwistle"], 2: ROUTE, 3: 500, 4: 10.0})
+        stops = await client.fetch_stops(1)
+        # The stalled candidate was cancelled and the failed one retrieved before returning
+        others = asyncio.all_tasks() - {asyncio.current_task()}
+        await client.aclose()
+        gc.collect()
+        return stops, others, errors
+    stops, others, errors = asyncio.run(run())
+    assert stops == ROUTE
+    assert others == set() and errors == []
+
+def test_empty_stop_lists_expire_after_empty_ttl():
+    async def run():
+        client, requests = stops_client({1: []}, empty_ttl=0.05)
+        assert await client.get_stops(1) == []
+        assert await client.get_stops(1) == []
+        cached = len(requests)
+        await asyncio.sleep(0.06)
+        assert await client.get_stops(1) == []
+        await client.aclose()
+        return cached, len(requests), client.misses
+    cached, total, misses = asyncio.run(run())
+    assert total == 2 * cached and misses == 2
+
+def test_stop_lists_are_cached_for_fresh_ttl():
+    async def run():
+        client, requests = stops_client({1: ROUTE}, empty_ttl=0)
+        assert await client.get_stops(1) == ROUTE
+        fetched = len(requests)
+        assert await client.get_stops(1) == ROUTE
+        await client.aclose()
+        return fetched, len(requests), client.hits
+    fetched, total, hits = asyncio.run(run())
+    assert total == fetched and hits == 1
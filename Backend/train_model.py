@@ -1,15 +1,27 @@
-import pandas as pd
 import lightgbm as lgb
 import joblib
 import matplotlib.pyplot as plt
+from tree_runtime import export_model
 
 from pymongo import MongoClient
+from training_data import load_training_frame
+from compact_events import stop_event_collections
+from incremental_training import save_state
+from target_encoding import TargetEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 import numpy as np
 
+# Training window of service dates (inclusive); None leaves that end open
+TRAIN_START = None
+TRAIN_END   = None
+
+# Reading only the date partitions of the window (stored in either layout)
 client = MongoClient("") # MISSING LINK
-df = pd.DataFrame(list(client["BusDelayPredict"]["journeysBN"].find({})))
+db = client["BusDelayPredict"]
+partitions = stop_event_collections(db, TRAIN_START, TRAIN_END)
+df = load_training_frame([col for _, col in partitions],
+                         cache_path=f"journeysBN_{TRAIN_START or 'first'}_{TRAIN_END or 'last'}.arrow")
 client.close()
 
 # Add cyclic time-of-day features
@@ -17,10 +29,10 @@ df["scheduled_mins"] = df["scheduled_mins"].astype(int)
 df["time_sin"] = np.sin(2 * np.pi * df["scheduled_mins"] / 1440)
 df["time_cos"] = np.cos(2 * np.pi * df["scheduled_mins"] / 1440)
 
-# Target encoding
-for col in ["origin", "destination", "stop_name"]:
-    mean_map = df.groupby(col)["delay_mins"].mean().to_dict()
-    df[f"{col}_te"] = df[col].map(mean_map)
+# Out-of-fold target encoding, so no row's own delay leaks into its features
+encoder = TargetEncoder()
+for col, encoded in encoder.transform_oof(df).items():
+    df[f"{col}_te"] = encoded
 
 # Define features and target
 features = [
@@ -46,10 +58,13 @@ print(f"Test RMSE with target-encoded features: {rmse:.2f}")
 # Save model
 joblib.dump(model, "lgbm_model.pkl")
 
-# Save target encodings as dictionaries
-target_maps = {
-    "origin": df.groupby("origin")["delay_mins"].mean().to_dict(),
-    "destination": df.groupby("destination")["delay_mins"].mean().to_dict(),
-    "stop_name": df.groupby("stop_name")["delay_mins"].mean().to_dict()
-}
-joblib.dump(target_maps, "target_encodings.pkl")
\ No newline at end of file
+# Export the trees to flat arrays for the serving runtime
+export_model(model.booster_, "lgbm_model_trees.npz")
+
+# Save the full-data target encoding statistics for serving (kept fresh by load_journeys)
+encoder.update(df)
+encoder.save("target_encoder.npz")
+
+# Record the last day trained on (the newest service date in the frame), where incremental_training.py continues from
+dates = df["date"].cat.categories
+save_state({"trained_through": max(dates) if len(dates) else None, "runs": []}, "training_state.json")
\ No newline at end of file
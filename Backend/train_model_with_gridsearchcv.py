@@ -1,69 +1,111 @@
-import pandas as pd
 import lightgbm as lgb
 import joblib
 import matplotlib.pyplot as plt
 from sklearn.model_selection import GridSearchCV
 from lightgbm import LGBMRegressor
 from pymongo import MongoClient
+from training_data import load_training_frame
+from compact_events import stop_event_collections
+from target_encoding import TargetEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
+from tuning import build_datasets, expand_grid, successive_halving, best_result, write_results
+import argparse, os
 import numpy as np
 
-client = MongoClient("") # MISSING LINK
-df = pd.DataFrame(list(client["BusDelayPredict"]["journeysBN"].find({})))
-client.close()
-
-# Add cyclic time-of-day features
-df["scheduled_mins"] = df["scheduled_mins"].astype(int)
-df["time_sin"] = np.sin(2 * np.pi * df["scheduled_mins"] / 1440)
-df["time_cos"] = np.cos(2 * np.pi * df["scheduled_mins"] / 1440)
-
-# Target encoding
-for col in ["origin", "destination", "stop_name"]:
-    mean_map = df.groupby(col)["delay_mins"].mean().to_dict()
-    df[f"{col}_te"] = df[col].map(mean_map)
-
-# Define features and target
-features = [
-    "time_sin", "time_cos", "day_of_week", "is_holiday",
-    "service_id", "stop_index",
-    "origin_te", "destination_te", "stop_name_te"
-]
-X = df[features]
-y = df["delay_mins"]
-
-# Train/test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-param_grid = {
-    "num_leaves": [50, 63, 75],
-    "max_depth": [10, 15, 20],
-    "learning_rate": [0.2, 0.15, 0.1],
-    "n_estimators": [100, 200],
-    "min_child_samples": [15, 25]
-}
-
-model = LGBMRegressor(random_state=42)
-
-grid = GridSearchCV(
-    model,
-    param_grid,
-    scoring="neg_root_mean_squared_error",
-    cv=2,
-    verbose=1,
-    n_jobs=-1
-)
-
-grid.fit(X_train, y_train)
-
-print("Best Parameters:", grid.best_params_)
-print("Best RMSE:", -grid.best_score_)
-
-# Optionally test it on the test set
-best_model = grid.best_estimator_
-y_pred = best_model.predict(X_test)
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-print(f"Test RMSE of best model: {rmse:.2f}")
-
-# Save model
-joblib.dump(model, "best_lgbm_model.pkl")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Tune the LightGBM delay model")
+    parser.add_argument("--mode", choices=["halving", "grid"], default="halving",
+                        help="successive halving with early stopping, or the exhaustive GridSearchCV")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="CPU budget for parallel trials")
+    parser.add_argument("--threads-per-trial", type=int, default=1)
+    parser.add_argument("--results", default="tuning_results.csv", help="trial table (time against RMSE)")
+    parser.add_argument("--start", default=None, help="first service date to train on (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="last service date to train on (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    # Reading only the date partitions of the training window (stored in either layout)
+    client = MongoClient("") # MISSING LINK
+    partitions = [col for _, col in stop_event_collections(client["BusDelayPredict"], args.start, args.end)]
+    df = load_training_frame(partitions, cache_path=f"journeysBN_{args.start or 'first'}_{args.end or 'last'}.arrow")
+    client.close()
+
+    # Add cyclic time-of-day features
+    df["scheduled_mins"] = df["scheduled_mins"].astype(int)
+    df["time_sin"] = np.sin(2 * np.pi * df["scheduled_mins"] / 1440)
+    df["time_cos"] = np.cos(2 * np.pi * df["scheduled_mins"] / 1440)
+
+    # Out-of-fold target encoding, so no row's own delay leaks into its features
+    encoder = TargetEncoder()
+    for col, encoded in encoder.transform_oof(df).items():
+        df[f"{col}_te"] = encoded
+
+    # Define features and target
+    features = [
+        "time_sin", "time_cos", "day_of_week", "is_holiday",
+        "service_id", "stop_index",
+        "origin_te", "destination_te", "stop_name_te"
+    ]
+    X = df[features]
+    y = df["delay_mins"]
+
+    # Train/test split
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    param_grid = {
+        "num_leaves": [50, 63, 75],
+        "max_depth": [10, 15, 20],
+        "learning_rate": [0.2, 0.15, 0.1],
+        "n_estimators": [100, 200],
+        "min_child_samples": [15, 25]
+    }
+
+    if args.mode == "grid":
+        # Exhaustive cross-validated search (every fit re-bins the training frame)
+        model = LGBMRegressor(random_state=42)
+
+        grid = GridSearchCV(
+            model,
+            param_grid,
+            scoring="neg_root_mean_squared_error",
+            cv=2,
+            verbose=1,
+            n_jobs=-1
+        )
+
+        grid.fit(X_train, y_train)
+
+        print("Best Parameters:", grid.best_params_)
+        print("Best RMSE:", -grid.best_score_)
+        best_model = grid.best_estimator_
+    else:
+        # Successive halving with early stopping on a validation split; the training bins are
+        # built once and shared by every trial. n_estimators becomes the largest round budget.
+        X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+        train_path, valid_path = build_datasets(X_fit, y_fit, X_valid, y_valid, "tuning_data")
+
+        search_space = {k: v for k, v in param_grid.items() if k != "n_estimators"}
+        results = successive_halving(train_path, valid_path, expand_grid(search_space),
+                                     max_rounds=max(param_grid["n_estimators"]),
+                                     cpus=args.cpus, threads_per_trial=args.threads_per_trial)
+        write_results(results, args.results)
+        best = best_result(results)
+        print(f"{len(results)} trials in {sum(r['seconds'] for r in results):.0f} CPU-seconds, results in {args.results}")
+
+        best_params = {k: best[k] for k in search_space}
+        print("Best Parameters:", {**best_params, "n_estimators": best["best_iteration"]})
+        print("Best validation RMSE:", best["rmse"])
+        best_model = LGBMRegressor(random_state=42, n_estimators=best["best_iteration"], **best_params)
+        best_model.fit(X_train, y_train)
+
+    # Optionally test it on the test set
+    y_pred = best_model.predict(X_test)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    print(f"Test RMSE of best model: {rmse:.2f}")
+
+    # Save model
+    joblib.dump(best_model, "best_lgbm_model.pkl")
+
+# Guarded so the tuning worker processes (spawned) can import this file without re-running it
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from metrics import peak_rss_mb
+
+# Columns the training scripts need, with the compact dtype each is stored as
+NUMERIC_COLUMNS = {
+    "scheduled_mins": np.int16,
+    "delay_mins":     np.int16,
+    "day_of_week":    np.int8,
+    "is_holiday":     np.bool_,
+    "service_id":     np.int32,
+    "stop_index":     np.int16,
+}
+CATEGORICAL_COLUMNS = ["origin", "destination", "stop_name", "date"] # date: service date, "YYYY-MM-DD"
+PROJECTION = {"_id": 0, **{col: 1 for col in [*NUMERIC_COLUMNS, *CATEGORICAL_COLUMNS]}}
+
+def stream_columns(collection, query: dict = None, batch_size: int = 50_000) -> pd.DataFrame:
+    # Reading stop events through a projected, batched cursor straight into typed arrays.
+    # Only one batch of documents is alive at a time; strings become categorical codes (-1 = missing).
+    # `collection` may also be a list of collections (e.g. the date partitions of a training window,
+    # from compact_events.stop_event_collections, which reads compact journeys as stop events).
+    collections = collection if isinstance(collection, (list, tuple)) else [collection]
+    cursor = (doc for col in collections for doc in col.find(query or {}, PROJECTION, batch_size=batch_size))
+
+    chunks = {col: [] for col in [*NUMERIC_COLUMNS, *CATEGORICAL_COLUMNS]}
+    categories = {col: {} for col in CATEGORICAL_COLUMNS} # value -> code
+
+    def flush(batch):
+        for col, dtype in NUMERIC_COLUMNS.items():
+            chunks[col].append(np.fromiter((doc[col] for doc in batch), dtype=dtype, count=len(batch)))
+        for col in CATEGORICAL_COLUMNS:
+            codes = categories[col]
+            values = (doc.get(col) for doc in batch)
+            chunks[col].append(np.fromiter((-1 if v is None else codes.setdefault(v, len(codes)) for v in values),
+                                           dtype=np.int32, count=len(batch)))
+
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    # Concatenating the per-batch arrays into the final columns
+    data = {}
+    for col, dtype in NUMERIC_COLUMNS.items():
+        data[col] = np.concatenate(chunks.pop(col)) if chunks[col] else np.empty(0, dtype=dtype)
+    for col in CATEGORICAL_COLUMNS:
+        codes = np.concatenate(chunks.pop(col)) if chunks[col] else np.empty(0, dtype=np.int32)
+        data[col] = pd.Categorical.from_codes(codes, categories=list(categories[col]))
+    return pd.DataFrame(data)
+
+def source_fingerprint(collection, query: dict = None) -> str:
+    # Identifying what a load reads: the columns, the query and each collection's name and document
+    # count (from collection metadata). A new or grown date partition changes it.
+    collections = collection if isinstance(collection, (list, tuple)) else [collection]
+    return json.dumps({"columns": list(PROJECTION), "query": query,
+                       "collections": [[col.name, col.estimated_document_count()] for col in collections]},
+                      sort_keys=True, default=str)
+
+def write_cache(df: pd.DataFrame, path: str, source: str = None):
+    # Saving the columns as an uncompressed Arrow IPC file of a single record batch, which can be
+    # memory-mapped without copying, with the source fingerprint they were read from in the schema metadata
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if source is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"source": source.encode()})
+    tmp = f"{path}.tmp"
+    feather.write_feather(table, tmp, compression="uncompressed", chunksize=max(len(table), 1))
+    os.replace(tmp, path)
+
+def cache_source(path: str):
+    # The source fingerprint stored in an Arrow cache (None if missing or unreadable), from the schema alone
+    import pyarrow as pa
+    try:
+        with pa.memory_map(path) as f:
+            metadata = pa.ipc.open_file(f).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return metadata[b"source"].decode() if b"source" in metadata else None
+
+def read_cache(path: str) -> pd.DataFrame:
+    # Memory-mapping the Arrow cache. Integer columns and the codes of categoricals without missing
+    # values stay read-only views of the file's pages (one column per block, from a single record
+    # batch); booleans (bit-packed by Arrow), categoricals with missing values and the columns of
+    # caches written in several batches are copied.
+    import pyarrow.feather as feather
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+def load_training_frame(collection=None, cache_path: str = None, refresh: bool = False,
+                        query: dict = None, batch_size: int = 50_000) -> pd.DataFrame:
+    # Loading the training columns from the on-disk cache if it was written from the same source
+    # (same collections with the same document counts), otherwise from MongoDB (rewriting the cache)
+    start = time.perf_counter()
+    source = source_fingerprint(collection, query) if cache_path else None
+    if cache_path and not refresh and os.path.exists(cache_path) and cache_source(cache_path) == source:
+        df = read_cache(cache_path)
+        origin = f"cache {cache_path}"
+    else:
+        df = stream_columns(collection, query, batch_size)
+        origin = "MongoDB"
+        if cache_path:
+            write_cache(df, cache_path, source)
+
+    print(f"Loaded {len(df)} stop events from {origin} in {time.perf_counter() - start:.1f}s "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB, peak RSS {peak_rss_mb():.0f} MB)")
+    return df
@@ -0,0 +1,133 @@
+import numpy as np
+
+# Flat array format for a LightGBM regression model.
+# Every split and every leaf is a node in the same arrays. A leaf is a node whose children point
+# back to itself and whose value is the leaf output; trees are concatenated and roots[t] is the
+# first node of tree t.
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+ZERO_THRESHOLD = 1e-35 # LightGBM's kZeroThreshold
+
+def export_model(booster, path: str):
+    # Dumping a trained booster's trees to a flat .npz file that TreeModel can load
+    dump = booster.dump_model()
+    if not dump["objective"].startswith("regression") or dump["num_tree_per_iteration"] != 1:
+        raise ValueError(f"Only single-output regression models can be exported, got {dump['objective']!r}")
+
+    feature, threshold, left, right, default_left, missing, value = [], [], [], [], [], [], []
+    roots = []
+
+    def add(node):
+        pos = len(feature)
+        feature.append(0)
+        threshold.append(0.0)
+        left.append(pos)
+        right.append(pos)
+        default_left.append(False)
+        missing.append(MISSING_NONE)
+        value.append(0.0)
+
+        # Leaves keep their self-loops and carry the output value
+        if "split_feature" not in node:
+            value[pos] = node["leaf_value"]
+            return pos
+
+        if node["decision_type"] != "<=":
+            raise ValueError(f"Unsupported split type {node['decision_type']!r}")
+        feature[pos] = node["split_feature"]
+        threshold[pos] = node["threshold"]
+        default_left[pos] = node["default_left"]
+        missing[pos] = MISSING_TYPES[node["missing_type"]]
+        left[pos] = add(node["left_child"])
+        right[pos] = add(node["right_child"])
+        return pos
+
+    for tree in dump["tree_info"]:
+        roots.append(add(tree["tree_structure"]))
+
+    np.savez(
+        path,
+        feature=np.asarray(feature, dtype=np.int32),
+        threshold=np.asarray(threshold, dtype=np.float64),
+        left=np.asarray(left, dtype=np.int32),
+        right=np.asarray(right, dtype=np.int32),
+        default_left=np.asarray(default_left, dtype=bool),
+        missing=np.asarray(missing, dtype=np.int8),
+        value=np.asarray(value, dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        feature_names=np.asarray(dump["feature_names"]),
+    )
+
+class TreeModel:
+    # NumPy evaluator for models written by export_model
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.default_left = arrays["default_left"]
+        self.missing = arrays["missing"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        self.has_missing = bool((self.missing != MISSING_NONE).any())
+
+        # Interleaving the children so one gather picks the branch: children[2 * node + went_right]
+        self.children = np.empty(2 * len(self.left), dtype=np.int32)
+        self.children[0::2] = self.left
+        self.children[1::2] = self.right
+        self.is_leaf = self.left == np.arange(len(self.left))
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in
+                   ("feature", "threshold", "left", "right", "default_left", "missing", "value", "roots"))
+
+    def predict(self, X) -> np.ndarray:
+        # Predicting for a 2-D array whose columns are in feature_names order
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected an (n, {len(self.feature_names)}) feature matrix, got {X.shape}")
+
+        # Without missing-value splits LightGBM treats NaN as 0
+        if not self.has_missing:
+            X = np.nan_to_num(X, nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+        n, trees = len(X), len(self.roots)
+        if trees == 0:
+            return np.zeros(n)
+        values = np.ascontiguousarray(X).ravel()
+
+        # One (row, tree) cursor per pair; only cursors still on a split are advanced each level
+        node = np.tile(self.roots, n)
+        active = np.flatnonzero(~self.is_leaf[node])
+        cursor = node[active]
+        offset = (active // trees) * X.shape[1]
+
+        while len(active):
+            x = values[offset + self.feature[cursor]]
+            go_left = x <= self.threshold[cursor]
+            if self.has_missing:
+                go_left = self._route_missing(cursor, x, go_left)
+            cursor = self.children[2 * cursor + ~go_left]
+
+            node[active] = cursor
+            keep = ~self.is_leaf[cursor]
+            active, cursor, offset = active[keep], cursor[keep], offset[keep]
+
+        # Summing tree outputs in tree order, as LightGBM does
+        return np.cumsum(self.value[node].reshape(n, trees), axis=1)[:, -1]
+
+    def _route_missing(self, node, x, go_left):
+        # Sending missing values down the default branch of splits that handle them
+        missing = self.missing[node]
+        is_nan = np.isnan(x)
+        use_default = ((missing == MISSING_NAN) & is_nan) | \
+                      ((missing == MISSING_ZERO) & (is_nan | (np.abs(x) <= ZERO_THRESHOLD)))
+        go_left = np.where((missing == MISSING_NONE) & is_nan, 0.0 <= self.threshold[node], go_left)
+        return np.where(use_default, self.default_left[node], go_left)
@@ -0,0 +1,110 @@
+import os
+import csv
+import time
+import itertools
+import multiprocessing
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor
+
+# Dataset parameters fixed when the bins are built. feature_pre_filter is off so trials can
+# use any min_child_samples on the same binned data.
+DATASET_PARAMS = {"max_bin": 255, "feature_pre_filter": False, "verbose": -1}
+
+# Binned datasets of the current worker process (loaded once by _init_worker)
+_datasets = {}
+
+def build_datasets(X_train, y_train, X_valid, y_valid, directory: str) -> tuple:
+    # Binning the training data once and saving both sets in LightGBM's binary format,
+    # so trials load ready-made bins instead of re-binning a DataFrame on every fit
+    os.makedirs(directory, exist_ok=True)
+    train_path = os.path.join(directory, "train.bin")
+    valid_path = os.path.join(directory, "valid.bin")
+    for path in (train_path, valid_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    train = lgb.Dataset(X_train, y_train, params=DATASET_PARAMS, free_raw_data=False).construct()
+    valid = lgb.Dataset(X_valid, y_valid, reference=train, params=DATASET_PARAMS).construct()
+    train.save_binary(train_path)
+    valid.save_binary(valid_path)
+    return train_path, valid_path
+
+def _init_worker(train_path: str, valid_path: str):
+    # Loading the binned datasets once per worker process
+    train = lgb.Dataset(train_path, params=DATASET_PARAMS).construct()
+    valid = lgb.Dataset(valid_path, reference=train, params=DATASET_PARAMS).construct()
+    _datasets.update(train=train, valid=valid)
+
+def _run_trial(trial: int, params: dict, rounds: int, early_stopping: int, threads: int) -> dict:
+    # Training one configuration for up to `rounds` boosting rounds, stopping early once the
+    # validation RMSE has not improved for `early_stopping` rounds
+    start = time.perf_counter()
+    booster = lgb.train(
+        {**params, "objective": "regression", "metric": "rmse", "num_threads": threads,
+         "seed": 42, "verbose": -1},
+        _datasets["train"], num_boost_round=rounds, valid_sets=[_datasets["valid"]],
+        callbacks=[lgb.early_stopping(early_stopping, verbose=False)],
+    )
+    return {
+        "trial": trial,
+        **params,
+        "rounds": rounds,
+        "best_iteration": booster.best_iteration,
+        "rmse": booster.best_score["valid_0"]["rmse"],
+        "seconds": time.perf_counter() - start,
+    }
+
+def expand_grid(param_grid: dict) -> list:
+    # All combinations of a {name: [values]} grid, as a list of parameter dicts
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+def successive_halving(train_path: str, valid_path: str, candidates: list, min_rounds: int = 25,
+                       max_rounds: int = 200, eta: int = 3, early_stopping: int = 20,
+                       cpus: int = None, threads_per_trial: int = 1, log=print) -> list:
+    # Successive halving over the candidate configurations: every candidate gets a small
+    # budget of boosting rounds, the best 1/eta move on with eta times the budget, and so on
+    # until max_rounds. Trials run in a process pool sized to the CPU budget
+    # (cpus // threads_per_trial workers). Returns one result row per trial, in run order.
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, cpus // threads_per_trial)
+
+    results = []
+    survivors = list(enumerate(candidates))
+    rounds = min_rounds
+    # Spawned rather than forked: forking after LightGBM has started OpenMP threads can deadlock
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(train_path, valid_path)) as pool:
+        rung = 0
+        while survivors:
+            start = time.perf_counter()
+            futures = [pool.submit(_run_trial, trial, params, rounds, early_stopping, threads_per_trial)
+                       for trial, params in survivors]
+            rung_results = [{**f.result(), "rung": rung} for f in futures]
+            results.extend(rung_results)
+            best = min(rung_results, key=lambda r: r["rmse"])
+            log(f"Rung {rung}: {len(survivors)} trials x {rounds} rounds in "
+                f"{time.perf_counter() - start:.1f}s, best RMSE {best['rmse']:.4f}")
+
+            if rounds >= max_rounds or len(survivors) == 1:
+                break
+            keep = max(1, len(survivors) // eta)
+            ranked = sorted(rung_results, key=lambda r: r["rmse"])[:keep]
+            survivors = [(r["trial"], candidates[r["trial"]]) for r in ranked]
+            rounds = min(max_rounds, rounds * eta)
+            rung += 1
+    return results
+
+def best_result(results: list) -> dict:
+    # The best trial of the highest rung reached (the one trained with the largest round budget)
+    top = max(r["rung"] for r in results)
+    return min((r for r in results if r["rung"] == top), key=lambda r: r["rmse"])
+
+def write_results(results: list, path: str):
+    # Saving the trial table (time against RMSE) as CSV, best first within each rung
+    rows = sorted(results, key=lambda r: (-r["rung"], r["rmse"]))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
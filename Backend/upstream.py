@@ -0,0 +1,143 @@
+import asyncio
+import time
+import httpx
+from metrics import Histogram, LATENCY_BUCKETS
+
+class StopsClient:
+    # Async client for the bustimes.org stop lists behind /get_stops.
+    # One pooled httpx.AsyncClient is shared by every request, candidate journeys are fetched
+    # concurrently, and stop lists are cached per service with stale-while-revalidate: fresh
+    # entries are served directly, stale ones are served while a background refresh runs.
+    # An empty stop list (no usable journey found) is only kept for `empty_ttl` and never served stale.
+
+    def __init__(self, base_url: str = "https://bustimes.org", fresh_ttl: float = 3600.0,
+                 stale_ttl: float = 86400.0, candidates: int = 6, timeout: float = 10.0,
+                 max_connections: int = 20, empty_ttl: float = 60.0, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.empty_ttl = empty_ttl
+        self.transport = transport # optional httpx transport (e.g. httpx.MockTransport in tests)
+        self.candidates = candidates
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self.client = None
+        self.cache = {}     # service_id -> (stops, fetched_at)
+        self.in_flight = {} # service_id -> task fetching its stops
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.request_seconds = Histogram(LATENCY_BUCKETS) # per upstream HTTP call, retries included
+
+    def _client(self) -> httpx.AsyncClient:
+        # Creating the shared connection pool on first use
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self.client
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _get_json(self, path: str, params: dict = None):
+        # GETs are idempotent, so one retry covers pooled connections the server closed while idle
+        start = time.perf_counter()
+        try:
+            try:
+                resp = await self._client().get(f"{self.base_url}{path}", params=params)
+            except (httpx.RemoteProtocolError, httpx.ConnectError):
+                resp = await self._client().get(f"{self.base_url}{path}", params=params)
+        finally:
+            self.request_seconds.observe(time.perf_counter() - start)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def fetch_stops(self, service_id: int) -> list:
+        # Getting the stop names of a journey running to the service's known destination
+        journeys, svc = await asyncio.gather(
+            self._get_json("/api/vehiclejourneys/", {"service": service_id, "page_size": self.candidates}),
+            self._get_json(f"/api/services/{service_id}"),
+        )
+        journeys = (journeys.get("results") or [])[:self.candidates]
+        if not journeys or not svc:
+            return []
+        origin, destination = [p.strip() for p in svc["description"].split(" - ")]
+
+        # Fetching the candidate journeys together and taking the first one (in listing order)
+        # that ends at the destination, starts at the origin, or is circular
+        loop = asyncio.get_running_loop()
+        tasks = [loop.create_task(self._get_json(f"/services/{service_id}/journeys/{journey['id']}.json"))
+                 for journey in journeys]
+        try:
+            for task in tasks:
+                detail = await task
+                stops = [stop["name"] for stop in detail.get("stops", []) if stop.get("name")]
+                if stops and ((destination in stops[-1] or origin in stops[0]) or stops[0] == stops[-1]):
+                    return stops
+            return []
+        finally:
+            # Cancelling the candidates that are no longer needed and waiting for them, so none is
+            # left running and failed ones have their exceptions retrieved
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _refresh(self, service_id: int) -> asyncio.Task:
+        # Starting (or joining) the single in-flight fetch for a service
+        task = self.in_flight.get(service_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._refresh_task(service_id))
+            task.add_done_callback(self._log_fetch_error)
+            self.in_flight[service_id] = task
+        return task
+
+    async def _refresh_task(self, service_id: int) -> list:
+        try:
+            stops = await self.fetch_stops(service_id)
+            self.cache[service_id] = (stops, time.monotonic())
+            return stops
+        finally:
+            self.in_flight.pop(service_id, None)
+
+    async def get_stops(self, service_id: int) -> list:
+        cached = self.cache.get(service_id)
+        if cached is not None:
+            stops, fetched_at = cached
+            age = time.monotonic() - fetched_at
+            fresh_ttl, stale_ttl = (self.fresh_ttl, self.stale_ttl) if stops else (self.empty_ttl, 0.0)
+            if age < fresh_ttl:
+                self.hits += 1
+                return stops
+            if age < fresh_ttl + stale_ttl:
+                # Serving the stale list while it is refreshed in the background
+                self.stale_hits += 1
+                self._refresh(service_id)
+                return stops
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(service_id))
+
+    def _log_fetch_error(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.fetch_errors += 1
+            print(f"Stop list fetch failed: {task.exception()!r}")
+
+    def stats(self) -> dict:
+        return {
+            "cached_services": len(self.cache),
+            "in_flight": len(self.in_flight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "fetch_errors": self.fetch_errors,
+            "request_seconds": self.request_seconds.snapshot(),
+        }